@@ -1,34 +1,167 @@
-from flask import Blueprint, render_template, jsonify
-from .models import CertificateVerification
+from flask import Blueprint, render_template, jsonify, request, current_app, send_file, after_this_request
+from .models import CertificateVerification, MerkleRoot, db
+from datetime import datetime, timezone
+import os
+import tempfile
+from .chain_validator import verify_chain_incremental
+from .merkle import BATCH_SIZE, certificate_proof
+from .chain_audit import audit_jobs
+from .chain_snapshot import export_snapshot
 
 blockchain_bp = Blueprint('blockchain', __name__)
 
+# Fields a client may request with ?fields=; chain_index is always included as the cursor
+BLOCK_FIELDS = {
+    'certificate_id': CertificateVerification.certificate_id,
+    'chain_index': CertificateVerification.chain_index,
+    'certificate_hash': CertificateVerification.certificate_hash,
+    'previous_hash': CertificateVerification.previous_hash,
+    'created_at': CertificateVerification.created_at,
+    'is_verified': CertificateVerification.is_verified,
+    'verified_at': CertificateVerification.verified_at,
+}
+DEFAULT_BLOCK_FIELDS = ['certificate_id', 'chain_index', 'certificate_hash', 'previous_hash', 'created_at', 'is_verified']
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+def parse_datetime_arg(name):
+    """
+    Parse an ISO 8601 query parameter, raising ValueError with the parameter name.
+
+    Stored timestamps are naive UTC, so an offset such as Z or +02:00 is
+    converted to UTC and dropped.
+    """
+    value = request.args.get(name)
+    if value is None:
+        return None
+    try:
+        parsed = datetime.fromisoformat(value)
+    except ValueError:
+        raise ValueError(f"Invalid {name}: expected an ISO 8601 timestamp")
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+def query_chain_window(after=None, before=None, limit=DEFAULT_PAGE_SIZE, from_index=None, to_index=None,
+                       since=None, until=None, fields=None):
+    """
+    Load one window of the chain using keyset pagination on chain_index.
+
+    - after / before: exclusive chain_index cursors; before pages backwards from the tail
+    - from_index / to_index: inclusive chain_index range
+    - since / until: inclusive created_at range
+    - fields: names from BLOCK_FIELDS to load; only those columns are selected
+
+    Returns (blocks, next_cursor). Blocks are dicts in ascending chain order and
+    next_cursor is the value to pass as after (or before) for the following
+    page, or None when the window reached the end of the chain.
+    """
+    fields = [name for name in (fields or DEFAULT_BLOCK_FIELDS) if name in BLOCK_FIELDS]
+    if 'chain_index' not in fields:
+        fields.append('chain_index')
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+
+    query = db.session.query(*(BLOCK_FIELDS[name].label(name) for name in fields))
+    if after is not None:
+        query = query.filter(CertificateVerification.chain_index > after)
+    if before is not None:
+        query = query.filter(CertificateVerification.chain_index < before)
+    if from_index is not None:
+        query = query.filter(CertificateVerification.chain_index >= from_index)
+    if to_index is not None:
+        query = query.filter(CertificateVerification.chain_index <= to_index)
+    if since is not None:
+        query = query.filter(CertificateVerification.created_at >= since)
+    if until is not None:
+        query = query.filter(CertificateVerification.created_at <= until)
+
+    # Walk backwards when paging from the tail, then restore chain order
+    descending = before is not None or (after is None and from_index is None and since is None)
+    order = CertificateVerification.chain_index.desc() if descending else CertificateVerification.chain_index
+    rows = query.order_by(order).limit(limit + 1).all()
+
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    if descending:
+        rows.reverse()
+
+    blocks = []
+    for row in rows:
+        block = {}
+        for name in fields:
+            value = getattr(row, name)
+            block[name] = value.isoformat() if isinstance(value, datetime) else value
+        blocks.append(block)
+
+    next_cursor = None
+    if has_more and blocks:
+        next_cursor = blocks[0]['chain_index'] if descending else blocks[-1]['chain_index']
+    return blocks, next_cursor
+
 @blockchain_bp.route('/blockchain')
 def blockchain():
-    """Display the certificate blockchain"""
-    certificates = CertificateVerification.query.order_by(CertificateVerification.chain_index).all()
-    return render_template('blockchain.html', certificates=certificates)
+    """Display one window of the certificate blockchain, the tail by default"""
+    after = request.args.get('after', type=int)
+    limit = max(1, min(request.args.get('limit', 50, type=int), MAX_PAGE_SIZE))
+
+    query = CertificateVerification.query
+    if after is not None:
+        certificates = query.filter(CertificateVerification.chain_index > after).order_by(
+            CertificateVerification.chain_index
+        ).limit(limit).all()
+    else:
+        certificates = query.order_by(CertificateVerification.chain_index.desc()).limit(limit).all()
+        certificates.reverse()
+
+    older_after = newer_after = None
+    if certificates:
+        first_index, last_index = certificates[0].chain_index, certificates[-1].chain_index
+        if first_index > 0:
+            older_after = max(first_index - limit, 0) - 1
+        head_index = db.session.query(db.func.max(CertificateVerification.chain_index)).scalar()
+        if head_index is not None and head_index > last_index:
+            newer_after = last_index
+
+    return render_template('blockchain.html', certificates=certificates, limit=limit,
+                           older_after=older_after, newer_after=newer_after)
 
 @blockchain_bp.route('/api/blockchain')
 def get_blockchain():
-    """API endpoint to get blockchain data"""
-    certificates = CertificateVerification.query.order_by(CertificateVerification.chain_index).all()
-    blockchain_data = []
-
-    for cert in certificates:
-        blockchain_data.append({
-            'certificate_id': cert.certificate_id,
-            'chain_index': cert.chain_index,
-            'certificate_hash': cert.certificate_hash,
-            'previous_hash': cert.previous_hash,
-            'created_at': cert.created_at.isoformat(),
-            'is_verified': cert.is_verified
-        })
+    """
+    API endpoint to get blockchain data, one keyset-paginated window at a time.
+
+    Query parameters: after, before, limit, from_index, to_index, since, until,
+    fields (comma separated) and recompute. Without a cursor or range the
+    latest blocks are returned.
+    """
+    try:
+        fields = request.args.get('fields')
+        blocks, next_cursor = query_chain_window(
+            after=request.args.get('after', type=int),
+            before=request.args.get('before', type=int),
+            limit=request.args.get('limit', DEFAULT_PAGE_SIZE, type=int),
+            from_index=request.args.get('from_index', type=int),
+            to_index=request.args.get('to_index', type=int),
+            since=parse_datetime_arg('since'),
+            until=parse_datetime_arg('until'),
+            fields=fields.split(',') if fields else None
+        )
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    # Whole-chain validity from the checkpoint, costing only the blocks appended since
+    recompute_hashes = request.args.get('recompute', 'false').lower() in ('1', 'true', 'yes')
+    validation = verify_chain_incremental(recompute_hashes=recompute_hashes)
+    head_index = db.session.query(db.func.max(CertificateVerification.chain_index)).scalar()
 
     return jsonify({
-        'blockchain': blockchain_data,
-        'total_certificates': len(blockchain_data),
-        'chain_valid': all(cert.verify_chain_integrity() for cert in certificates)
+        'blockchain': blocks,
+        'count': len(blocks),
+        'next_cursor': next_cursor,
+        'total_certificates': head_index + 1 if head_index is not None else 0,
+        'chain_valid': validation['chain_valid'],
+        'first_invalid_index': validation['first_invalid_index'],
+        'invalid_reason': validation['reason']
     })
 
 @blockchain_bp.route('/api/verify_chain/<certificate_id>')
@@ -48,3 +181,82 @@ def verify_chain(certificate_id):
         'previous_hash': certificate.previous_hash,
         'certificate_hash': certificate.certificate_hash
     })
+
+@blockchain_bp.route('/api/chain/integrity')
+def chain_integrity():
+    """API endpoint to verify blocks appended since the last checkpoint (?full=1 re-audits from genesis)"""
+    full = request.args.get('full', 'false').lower() in ('1', 'true', 'yes')
+    recompute_hashes = request.args.get('recompute', 'false').lower() in ('1', 'true', 'yes')
+    result = verify_chain_incremental(full=full, recompute_hashes=recompute_hashes)
+    return jsonify(result)
+
+@blockchain_bp.route('/api/merkle/roots')
+def merkle_roots():
+    """API endpoint listing the published Merkle root of every sealed batch"""
+    roots = MerkleRoot.query.order_by(MerkleRoot.batch_index).all()
+    return jsonify({
+        'batch_size': BATCH_SIZE,
+        'roots': [root.to_dict() for root in roots]
+    })
+
+@blockchain_bp.route('/api/merkle/proof/<certificate_id>')
+def merkle_proof(certificate_id):
+    """API endpoint returning a Merkle inclusion proof for a certificate"""
+    certificate = CertificateVerification.query.filter_by(certificate_id=certificate_id).first()
+
+    if not certificate:
+        return jsonify({"error": "Certificate not found"}), 404
+
+    return jsonify(certificate_proof(certificate))
+
+@blockchain_bp.route('/api/chain/audit', methods=['POST'])
+def start_chain_audit():
+    """API endpoint to start a full re-hash audit of the chain in the background"""
+    data = request.get_json(silent=True) or {}
+    try:
+        options = {
+            # More processes than cores only adds spawn and scheduling overhead
+            'workers': max(1, min(int(data['workers']), os.cpu_count() or 1)) if data.get('workers') else None,
+            'chunk_size': int(data.get('chunk_size', 5000)),
+            'start_index': int(data.get('start_index', 0))
+        }
+    except (TypeError, ValueError):
+        return jsonify({"error": "workers, chunk_size and start_index must be integers"}), 400
+
+    job_id = audit_jobs.start(current_app._get_current_object(), **options)
+    return jsonify({'job_id': job_id, 'status': 'running'}), 202
+
+@blockchain_bp.route('/api/chain/audit/<job_id>')
+def chain_audit_status(job_id):
+    """API endpoint to get the status and result of an audit job"""
+    job = audit_jobs.get(job_id)
+
+    if not job:
+        return jsonify({"error": "Audit job not found"}), 404
+
+    return jsonify(job)
+
+@blockchain_bp.route('/api/chain/snapshot')
+def chain_snapshot():
+    """API endpoint to download the chain as a binary snapshot for offline auditors"""
+    start_index = request.args.get('start_index', 0, type=int)
+    key = current_app.config.get('CHAIN_SNAPSHOT_KEY')
+
+    fd, path = tempfile.mkstemp(suffix='.chain')
+    os.close(fd)
+    snapshot = export_snapshot(path, start_index=start_index, key=key.encode() if key else None)
+
+    @after_this_request
+    def remove_snapshot(response):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+        return response
+
+    return send_file(
+        path,
+        as_attachment=True,
+        download_name=f"chain_{start_index}_{start_index + snapshot['records']}.chain",
+        mimetype='application/octet-stream'
+    )
@@ -0,0 +1,254 @@
+"""
+Bloom filter over every verification_key and certificate_id.
+
+A Bloom filter answers "definitely not present" or "maybe present". Invalid
+codes from typos, scanners and bots are almost always definite misses, so
+they can be rejected without a database round trip; only possible hits go on
+to the real lookup. The filter is built at startup, updated by the chain
+append service as certificates are committed, and periodically catches up
+on rows written by other processes. Ids skipped by a catch-up are re-checked
+on later ones, since another process may commit them out of id order.
+A miss also forces a catch-up before it is trusted, so a certificate another
+process committed since the last one is not rejected; that costs one indexed
+range read per miss instead of the full lookup.
+"""
+
+import hashlib
+import logging
+import math
+import threading
+import time
+
+from sqlalchemy import or_
+
+from .models import CertificateVerification, db
+
+logger = logging.getLogger(__name__)
+
+
+class BloomFilter:
+    def __init__(self, capacity, error_rate=0.001):
+        self.capacity = max(1, capacity)
+        self.error_rate = error_rate
+        self.num_bits = max(8, int(-self.capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.num_hashes = max(1, round(self.num_bits / self.capacity * math.log(2)))
+        self.bits = bytearray((self.num_bits + 7) // 8)
+        self.count = 0
+
+    def _positions(self, item):
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return [(h1 + i * h2) % self.num_bits for i in range(self.num_hashes)]
+
+    def add(self, item):
+        """Add an item; re-adding one already present does not inflate the count"""
+        added = False
+        for position in self._positions(item):
+            mask = 1 << (position & 7)
+            if not self.bits[position >> 3] & mask:
+                self.bits[position >> 3] |= mask
+                added = True
+        if added:
+            self.count += 1
+
+    def __contains__(self, item):
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(item))
+
+    def false_positive_rate(self):
+        """Expected false-positive rate at the current number of items"""
+        return (1 - math.exp(-self.num_hashes * self.count / self.num_bits)) ** self.num_hashes
+
+
+class CertificateFilter:
+    """Negative-lookup filter for verification keys and certificate IDs"""
+
+    MAX_TRACKED_GAPS = 10000  # Skipped ids remembered for a re-check
+    MAX_RECHECK = 1000  # Skipped ids re-checked per refresh
+
+    def __init__(self, capacity=1000000, error_rate=0.001, refresh_interval=5, gap_timeout=300):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.refresh_interval = refresh_interval  # Seconds between catch-ups on other processes' rows
+        self.gap_timeout = gap_timeout  # Seconds a skipped id is re-checked before it counts as rolled back
+        self.stats = {'lookups': 0, 'definite_misses': 0, 'rebuilds': 0}
+        self._filter = None
+        self._last_id = 0
+        self._gaps = {}  # Skipped id -> monotonic deadline for re-checking it
+        self._last_refresh = 0
+        self._refreshing = False
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        """Read BLOOM_FILTER_* settings and build the filter from the database"""
+        self.capacity = app.config.get('BLOOM_FILTER_CAPACITY', self.capacity)
+        self.error_rate = app.config.get('BLOOM_FILTER_ERROR_RATE', self.error_rate)
+        self.refresh_interval = app.config.get('BLOOM_FILTER_REFRESH_INTERVAL', self.refresh_interval)
+        self.gap_timeout = app.config.get('BLOOM_FILTER_GAP_TIMEOUT', self.gap_timeout)
+        app.extensions['certificate_filter'] = self
+        with app.app_context():
+            self.rebuild()
+
+    def rebuild(self):
+        """Build a fresh filter from every stored certificate, sized for growth"""
+        total = CertificateVerification.query.count()
+        # Two items per certificate, with room for the chain to double before the next rebuild
+        bloom = BloomFilter(max(self.capacity, total * 4), self.error_rate)
+        # Not shared until it is swapped in, so rows are added without the lock
+        last_id, skipped, _ = self._scan(0, [], lambda rows: self._add_rows(bloom, rows))
+        deadline = time.monotonic() + self.gap_timeout
+        with self._lock:
+            self._filter = bloom
+            self._last_id = last_id
+            self._gaps = dict.fromkeys(skipped, deadline)
+            self._last_refresh = time.monotonic()
+        self.stats['rebuilds'] += 1
+        logger.info(f"Certificate filter built with {bloom.count // 2} certificates")
+
+    @staticmethod
+    def _add_rows(bloom, rows):
+        for row in rows:
+            bloom.add('key:' + row.verification_key)
+            bloom.add('id:' + row.certificate_id)
+
+    def _scan(self, after_id, recheck, add, batch_size=5000):
+        """
+        Read rows with id > after_id plus the ids in recheck, passing them to add() in batches.
+
+        Returns (highest id seen, ids skipped below it, rechecked ids found).
+        A skipped id may belong to a transaction that has not committed yet:
+        ids are assigned at insert but rows become visible at commit, so
+        another process can commit id 5 after id 6.
+        """
+        criteria = CertificateVerification.id > after_id
+        if recheck:
+            criteria = or_(criteria, CertificateVerification.id.in_(recheck))
+        rows = db.session.query(
+            CertificateVerification.id,
+            CertificateVerification.verification_key,
+            CertificateVerification.certificate_id
+        ).filter(criteria).order_by(CertificateVerification.id).yield_per(batch_size)
+
+        last_id = after_id
+        skipped = []
+        found = []
+        batch = []
+        for row in rows:
+            if row.id <= after_id:
+                found.append(row.id)
+            else:
+                room = self.MAX_TRACKED_GAPS - len(skipped)
+                skipped.extend(range(last_id + 1, min(row.id, last_id + 1 + max(room, 0))))
+                last_id = row.id
+            batch.append(row)
+            if len(batch) >= batch_size:
+                add(batch)
+                batch = []
+        if batch:
+            add(batch)
+        return last_id, skipped, found
+
+    def refresh(self, force=False):
+        """
+        Catch up on rows committed by other processes since the last refresh.
+
+        Runs at most once per refresh_interval unless force is set. Returns
+        True when this call caught up, False when it was skipped.
+        """
+        now = time.monotonic()
+        with self._lock:
+            if self._filter is None or self._refreshing:
+                return False
+            if not force and now - self._last_refresh < self.refresh_interval:
+                return False
+            self._refreshing = True
+            self._last_refresh = now
+            bloom, after_id = self._filter, self._last_id
+            self._gaps = {pk: deadline for pk, deadline in self._gaps.items() if deadline > now}
+            recheck = sorted(self._gaps)[:self.MAX_RECHECK]
+
+        # The query runs without the lock so lookups are not held up; rows are added under it
+        def add(rows):
+            with self._lock:
+                self._add_rows(bloom, rows)
+
+        try:
+            last_id, skipped, found = self._scan(after_id, recheck, add)
+        finally:
+            with self._lock:
+                self._refreshing = False
+
+        with self._lock:
+            if self._filter is bloom:
+                self._last_id = max(self._last_id, last_id)
+                for pk in found:
+                    self._gaps.pop(pk, None)
+                deadline = now + self.gap_timeout
+                for pk in skipped[:max(self.MAX_TRACKED_GAPS - len(self._gaps), 0)]:
+                    self._gaps.setdefault(pk, deadline)
+            overfull = bloom.count > bloom.capacity
+        if overfull:
+            # Past capacity the false-positive rate climbs quickly
+            self.rebuild()
+        return True
+
+    def on_chain_append(self, blocks):
+        """Chain commit listener: add newly committed certificates"""
+        with self._lock:
+            if self._filter is None:
+                return
+            for block in blocks:
+                self._filter.add('key:' + block['verification_key'])
+                self._filter.add('id:' + block['certificate_id'])
+
+    def _might_contain(self, item):
+        if self._filter is None:
+            return True
+        try:
+            self.refresh()
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f"Certificate filter refresh failed: {e}")
+        self.stats['lookups'] += 1
+        if item in self._filter:
+            return True
+        try:
+            # Another process may have committed it since the last catch-up
+            if not self.refresh(force=True):
+                return True  # A catch-up is already running; let the database answer
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f"Certificate filter refresh failed: {e}")
+            return True
+        if item in self._filter:
+            return True
+        self.stats['definite_misses'] += 1
+        return False
+
+    def might_contain_key(self, verification_key):
+        """False means no certificate has this verification key"""
+        return self._might_contain('key:' + verification_key)
+
+    def might_contain_id(self, certificate_id):
+        """False means no certificate has this certificate ID"""
+        return self._might_contain('id:' + certificate_id)
+
+    def get_stats(self):
+        bloom = self._filter
+        if bloom is None:
+            return {**self.stats, 'ready': False}
+        return {
+            **self.stats,
+            'ready': True,
+            'items': bloom.count,
+            'capacity': bloom.capacity,
+            'bits': bloom.num_bits,
+            'hash_functions': bloom.num_hashes,
+            'memory_bytes': len(bloom.bits),
+            'target_false_positive_rate': bloom.error_rate,
+            'estimated_false_positive_rate': round(bloom.false_positive_rate(), 8)
+        }
+
+
+# Global certificate filter instance
+certificate_filter = CertificateFilter()
@@ -0,0 +1,308 @@
+"""
+Serialized chain append service.
+
+Every new certificate goes through a single worker thread that owns the chain
+head. Callers submit pending certificates to a queue; the worker takes whatever
+is waiting (up to max_batch_size), assigns chain indexes and previous hashes in
+order and commits the whole group in one transaction. Because only the worker
+links blocks, concurrent wipes and uploads can no longer read the same head
+and fork the chain.
+
+The head itself (index and hash) is cached in process memory by ChainHead, so
+appends no longer sort the table to find it; each group only confirms with an
+indexed lookup that no other process has moved the head in the meantime.
+"""
+
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from datetime import datetime
+
+from sqlalchemy import insert
+from sqlalchemy.exc import IntegrityError
+
+from .models import CertificateVerification, db
+from .chain_validator import record_rehash_boundary
+from .merkle import BATCH_SIZE, seal_completed_batches
+from .statistics import record_certificates
+
+logger = logging.getLogger(__name__)
+
+
+class ChainHead:
+    """Process-local cache of the chain head as an (index, hash) pair"""
+
+    EMPTY = (-1, None)
+
+    def __init__(self):
+        self._head = None  # Swapped as one tuple so readers never see a torn head
+        self.stats = {'hits': 0, 'reloads': 0}
+
+    @property
+    def loaded(self):
+        return self._head is not None
+
+    def get(self):
+        """Return the cached (index, hash), loading it on first use"""
+        if self._head is None:
+            self.load()
+        return self._head
+
+    def load(self):
+        """Read the head from the database; the slow path, used at startup and after drift"""
+        last_certificate = CertificateVerification.get_last_certificate()
+        if last_certificate:
+            self._head = (last_certificate.chain_index, last_certificate.certificate_hash)
+        else:
+            self._head = self.EMPTY
+        self.stats['reloads'] += 1
+        return self._head
+
+    def set(self, chain_index, certificate_hash):
+        """Record a newly committed head"""
+        self._head = (chain_index, certificate_hash)
+
+    def invalidate(self):
+        """Forget the cached head so the next append reloads it"""
+        self._head = None
+
+    def lock_current(self):
+        """
+        Confirm the cached head is still the chain head and lock it for this transaction.
+
+        One indexed range read of at most two rows: the cached head must still
+        carry its hash and no block may follow it. If another process has
+        advanced or rewritten the head, the cache is reloaded from the database.
+        """
+        for _ in range(3):
+            index, head_hash = self.get()
+            rows = db.session.query(
+                CertificateVerification.chain_index,
+                CertificateVerification.certificate_hash
+            ).filter(
+                CertificateVerification.chain_index >= max(index, 0)
+            ).order_by(CertificateVerification.chain_index).limit(2).with_for_update().all()
+
+            if index < 0:
+                current = not rows
+            else:
+                current = len(rows) == 1 and tuple(rows[0]) == (index, head_hash)
+
+            if current:
+                self.stats['hits'] += 1
+                return index, head_hash
+
+            logger.info("Chain head moved outside this process; reloading")
+            self.load()
+
+        # Still racing another writer; the unique chain position rejects any fork at commit
+        return self.get()
+
+
+class ChainAppendService:
+    def __init__(self, max_batch_size=100, max_wait=0.002):
+        self.app = None
+        self.head = ChainHead()
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait  # Seconds to linger for more work after the first item
+        self.stats = {'appended': 0, 'batches': 0, 'failed': 0}
+        self._queue = queue.Queue()
+        self._worker = None
+        self._worker_lock = threading.Lock()
+        self._commit_listeners = []
+
+    def add_commit_listener(self, listener):
+        """Call listener(blocks) in the worker after every successful group commit"""
+        if listener not in self._commit_listeners:
+            self._commit_listeners.append(listener)
+
+    def init_app(self, app):
+        """Bind the service to an app, load the chain head and seal any full Merkle batches"""
+        self.app = app
+        app.extensions['chain_append_service'] = self
+        with app.app_context():
+            head_index, _ = self.head.load()
+            # Blocks already in the chain predate this service and cannot be re-hashed
+            record_rehash_boundary(head_index + 1)
+            # Sealing otherwise only happens when an append completes a batch
+            seal_completed_batches()
+
+    def submit(self, fields):
+        """
+        Queue a certificate for appending to the chain.
+
+        Parameters:
+        - fields: CertificateVerification column values such as certificate_id,
+          verification_key and random_text. created_at, previous_hash,
+          certificate_hash and chain_index are assigned by the service.
+
+        Returns a Future resolving to a dict with the assigned block fields.
+        """
+        future = Future()
+        self._ensure_worker()
+        self._queue.put((dict(fields), future))
+        return future
+
+    def append(self, fields, timeout=30):
+        """Append a certificate and wait until its group has been committed"""
+        return self.submit(fields).result(timeout=timeout)
+
+    def submit_many(self, fields_list):
+        """
+        Queue several certificates to be linked in order and committed together.
+
+        The group is never split across transactions: either every certificate
+        is appended or none is. Returns a Future resolving to the list of
+        assigned block dicts, in the order given.
+        """
+        future = Future()
+        if not fields_list:
+            future.set_result([])
+            return future
+        self._ensure_worker()
+        self._queue.put(([dict(fields) for fields in fields_list], future))
+        return future
+
+    def append_many(self, fields_list, timeout=60):
+        """Append a group of certificates in one transaction and wait for the commit"""
+        return self.submit_many(fields_list).result(timeout=timeout)
+
+    def _ensure_worker(self):
+        if self.app is None:
+            raise RuntimeError('ChainAppendService is not bound to an app')
+        with self._worker_lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._run, name='chain-append', daemon=True)
+                self._worker.start()
+
+    def _next_batch(self):
+        """Block for the first pending item, then drain the queue up to max_batch_size"""
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                if remaining > 0:
+                    batch.append(self._queue.get(timeout=remaining))
+                else:
+                    batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return [(fields, future) for fields, future in batch if future.set_running_or_notify_cancel()]
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            if not batch:
+                continue
+            with self.app.app_context():
+                try:
+                    self._commit_batch(batch)
+                finally:
+                    db.session.remove()
+
+    def _commit_batch(self, batch, retry=True):
+        try:
+            blocks, results = self._link_and_commit(batch)
+        except IntegrityError as e:
+            db.session.rollback()
+            # Another writer may have taken the chain index we assigned
+            self.head.invalidate()
+            if len(batch) > 1:
+                # One bad submission (e.g. a duplicate id) must not fail the others in the group
+                for item in batch:
+                    self._commit_batch([item])
+                return
+            if retry:
+                # Relink once against the reloaded head before giving up
+                self._commit_batch(batch, retry=False)
+                return
+            self.stats['failed'] += 1
+            batch[0][1].set_exception(e)
+            return
+        except Exception as e:
+            db.session.rollback()
+            self.head.invalidate()
+            logger.error(f"Chain append failed for {len(batch)} certificate(s): {e}")
+            self.stats['failed'] += len(batch)
+            for _, future in batch:
+                future.set_exception(e)
+            return
+
+        self.stats['appended'] += len(blocks)
+        self.stats['batches'] += 1
+        for listener in self._commit_listeners:
+            try:
+                listener(blocks)
+            except Exception as e:
+                logger.error(f"Chain commit listener failed: {e}")
+
+        # Sealed before the callers resume, so a completed batch has its root by the time append() returns
+        if any((block['chain_index'] + 1) % BATCH_SIZE == 0 for block in blocks):
+            try:
+                seal_completed_batches()
+            except Exception as e:
+                db.session.rollback()
+                logger.error(f"Failed to seal Merkle batch: {e}")
+
+        for (_, future), result in zip(batch, results):
+            future.set_result(result)
+
+    def _link_and_commit(self, batch):
+        """
+        Link the group onto the current head and commit it in one transaction.
+
+        Returns every new block plus one result per submission: a block dict
+        for submit() and a list of block dicts for submit_many().
+        """
+        head_index, previous_hash = self.head.lock_current()
+        chain_index = head_index + 1
+
+        rows = []
+        blocks = []
+        results = []
+        for fields, _ in batch:
+            linked = []
+            for item in (fields if isinstance(fields, list) else [fields]):
+                # DATETIME columns drop microseconds, so hash the value exactly as it will be stored
+                created_at = datetime.utcnow().replace(microsecond=0)
+                certificate_hash = CertificateVerification.calculate_certificate_hash({
+                    'certificate_id': item['certificate_id'],
+                    'random_text': item['random_text'],
+                    'created_at': created_at.isoformat()
+                }, previous_hash)
+
+                rows.append({
+                    'is_verified': False,
+                    'verified_at': None,
+                    **item,
+                    'created_at': created_at,
+                    'previous_hash': previous_hash,
+                    'certificate_hash': certificate_hash,
+                    'chain_index': chain_index
+                })
+                linked.append({
+                    'certificate_id': item['certificate_id'],
+                    'verification_key': item['verification_key'],
+                    'chain_index': chain_index,
+                    'previous_hash': previous_hash,
+                    'certificate_hash': certificate_hash,
+                    'created_at': created_at
+                })
+                previous_hash = certificate_hash
+                chain_index += 1
+            blocks.extend(linked)
+            results.append(linked if isinstance(fields, list) else linked[0])
+
+        # One multi-row INSERT for the whole group instead of a flush per object
+        db.session.execute(insert(CertificateVerification), rows)
+        record_certificates(db.session, blocks)
+        db.session.commit()
+        self.head.set(blocks[-1]['chain_index'], blocks[-1]['certificate_hash'])
+        return blocks, results
+
+
+# Global append service instance
+chain_append_service = ChainAppendService()
@@ -0,0 +1,213 @@
+"""
+Full-chain re-hash audit.
+
+Unlike the routine checks, the audit recomputes calculate_certificate_hash for
+every block from its stored fields, so tampering with random_text, created_at
+or certificate_id is caught even when the previous_hash links still line up.
+Blocks before rehash_from_index() were hashed from fields that were never
+stored; they are link-checked only and reported as such, not as corrupt.
+Rows are streamed from the database with a server-side cursor and hashed in
+chunks across a process pool; only a bounded number of chunks is in flight at
+once, so memory stays flat however long the chain is.
+
+The pool's processes are spawned, not forked: audits start from request
+threads of a multi-threaded server, and a forked child would inherit held
+locks and pooled database connections. Workers only receive plain tuples.
+"""
+
+import logging
+import multiprocessing
+import os
+import threading
+import time
+import uuid
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+from .models import CertificateVerification
+from .chain_validator import rehash_from_index, stream_chain
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CHUNK_SIZE = 5000
+
+
+def _rehash_chunk(rows):
+    """Recompute the hashes of one chunk; returns the first mismatching chain_index or None"""
+    for chain_index, certificate_id, random_text, created_at, previous_hash, certificate_hash in rows:
+        expected = CertificateVerification.calculate_certificate_hash({
+            'certificate_id': certificate_id,
+            'random_text': random_text,
+            'created_at': created_at
+        }, previous_hash)
+        if expected != certificate_hash:
+            return chain_index
+    return None
+
+
+def audit_chain(workers=None, chunk_size=DEFAULT_CHUNK_SIZE, start_index=0, rehash_from=None, progress=None):
+    """
+    Re-hash and re-link the chain, reporting the first divergence and throughput.
+
+    Parameters:
+    - workers: hashing processes; defaults to the CPU count, 1 hashes inline
+    - chunk_size: blocks per unit of work sent to a worker
+    - start_index: chain_index to start from; linkage is checked against the block before it
+    - rehash_from: first chain_index to re-hash, rehash_from_index() by default
+    - progress: optional callback receiving the number of blocks checked so far
+
+    Returns a dict with 'chain_valid', 'blocks_checked', 'link_checked_only',
+    'first_divergence' ({'chain_index', 'reason'} or None), 'elapsed_seconds'
+    and 'blocks_per_second'.
+    """
+    workers = workers or os.cpu_count() or 1
+    if rehash_from is None:
+        rehash_from = rehash_from_index()
+    started = time.monotonic()
+
+    expected_index, expected_previous_hash = start_index, None
+    if start_index > 0:
+        previous = CertificateVerification.query.filter_by(chain_index=start_index - 1).first()
+        if previous is None:
+            raise ValueError(f"No block at chain index {start_index - 1} to start the audit from")
+        expected_previous_hash = previous.certificate_hash
+
+    link_divergence = None
+    hash_divergence = None
+    blocks_checked = 0
+    link_checked_only = 0
+    pool = None
+    if workers > 1:
+        pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
+    in_flight = deque()
+
+    def collect(future_or_result):
+        nonlocal hash_divergence
+        mismatch = future_or_result.result() if pool else future_or_result
+        if mismatch is not None and hash_divergence is None:
+            hash_divergence = mismatch
+
+    def dispatch(chunk):
+        if pool:
+            in_flight.append(pool.submit(_rehash_chunk, chunk))
+            # Keep at most two chunks per worker queued so memory stays bounded
+            while len(in_flight) > workers * 2:
+                collect(in_flight.popleft())
+        else:
+            collect(_rehash_chunk(chunk))
+
+    try:
+        chunk = []
+        for block in stream_chain(batch_size=chunk_size, start_index=start_index):
+            if block.chain_index != expected_index:
+                link_divergence = (expected_index, f'expected chain index {expected_index}, found {block.chain_index}')
+                break
+            if block.previous_hash != expected_previous_hash:
+                link_divergence = (block.chain_index, 'previous_hash does not match the preceding block')
+                break
+            expected_index += 1
+            expected_previous_hash = block.certificate_hash
+            if block.chain_index < rehash_from:
+                blocks_checked += 1
+                link_checked_only += 1
+                continue
+
+            chunk.append((
+                block.chain_index,
+                block.certificate_id,
+                block.random_text,
+                block.created_at.isoformat() if block.created_at else None,
+                block.previous_hash,
+                block.certificate_hash
+            ))
+
+            if len(chunk) >= chunk_size:
+                dispatch(chunk)
+                blocks_checked += len(chunk)
+                chunk = []
+                if progress:
+                    progress(blocks_checked)
+                if hash_divergence is not None:
+                    break
+
+        if chunk and hash_divergence is None:
+            dispatch(chunk)
+            blocks_checked += len(chunk)
+        while in_flight:
+            collect(in_flight.popleft())
+    finally:
+        if pool:
+            pool.shutdown(cancel_futures=True)
+
+    divergences = []
+    if link_divergence:
+        divergences.append({'chain_index': link_divergence[0], 'reason': link_divergence[1]})
+    if hash_divergence is not None:
+        divergences.append({
+            'chain_index': hash_divergence,
+            'reason': 'certificate_hash does not match the recomputed hash'
+        })
+    first_divergence = min(divergences, key=lambda d: d['chain_index']) if divergences else None
+
+    elapsed = time.monotonic() - started
+    return {
+        'chain_valid': first_divergence is None,
+        'blocks_checked': blocks_checked,
+        'link_checked_only': link_checked_only,
+        'start_index': start_index,
+        'rehash_from_index': rehash_from,
+        'first_divergence': first_divergence,
+        'workers': workers,
+        'elapsed_seconds': round(elapsed, 3),
+        'blocks_per_second': round(blocks_checked / elapsed, 1) if elapsed > 0 else None
+    }
+
+
+class AuditJobRunner:
+    """Runs audits in background threads and keeps their status for the API"""
+
+    def __init__(self):
+        self.jobs = {}
+        self._lock = threading.Lock()
+
+    def start(self, app, **options):
+        """Start an audit job and return its id"""
+        job_id = str(uuid.uuid4())
+        job = {
+            'job_id': job_id,
+            'status': 'running',
+            'options': options,
+            'blocks_checked': 0,
+            'started_at': datetime.utcnow().isoformat(),
+            'finished_at': None,
+            'result': None,
+            'error': None
+        }
+        with self._lock:
+            self.jobs[job_id] = job
+
+        def progress(blocks_checked):
+            job['blocks_checked'] = blocks_checked
+
+        def run():
+            with app.app_context():
+                try:
+                    job['result'] = audit_chain(progress=progress, **options)
+                    job['blocks_checked'] = job['result']['blocks_checked']
+                    job['status'] = 'completed'
+                except Exception as e:
+                    logger.error(f"Chain audit {job_id} failed: {e}")
+                    job['error'] = str(e)
+                    job['status'] = 'failed'
+                job['finished_at'] = datetime.utcnow().isoformat()
+
+        threading.Thread(target=run, name=f'chain-audit-{job_id[:8]}', daemon=True).start()
+        return job_id
+
+    def get(self, job_id):
+        return self.jobs.get(job_id)
+
+
+# Global audit job runner instance
+audit_jobs = AuditJobRunner()
@@ -0,0 +1,158 @@
+"""
+Binary chain snapshots for offline auditors.
+
+A snapshot is one flat file:
+
+- a 64-byte header: magic, format version, record size, first chain_index,
+  record count and export time
+- fixed-width 72-byte records: chain_index (u64), previous_hash (32 bytes,
+  zeros for genesis) and certificate_hash (32 bytes), the digests produced by
+  CertificateVerification.calculate_certificate_hash
+- a 72-byte trailer: magic, SHA-256 over the header and the SHA-256 of the
+  records, and an HMAC-SHA256 of that digest under a shared key (zeros when
+  exported unkeyed)
+
+Because every record has the same width, the verifier can mmap the file and
+check index contiguity and hash linkage without parsing or loading the chain.
+"""
+
+import hashlib
+import hmac
+import mmap
+import os
+import struct
+import time
+
+from .chain_validator import stream_chain
+
+MAGIC = b'SIHCHAIN'
+TRAILER_MAGIC = b'SIHSIGN\x00'
+FORMAT_VERSION = 1
+HEADER = struct.Struct('<8sHHIQQQ24x')  # magic, version, record size, reserved, start, count, created
+RECORD = struct.Struct('<Q32s32s')  # chain_index, previous_hash, certificate_hash
+TRAILER = struct.Struct('<8s32s32s')  # magic, sha256(header + sha256(records)), hmac
+GENESIS_HASH = bytes(32)
+
+
+def _digest_bytes(hex_digest):
+    return bytes.fromhex(hex_digest) if hex_digest else GENESIS_HASH
+
+
+def export_snapshot(path, start_index=0, key=None, batch_size=5000):
+    """
+    Write the chain from start_index onwards to a binary snapshot file.
+
+    Rows are streamed from the database so memory use does not depend on chain
+    length. Returns a dict with the record count, first index and file size.
+    """
+    tmp_path = f"{path}.tmp"
+    digest = hashlib.sha256()
+    count = 0
+
+    with open(tmp_path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, FORMAT_VERSION, RECORD.size, 0, start_index, 0, 0))
+        for block in stream_chain(batch_size=batch_size, start_index=start_index):
+            record = RECORD.pack(
+                block.chain_index,
+                _digest_bytes(block.previous_hash),
+                _digest_bytes(block.certificate_hash)
+            )
+            f.write(record)
+            digest.update(record)
+            count += 1
+
+        # The count is only known once the stream ends, so the header is written last
+        header = HEADER.pack(MAGIC, FORMAT_VERSION, RECORD.size, 0, start_index, count, int(time.time()))
+        f.seek(0)
+        f.write(header)
+        f.seek(0, os.SEEK_END)
+
+        content_digest = hashlib.sha256(header + digest.digest()).digest()
+        signature = hmac.new(key, content_digest, hashlib.sha256).digest() if key else bytes(32)
+        f.write(TRAILER.pack(TRAILER_MAGIC, content_digest, signature))
+
+    os.replace(tmp_path, path)
+    return {
+        'path': path,
+        'start_index': start_index,
+        'records': count,
+        'size_bytes': os.path.getsize(path)
+    }
+
+
+def verify_snapshot(path, key=None):
+    """
+    Verify a snapshot file by memory-mapping it.
+
+    Checks the header, the trailer digest (and the HMAC when a key is given),
+    that chain indexes are contiguous and that every record's previous_hash
+    equals the certificate_hash of the record before it.
+    Returns a dict with 'valid', 'records', 'head_hash' and, on failure,
+    'first_invalid_index' and 'reason'.
+    """
+    result = {
+        'valid': False,
+        'records': 0,
+        'start_index': None,
+        'head_hash': None,
+        'first_invalid_index': None,
+        'reason': None
+    }
+
+    with open(path, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        if size < HEADER.size + TRAILER.size:
+            result['reason'] = 'file is too small to be a snapshot'
+            return result
+
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            view = memoryview(mm)
+            try:
+                magic, version, record_size, _, start_index, count, _ = HEADER.unpack_from(view, 0)
+                result['start_index'] = start_index
+                records_end = HEADER.size + count * RECORD.size
+
+                if magic != MAGIC or version != FORMAT_VERSION or record_size != RECORD.size:
+                    result['reason'] = 'unrecognised snapshot header'
+                    return result
+                if records_end + TRAILER.size != size:
+                    result['reason'] = 'file size does not match the record count'
+                    return result
+
+                trailer_magic, content_digest, signature = TRAILER.unpack_from(view, records_end)
+                records_digest = hashlib.sha256(view[HEADER.size:records_end]).digest()
+                expected_digest = hashlib.sha256(bytes(view[:HEADER.size]) + records_digest).digest()
+                if trailer_magic != TRAILER_MAGIC or not hmac.compare_digest(content_digest, expected_digest):
+                    result['reason'] = 'snapshot digest does not match its contents'
+                    return result
+                if key is not None:
+                    expected_signature = hmac.new(key, content_digest, hashlib.sha256).digest()
+                    if not hmac.compare_digest(signature, expected_signature):
+                        result['reason'] = 'snapshot signature is invalid'
+                        return result
+
+                expected_index = start_index
+                head_hash = None
+                for chain_index, previous_hash, certificate_hash in RECORD.iter_unpack(view[HEADER.size:records_end]):
+                    if chain_index != expected_index:
+                        result['first_invalid_index'] = chain_index
+                        result['reason'] = f'expected chain index {expected_index}, found {chain_index}'
+                        break
+                    if head_hash is not None and previous_hash != head_hash:
+                        result['first_invalid_index'] = chain_index
+                        result['reason'] = 'previous_hash does not match the preceding block'
+                        break
+                    if chain_index == 0 and previous_hash != GENESIS_HASH:
+                        result['first_invalid_index'] = chain_index
+                        result['reason'] = 'genesis block has a previous_hash'
+                        break
+                    head_hash = certificate_hash
+                    expected_index += 1
+
+                result['records'] = expected_index - start_index
+                result['head_hash'] = head_hash.hex() if head_hash else None
+                result['valid'] = result['reason'] is None
+            finally:
+                view.release()
+
+    return result
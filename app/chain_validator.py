@@ -0,0 +1,220 @@
+from .models import CertificateVerification, ChainCheckpoint, ChainRehashBoundary, db
+from datetime import datetime
+from flask import current_app
+from sqlalchemy.exc import IntegrityError
+
+
+def stream_chain(batch_size=1000, start_index=None):
+    """Stream the fields needed for validation in chain order, one batch at a time"""
+    query = db.session.query(
+        CertificateVerification.chain_index,
+        CertificateVerification.certificate_id,
+        CertificateVerification.random_text,
+        CertificateVerification.created_at,
+        CertificateVerification.previous_hash,
+        CertificateVerification.certificate_hash,
+    )
+    if start_index is not None:
+        query = query.filter(CertificateVerification.chain_index >= start_index)
+    return query.order_by(CertificateVerification.chain_index).yield_per(batch_size)
+
+
+def recompute_certificate_hash(block):
+    """Recompute a block's hash from its stored fields"""
+    certificate_data = {
+        'certificate_id': block.certificate_id,
+        'random_text': block.random_text,
+        'created_at': block.created_at.isoformat() if block.created_at else None,
+    }
+    return CertificateVerification.calculate_certificate_hash(certificate_data, block.previous_hash)
+
+
+def rehash_from_index():
+    """
+    First chain_index whose hash can be recomputed; earlier blocks are only link-checked.
+
+    CHAIN_REHASH_FROM_INDEX overrides the boundary recorded on first startup.
+    """
+    configured = current_app.config.get('CHAIN_REHASH_FROM_INDEX')
+    if configured is not None:
+        return int(configured)
+    boundary = db.session.get(ChainRehashBoundary, 1)
+    return boundary.rehash_from_index if boundary else 0
+
+
+def record_rehash_boundary(next_index):
+    """
+    Record the rehash boundary the first time the append service starts.
+
+    Blocks already in the chain at that point were hashed by the old append
+    paths and cannot be re-hashed, so the boundary is the next index to be
+    written. Later startups keep the recorded value.
+    """
+    if db.session.get(ChainRehashBoundary, 1) is not None:
+        return
+    try:
+        with db.session.begin_nested():
+            db.session.add(ChainRehashBoundary(id=1, rehash_from_index=next_index))
+        db.session.commit()
+    except IntegrityError:
+        # Another process recorded it first
+        db.session.rollback()
+
+
+def validate_chain(blocks=None, recompute_hashes=False, expected_index=0, expected_previous_hash=None,
+                   rehash_from=None):
+    """
+    Validate the certificate chain in a single ordered pass.
+
+    Checks that chain indexes are contiguous, that every block links to the hash
+    of the block before it and, when recompute_hashes is set, that each stored
+    certificate_hash matches the hash recomputed from the block's fields.
+
+    Parameters:
+    - blocks: rows ordered by chain_index; streamed from the database when omitted
+    - recompute_hashes: also recompute calculate_certificate_hash for every block
+    - expected_index / expected_previous_hash: where the pass starts, genesis by default
+    - rehash_from: first chain_index to recompute, rehash_from_index() by default;
+      blocks before it are link-checked only
+
+    Returns a dict with 'chain_valid', the number of blocks checked (and how
+    many of them were link-checked only), the last valid head and, on
+    failure, the chain index and reason of the first break.
+    """
+    if blocks is None:
+        blocks = stream_chain(start_index=expected_index)
+    if recompute_hashes and rehash_from is None:
+        rehash_from = rehash_from_index()
+
+    checked = 0
+    link_checked_only = 0
+    head_index = expected_index - 1
+    head_hash = expected_previous_hash
+
+    for block in blocks:
+        reason = None
+        if block.chain_index != expected_index:
+            reason = f'expected chain index {expected_index}, found {block.chain_index}'
+        elif block.previous_hash != head_hash:
+            reason = 'previous_hash does not match the preceding block'
+        elif recompute_hashes and block.chain_index >= rehash_from and (
+            recompute_certificate_hash(block) != block.certificate_hash
+        ):
+            reason = 'certificate_hash does not match the recomputed hash'
+
+        if reason:
+            return {
+                'chain_valid': False,
+                'blocks_checked': checked,
+                'link_checked_only': link_checked_only,
+                'rehash_from_index': rehash_from,
+                'head_index': head_index,
+                'head_hash': head_hash,
+                'first_invalid_index': block.chain_index,
+                'reason': reason,
+            }
+
+        checked += 1
+        if recompute_hashes and block.chain_index < rehash_from:
+            link_checked_only += 1
+        head_index = block.chain_index
+        head_hash = block.certificate_hash
+        expected_index += 1
+
+    return {
+        'chain_valid': True,
+        'blocks_checked': checked,
+        'link_checked_only': link_checked_only,
+        'rehash_from_index': rehash_from,
+        'head_index': head_index,
+        'head_hash': head_hash,
+        'first_invalid_index': None,
+        'reason': None,
+    }
+
+
+def verify_chain_incremental(full=False, recompute_hashes=False):
+    """
+    Verify only the blocks appended since the last recorded checkpoint.
+
+    The stored checkpoint holds the highest chain index already verified and its
+    hash. Routine checks confirm that block still carries that hash and then
+    validate the blocks after it, so the cost tracks the number of new blocks.
+    Passing full=True re-audits the whole chain from genesis.
+    The checkpoint is moved to the last block that validated, so a full audit
+    that finds a break also pulls the watermark back below it.
+    """
+    checkpoint = ChainCheckpoint.get_checkpoint()
+    full_audit = full or checkpoint is None
+    start_index, start_hash = 0, None
+
+    if not full_audit:
+        anchor = CertificateVerification.query.filter_by(chain_index=checkpoint.verified_index).first()
+        if not anchor or anchor.certificate_hash != checkpoint.head_hash:
+            return {
+                'chain_valid': False,
+                'blocks_checked': 0,
+                'link_checked_only': 0,
+                'rehash_from_index': None,
+                'head_index': checkpoint.verified_index,
+                'head_hash': checkpoint.head_hash,
+                'first_invalid_index': checkpoint.verified_index,
+                'reason': 'checkpoint block is missing or its hash has changed',
+                'checked_from': checkpoint.verified_index,
+                'full_audit': False,
+            }
+        start_index, start_hash = checkpoint.verified_index + 1, checkpoint.head_hash
+
+    result = validate_chain(
+        recompute_hashes=recompute_hashes,
+        expected_index=start_index,
+        expected_previous_hash=start_hash,
+    )
+    result['checked_from'] = start_index
+    result['full_audit'] = full_audit
+
+    if result['head_index'] >= start_index:
+        save_checkpoint(checkpoint, result['head_index'], result['head_hash'], full_audit and result['chain_valid'])
+    elif full_audit and checkpoint is not None:
+        # A full audit that breaks at genesis leaves nothing trusted
+        db.session.delete(checkpoint)
+        db.session.commit()
+
+    return result
+
+
+def save_checkpoint(checkpoint, verified_index, head_hash, full_audit_passed=False):
+    """
+    Move the watermark to a newly verified head, creating the row on first use.
+
+    Concurrent requests may all find no checkpoint and try to create it; the
+    losers re-read the winner's row and only move it forward.
+    """
+    now = datetime.utcnow()
+    if checkpoint is None:
+        try:
+            with db.session.begin_nested():
+                db.session.add(ChainCheckpoint(
+                    id=1,
+                    verified_index=verified_index,
+                    head_hash=head_hash,
+                    verified_at=now,
+                    full_audit_at=now if full_audit_passed else None
+                ))
+            db.session.commit()
+            return
+        except IntegrityError:
+            # Another request recorded the first checkpoint
+            checkpoint = db.session.get(ChainCheckpoint, 1)
+            if checkpoint is None or verified_index < checkpoint.verified_index or (
+                verified_index == checkpoint.verified_index and not full_audit_passed
+            ):
+                db.session.rollback()
+                return
+
+    checkpoint.verified_index = verified_index
+    checkpoint.head_hash = head_hash
+    checkpoint.verified_at = now
+    if full_audit_passed:
+        checkpoint.full_audit_at = now
+    db.session.commit()
@@ -0,0 +1,172 @@
+"""
+Content-Encoding support for certificate upload bodies.
+
+Field stations on slow links may send gzip- or zstd-compressed JSON. Bodies
+are decompressed incrementally through bounded reads, and decoding stops
+with a 413 as soon as the output passes MAX_DECODED_BODY_BYTES, so a small
+compressed body cannot expand into unbounded memory. Streaming endpoints
+consume the body in bounded pieces and may run far past that cap; for them
+decoding instead stops once the output outgrows the input by more than
+MAX_STREAM_COMPRESSION_RATIO. The compression ratio and decode time of each
+request are kept in flask.g for the response.
+
+zstd needs the optional zstandard package; without it such bodies get a 415.
+"""
+
+import gzip
+import io
+import json
+import time
+import zlib
+
+from flask import current_app, g, request
+
+try:
+    import zstandard
+except ImportError:  # zstd is optional, gzip always works
+    zstandard = None
+
+DEFAULT_MAX_DECODED_BODY_BYTES = 64 * 1024 * 1024
+DEFAULT_MAX_STREAM_COMPRESSION_RATIO = 100
+RATIO_CHECK_AFTER_BYTES = 1024 * 1024  # Headers and short bodies skew the ratio
+CHUNK_SIZE = 64 * 1024
+
+
+class BodyDecodingError(Exception):
+    """A request body that cannot be decoded; carries the HTTP status to return"""
+
+    def __init__(self, message, status_code=400):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class _CountingReader:
+    """Counts the compressed bytes read from the request stream"""
+
+    def __init__(self, stream):
+        self._stream = stream
+        self.bytes_read = 0
+
+    def read(self, size=-1):
+        data = self._stream.read(size)
+        self.bytes_read += len(data)
+        return data
+
+    def readable(self):
+        return True
+
+
+class _DecodedReader(io.RawIOBase):
+    """Raw reader over a decompressing source that enforces the size or ratio cap and times decoding"""
+
+    def __init__(self, source, compressed, info, max_bytes=None, max_ratio=None):
+        self._source = source
+        self._compressed = compressed
+        self._info = info
+        self._max_bytes = max_bytes
+        self._max_ratio = max_ratio
+        self._seconds = 0.0
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        started = time.perf_counter()
+        try:
+            data = self._source.read(len(buffer))
+        except (OSError, EOFError, zlib.error) as e:
+            raise BodyDecodingError(f"Malformed {self._info['encoding']} body: {e}")
+        except Exception as e:
+            if zstandard is not None and isinstance(e, zstandard.ZstdError):
+                raise BodyDecodingError(f"Malformed zstd body: {e}")
+            raise
+        finally:
+            self._seconds += time.perf_counter() - started
+
+        size = len(data)
+        buffer[:size] = data
+        self._info['decoded_bytes'] += size
+        self._info['compressed_bytes'] = self._compressed.bytes_read
+        self._info['decode_ms'] = round(self._seconds * 1000, 3)
+        if self._info['compressed_bytes']:
+            self._info['compression_ratio'] = round(self._info['decoded_bytes'] / self._info['compressed_bytes'], 2)
+        if self._max_bytes is not None and self._info['decoded_bytes'] > self._max_bytes:
+            raise BodyDecodingError(f"Decoded body exceeds {self._max_bytes} bytes", 413)
+        if (self._max_ratio is not None and self._info['decoded_bytes'] > RATIO_CHECK_AFTER_BYTES
+                and self._info['decoded_bytes'] > self._max_ratio * self._info['compressed_bytes']):
+            raise BodyDecodingError(f"Body expands more than {self._max_ratio}x when decoded", 413)
+        return size
+
+
+def supported_encodings():
+    return ['identity', 'gzip'] + (['zstd'] if zstandard is not None else [])
+
+
+def open_request_body(max_decoded_bytes=None, streaming=False):
+    """
+    Return a buffered reader yielding the decoded request body.
+
+    Raises BodyDecodingError for unsupported encodings; read errors and the
+    size cap surface as BodyDecodingError while reading. With streaming=True
+    the caller must read the body in bounded pieces: there is no total cap,
+    only the compression ratio cap.
+    """
+    encoding = request.headers.get('Content-Encoding', 'identity').strip().lower() or 'identity'
+    if encoding == 'identity':
+        return request.stream
+
+    if encoding not in supported_encodings():
+        raise BodyDecodingError(f"Unsupported Content-Encoding: {encoding}", 415)
+
+    max_ratio = None
+    if streaming:
+        max_ratio = current_app.config.get('MAX_STREAM_COMPRESSION_RATIO', DEFAULT_MAX_STREAM_COMPRESSION_RATIO)
+    elif max_decoded_bytes is None:
+        max_decoded_bytes = current_app.config.get('MAX_DECODED_BODY_BYTES', DEFAULT_MAX_DECODED_BODY_BYTES)
+
+    compressed = _CountingReader(request.stream)
+    if encoding == 'gzip':
+        source = gzip.GzipFile(fileobj=compressed, mode='rb')
+    else:
+        source = zstandard.ZstdDecompressor().stream_reader(compressed)
+
+    info = {
+        'encoding': encoding,
+        'compressed_bytes': 0,
+        'decoded_bytes': 0,
+        'compression_ratio': None,
+        'decode_ms': 0.0
+    }
+    g.body_decoding = info
+    return io.BufferedReader(_DecodedReader(source, compressed, info, max_decoded_bytes, max_ratio), CHUNK_SIZE)
+
+
+def read_request_json(max_decoded_bytes=None):
+    """Decode and parse a JSON request body, honouring Content-Encoding"""
+    if request.headers.get('Content-Encoding', 'identity').strip().lower() in ('', 'identity'):
+        return request.get_json(silent=True)
+
+    body = open_request_body(max_decoded_bytes)
+    chunks = []
+    while True:
+        chunk = body.read(CHUNK_SIZE)
+        if not chunk:
+            break
+        chunks.append(chunk)
+    try:
+        return json.loads(b''.join(chunks))
+    except ValueError:
+        raise BodyDecodingError("Request body is not valid JSON")
+
+
+def decoding_headers(response):
+    """after_request hook: report how the request body was decoded"""
+    info = g.get('body_decoding')
+    if info:
+        response.headers['X-Content-Encoding'] = info['encoding']
+        response.headers['X-Compressed-Bytes'] = str(info['compressed_bytes'])
+        response.headers['X-Decoded-Bytes'] = str(info['decoded_bytes'])
+        response.headers['X-Decode-Time-Ms'] = str(info['decode_ms'])
+        if info['compression_ratio'] is not None:
+            response.headers['X-Compression-Ratio'] = str(info['compression_ratio'])
+    return response
@@ -0,0 +1,243 @@
+"""
+Trigram search index over device manufacturer, model and serial_number.
+
+A leading-wildcard ILIKE cannot use an index, so every search scanned the
+device table. Instead each device's searchable text is broken into
+lowercase three-character grams stored in DeviceSearchGram with an index on
+(gram, device_pk):
+
+- every trigram of each field, for substring matches of three or more characters
+- "  x" and " xy" for the start of every word, so one- and two-character
+  queries match word prefixes (typeahead)
+
+A query is answered by finding devices that have all of its grams (an
+indexed lookup plus GROUP BY), taking the MAX_CANDIDATES most promising of
+them (exact and prefix matches first), then confirming the real match on
+that small candidate set and ranking exact, prefix, word-prefix and
+substring hits. The grams are rewritten by a session flush hook whenever a device is
+created, edited or deleted; bulk Core inserts call index_devices() directly.
+"""
+
+import logging
+import re
+
+from sqlalchemy import event, inspect
+
+from .models import db
+
+logger = logging.getLogger(__name__)
+
+SEARCH_FIELDS = ['serial_number', 'model', 'manufacturer']
+FIELD_WEIGHTS = {'serial_number': 3, 'model': 2, 'manufacturer': 1}
+MATCH_SCORES = {'exact': 40, 'prefix': 30, 'word_prefix': 20, 'substring': 10}
+MAX_CANDIDATES = 500  # Devices confirmed and ranked per query
+WORD_SPLIT = re.compile(r'[^0-9a-z]+')
+
+
+class DeviceSearchGram(db.Model):
+    """One trigram of a device's searchable fields"""
+    id = db.Column(db.Integer, primary_key=True)
+    gram = db.Column(db.String(3), nullable=False)
+    device_pk = db.Column(db.Integer, nullable=False, index=True)  # device.id
+
+    __table_args__ = (db.Index('ix_device_search_gram', 'gram', 'device_pk'),)
+
+
+def normalize(value):
+    return ' '.join(str(value).lower().split()) if value else ''
+
+
+def text_grams(values):
+    """All grams stored for a device with the given field values"""
+    grams = set()
+    for value in values:
+        text = normalize(value)
+        for i in range(len(text) - 2):
+            grams.add(text[i:i + 3])
+        for word in WORD_SPLIT.split(text):
+            if word:
+                grams.add('  ' + word[0])
+                grams.add(' ' + word[:2])
+    return grams
+
+
+def query_grams(term):
+    """Grams a device must have to match term; word-prefix grams for short terms"""
+    term = normalize(term)
+    if len(term) >= 3:
+        return {term[i:i + 3] for i in range(len(term) - 2)}
+    if len(term) == 2:
+        return {' ' + term}
+    return {'  ' + term} if term else set()
+
+
+def match_kind(term, value):
+    """How term matches a field value: exact, prefix, word_prefix, substring or None"""
+    text = normalize(value)
+    if not text or not term:
+        return None
+    if text == term:
+        return 'exact'
+    if text.startswith(term):
+        return 'prefix'
+    if any(word.startswith(term) for word in WORD_SPLIT.split(text)):
+        return 'word_prefix'
+    if len(term) >= 3 and term in text:
+        return 'substring'
+    return None
+
+
+def index_devices(connection, devices):
+    """Replace the grams of devices, given as (id, manufacturer, model, serial_number) tuples"""
+    if not devices:
+        return
+    table = DeviceSearchGram.__table__
+    connection.execute(table.delete().where(table.c.device_pk.in_([device[0] for device in devices])))
+    rows = [
+        {'gram': gram, 'device_pk': device[0]}
+        for device in devices
+        for gram in text_grams(device[1:])
+    ]
+    if rows:
+        connection.execute(table.insert(), rows)
+
+
+def remove_devices(connection, device_pks):
+    if device_pks:
+        table = DeviceSearchGram.__table__
+        connection.execute(table.delete().where(table.c.device_pk.in_(list(device_pks))))
+
+
+def candidate_ids_query(term):
+    """
+    SELECT of device ids holding every gram of term, or None if term has no grams.
+
+    Usable as an IN subquery; a trigram hit is necessary but not sufficient, so
+    callers still confirm the match.
+    """
+    grams = query_grams(term)
+    if not grams:
+        return None
+    return db.select(DeviceSearchGram.device_pk).where(
+        DeviceSearchGram.gram.in_(grams)
+    ).group_by(DeviceSearchGram.device_pk).having(
+        db.func.count(db.distinct(DeviceSearchGram.gram)) == len(grams)
+    )
+
+
+def candidate_rank(term, Device):
+    """
+    SQL approximation of match_kind for ordering candidates: 0 exact, 1 prefix,
+    2 word prefix, 3 anything else.
+
+    Candidates beyond MAX_CANDIDATES are dropped, so the best matches must
+    come first; the exact ranking is still done on the rows fetched.
+    """
+    values = [db.func.lower(getattr(Device, field)) for field in SEARCH_FIELDS]
+    return db.case(
+        (db.or_(*(value == term for value in values)), 0),
+        (db.or_(*(value.startswith(term, autoescape=True) for value in values)), 1),
+        (db.or_(*(value.contains(' ' + term, autoescape=True) for value in values)), 2),
+        else_=3
+    )
+
+
+def search_devices(term, limit=20, fields=None):
+    """
+    Ranked devices matching term in manufacturer, model or serial_number.
+
+    Returns dicts of the device's id, device_id, the search fields and any
+    extra columns named in fields, plus match_field, match_kind and score,
+    best match first.
+    """
+    # Imported here: the devices blueprint imports this module
+    from .devices_routes import DEVICE_FIELDS, Device
+
+    term = normalize(term)
+    candidates = candidate_ids_query(term)
+    if candidates is None:
+        return []
+
+    # Only real columns: fields comes straight from the query string
+    columns = ['id', 'device_id'] + SEARCH_FIELDS + [name for name in (fields or []) if name not in SEARCH_FIELDS]
+    columns = [name for name in dict.fromkeys(columns) if name in DEVICE_FIELDS]
+    candidates = candidates.subquery()
+    rows = db.session.query(*(DEVICE_FIELDS[name].label(name) for name in columns)).join(
+        candidates, candidates.c.device_pk == Device.id
+    ).order_by(candidate_rank(term, Device), Device.id).limit(MAX_CANDIDATES).all()
+
+    results = []
+    for row in rows:
+        best = None
+        for field in SEARCH_FIELDS:
+            kind = match_kind(term, getattr(row, field))
+            if kind:
+                score = MATCH_SCORES[kind] + FIELD_WEIGHTS[field]
+                if best is None or score > best[0]:
+                    best = (score, field, kind)
+        if best is None:
+            continue
+        result = {name: getattr(row, name) for name in columns}
+        result.update(score=best[0], match_field=best[1], match_kind=best[2])
+        results.append(result)
+
+    results.sort(key=lambda result: (-result['score'], len(normalize(result[result['match_field']])), result['id']))
+    return results[:limit]
+
+
+def _after_flush(session, flush_context):
+    """Re-index devices whose searchable fields changed in this flush"""
+    changed = []
+    removed = []
+    for obj in session.new:
+        if getattr(obj, '__tablename__', None) == 'device':
+            changed.append(obj)
+    for obj in session.dirty:
+        if getattr(obj, '__tablename__', None) == 'device' and obj not in session.deleted:
+            state = inspect(obj)
+            if any(state.attrs[field].history.has_changes() for field in SEARCH_FIELDS):
+                changed.append(obj)
+    for obj in session.deleted:
+        if getattr(obj, '__tablename__', None) == 'device':
+            removed.append(obj.id)
+
+    if not changed and not removed:
+        return
+    connection = session.connection()
+    remove_devices(connection, removed)
+    index_devices(connection, [
+        (obj.id, obj.manufacturer, obj.model, obj.serial_number) for obj in changed
+    ])
+
+
+def init_app(app):
+    """Hook index maintenance into flushes and build the index for existing devices"""
+    if not event.contains(db.session, 'after_flush', _after_flush):
+        event.listen(db.session, 'after_flush', _after_flush)
+
+    from .devices_routes import Device
+    with app.app_context():
+        if DeviceSearchGram.query.first() is None and Device.query.first() is not None:
+            rebuild_search_index()
+
+
+def rebuild_search_index(batch_size=1000):
+    """Re-index every device; returns the number of devices indexed"""
+    from .devices_routes import Device
+
+    connection = db.session.connection()
+    connection.execute(DeviceSearchGram.__table__.delete())
+    indexed = 0
+    last_id = 0
+    while True:
+        batch = db.session.query(Device.id, Device.manufacturer, Device.model, Device.serial_number).filter(
+            Device.id > last_id
+        ).order_by(Device.id).limit(batch_size).all()
+        if not batch:
+            break
+        index_devices(connection, [tuple(row) for row in batch])
+        indexed += len(batch)
+        last_id = batch[-1].id
+    db.session.commit()
+    logger.info(f"Device search index built for {indexed} devices")
+    return indexed
@@ -1,6 +1,17 @@
-from flask import Blueprint, render_template, jsonify, request, abort
+from flask import Blueprint, Response, render_template, jsonify, request, abort, stream_with_context
 from .models import db
-from datetime import datetime
+from .statistics import INVENTORY_CHANGES, apply_deltas, get_counters, get_recent, get_wipe_rollup
+from .device_search import candidate_ids_query, index_devices, search_devices
+from .blockchain_routes import parse_datetime_arg
+from .content_encoding import BodyDecodingError, open_request_body
+from sqlalchemy.exc import IntegrityError
+from collections import Counter
+from datetime import datetime, timedelta
+from itertools import islice
+import base64
+import csv
+import hashlib
+import io
 import json
 
 devices_bp = Blueprint('devices', __name__)
@@ -20,8 +31,15 @@ class Device(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
-    # Wipe history relationship
-    wipe_history = db.relationship('WipeHistory', backref='device', lazy=True)
+    # Wipe history relationship; a query, since reused drives collect long histories
+    # (the rollup in DeviceWipeRollup answers count and latest wipe)
+    wipe_history = db.relationship('WipeHistory', backref='device', lazy='dynamic', passive_deletes=True)
+
+    # Keyset pagination walks (created_at, id); delta sync walks (updated_at, id)
+    __table_args__ = (
+        db.Index('ix_device_created_at_id', 'created_at', 'id'),
+        db.Index('ix_device_updated_at_id', 'updated_at', 'id'),
+    )
 
     def to_dict(self):
         return {
@@ -47,6 +65,13 @@ class WipeHistory(db.Model):
     wiped_at = db.Column(db.DateTime, default=datetime.utcnow)
     status = db.Column(db.String(20), default='completed')  # completed, failed, in_progress
     
+    # History pages walk (wiped_at, id) within one device; the recent wipes ring
+    # is refilled from the newest (wiped_at, id) overall
+    __table_args__ = (
+        db.Index('ix_wipe_history_device_wiped_at_id', 'device_id', 'wiped_at', 'id'),
+        db.Index('ix_wipe_history_wiped_at_id', 'wiped_at', 'id'),
+    )
+    
     def to_dict(self):
         return {
             'id': self.id,
@@ -57,39 +82,232 @@ class WipeHistory(db.Model):
             'status': self.status
         }
 
+class DeviceTombstone(db.Model):
+    """Marker left by a deleted device for delta sync clients"""
+    id = db.Column(db.Integer, primary_key=True)
+    device_pk = db.Column(db.Integer, nullable=False)  # The deleted device.id
+    device_id = db.Column(db.String(100), nullable=False)
+    deleted_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+    
+    def to_dict(self):
+        return {
+            'id': self.device_pk,
+            'device_id': self.device_id,
+            'deleted_at': self.deleted_at.isoformat()
+        }
+
+TOMBSTONE_RETENTION_DAYS = 30
+
 # Device Management Routes
 @devices_bp.route('/devices')
 def devices():
     """Display devices management page"""
     return render_template('devices.html')
 
+# Fields a client may request with ?fields=; id and created_at are always included as the cursor
+DEVICE_FIELDS = {
+    'id': Device.id,
+    'device_id': Device.device_id,
+    'device_type': Device.device_type,
+    'model': Device.model,
+    'serial_number': Device.serial_number,
+    'capacity': Device.capacity,
+    'manufacturer': Device.manufacturer,
+    'status': Device.status,
+    'is_wipeable': Device.is_wipeable,
+    'supported_methods': Device.supported_methods,
+    'created_at': Device.created_at,
+    'updated_at': Device.updated_at,
+}
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+def encode_device_cursor(created_at, row_id):
+    """Opaque cursor for a (timestamp, id) keyset position: a device's created_at or a wipe's wiped_at"""
+    return base64.urlsafe_b64encode(f"{created_at.isoformat()}|{row_id}".encode()).decode()
+
+def decode_device_cursor(cursor):
+    try:
+        created_at, row_id = base64.urlsafe_b64decode(cursor.encode()).decode().split('|')
+        return datetime.fromisoformat(created_at), int(row_id)
+    except (ValueError, UnicodeDecodeError):
+        raise ValueError('Invalid cursor')
+
+def filtered_device_total(device_type, status, manufacturer):
+    """Matching device count from the materialized counters, or None when they cannot answer"""
+    if manufacturer or (device_type and status):
+        return None
+    if device_type:
+        return get_counters('device_type').get(device_type, 0)
+    counts = get_counters('device_status')
+    return counts.get(status, 0) if status else sum(counts.values())
+
+def manufacturer_criteria(manufacturer):
+    """Substring filter on manufacturer, narrowed through the trigram index when the term allows"""
+    criteria = [Device.manufacturer.ilike(f'%{manufacturer}%')]
+    if len(manufacturer.strip()) >= 3:
+        criteria.append(Device.id.in_(candidate_ids_query(manufacturer)))
+    return criteria
+
+def inventory_etag():
+    """
+    Weak validator for the device list: latest updated_at and id, device
+    count, device change count and latest tombstone, combined with the query
+    string so every filter, page and projection gets its own tag.
+
+    updated_at alone misses edits within the same second, which is all a
+    MySQL DATETIME keeps; the change counter moves on every device write.
+    """
+    latest, last_id = db.session.query(db.func.max(Device.updated_at), db.func.max(Device.id)).one()
+    last_tombstone = db.session.query(db.func.max(DeviceTombstone.id)).scalar()
+    counters = get_counters()
+    count = sum(counters.get('device_status', {}).values())
+    changes = counters.get(INVENTORY_CHANGES[0], {}).get(INVENTORY_CHANGES[1], 0)
+    key = (f"{latest.isoformat() if latest else ''}|{last_id or 0}|{count}|{changes}|{last_tombstone or 0}|"
+           f"{request.query_string.decode()}")
+    return hashlib.sha1(key.encode()).hexdigest()
+
 @devices_bp.route('/api/devices', methods=['GET'])
 def get_devices():
-    print("DEBUG: /api/devices GET route called")
-    """Get all devices with optional filtering"""
+    """
+    Get devices with optional filtering, newest first, one keyset-paginated page at a time.
+
+    Query parameters: type, status, manufacturer, limit, cursor (the
+    next_cursor of the previous page) and fields (comma separated). Only the
+    requested columns are loaded, and the page is streamed as it is read.
+
+    With since (ISO 8601) the response is a delta instead: devices created or
+    updated at or after since in (updated_at, id) order, plus tombstones of
+    devices deleted since then. Once no pages remain, pass next_since as the
+    following since. Responses carry an ETag and answer If-None-Match with 304.
+    """
     try:
         # Query parameters for filtering
         device_type = request.args.get('type')
         status = request.args.get('status')
         manufacturer = request.args.get('manufacturer')
+        limit = max(1, min(request.args.get('limit', DEFAULT_PAGE_SIZE, type=int), MAX_PAGE_SIZE))
+        cursor = request.args.get('cursor')
+        since = parse_datetime_arg('since')
         
-        query = Device.query
+        if since is not None and (device_type or status or manufacturer):
+            return jsonify({'success': False, 'error': 'since cannot be combined with filters'}), 400
+        if since is not None and since < datetime.utcnow() - timedelta(days=TOMBSTONE_RETENTION_DAYS):
+            return jsonify({
+                'success': False,
+                'error': f'since is older than the {TOMBSTONE_RETENTION_DAYS}-day tombstone retention; reload the full list'
+            }), 410
+        
+        etag = inventory_etag()
+        if request.if_none_match.contains_weak(etag):
+            response = Response(status=304)
+            response.set_etag(etag, weak=True)
+            return response
+        
+        # Delta pages walk (updated_at, id) forwards; full listings walk (created_at, id) backwards
+        sort_field = 'updated_at' if since is not None else 'created_at'
+        sort_column = DEVICE_FIELDS[sort_field]
+        
+        fields = request.args.get('fields')
+        fields = [name for name in (fields.split(',') if fields else DEVICE_FIELDS) if name in DEVICE_FIELDS]
+        for name in ('id', sort_field):
+            if name not in fields:
+                fields.append(name)
+        
+        query = db.session.query(*(DEVICE_FIELDS[name].label(name) for name in fields))
         
         if device_type:
-            query = query.filter_by(device_type=device_type)
+            query = query.filter(Device.device_type == device_type)
         if status:
-            query = query.filter_by(status=status)
+            query = query.filter(Device.status == status)
         if manufacturer:
-            query = query.filter(Device.manufacturer.ilike(f'%{manufacturer}%'))
+            query = query.filter(*manufacturer_criteria(manufacturer))
         
-        devices = query.order_by(Device.created_at.desc()).all()
-        return jsonify({
-            'success': True,
-            'devices': [device.to_dict() for device in devices],
-            'total': len(devices)
-        })
+        tombstones = []
+        if since is not None:
+            query = query.filter(Device.updated_at >= since)
+            if cursor:
+                updated_at, row_id = decode_device_cursor(cursor)
+                query = query.filter(
+                    (Device.updated_at > updated_at) |
+                    ((Device.updated_at == updated_at) & (Device.id > row_id))
+                )
+            else:
+                # Tombstones are few, so they all come with the first page
+                tombstones = [
+                    tombstone.to_dict() for tombstone in DeviceTombstone.query.filter(
+                        DeviceTombstone.deleted_at >= since
+                    ).order_by(DeviceTombstone.deleted_at).all()
+                ]
+            last_deleted_at = db.session.query(db.func.max(DeviceTombstone.deleted_at)).filter(
+                DeviceTombstone.deleted_at >= since
+            ).scalar()
+            query = query.order_by(Device.updated_at, Device.id).limit(limit + 1)
+            total = None
+        else:
+            if cursor:
+                created_at, row_id = decode_device_cursor(cursor)
+                query = query.filter(
+                    (Device.created_at < created_at) |
+                    ((Device.created_at == created_at) & (Device.id < row_id))
+                )
+            query = query.order_by(Device.created_at.desc(), Device.id.desc()).limit(limit + 1)
+            total = filtered_device_total(device_type, status, manufacturer)
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+    def generate():
+        yield '{"success": true, "devices": ['
+        count = 0
+        last = None
+        has_more = False
+        for row in query.yield_per(DEFAULT_PAGE_SIZE):
+            if count == limit:
+                has_more = True
+                break
+            device = {}
+            for name in fields:
+                value = getattr(row, name)
+                device[name] = value.isoformat() if isinstance(value, datetime) else value
+            yield (',' if count else '') + json.dumps(device)
+            count += 1
+            last = row
+        next_cursor = encode_device_cursor(getattr(last, sort_field), last.id) if has_more else None
+        summary = {'count': count, 'next_cursor': next_cursor, 'total': total}
+        if since is not None:
+            # The watermark for the next delta, once every page has been read
+            marks = [mark for mark in (since, last_deleted_at, getattr(last, sort_field, None)) if mark]
+            summary.update(deleted=tombstones, next_since=None if has_more else max(marks).isoformat())
+        yield '], ' + json.dumps(summary)[1:]
+
+    response = Response(stream_with_context(generate()), mimetype='application/json')
+    response.set_etag(etag, weak=True)
+    return response
+
+@devices_bp.route('/api/devices/search', methods=['GET'])
+def search_devices_route():
+    """
+    Typeahead search over manufacturer, model and serial number.
+    
+    Query parameters: q (one or two characters match word prefixes, three or
+    more also match substrings), limit and fields (extra columns to return).
+    Results are ranked exact, prefix, word prefix, then substring matches.
+    """
+    term = request.args.get('q', '')
+    limit = max(1, min(request.args.get('limit', 20, type=int), 100))
+    fields = request.args.get('fields')
+    try:
+        results = search_devices(term, limit=limit, fields=fields.split(',') if fields else None)
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
+    
+    for result in results:
+        for name, value in result.items():
+            if isinstance(value, datetime):
+                result[name] = value.isoformat()
+    return jsonify({'success': True, 'query': term, 'results': results, 'count': len(results)})
 
 @devices_bp.route('/api/devices', methods=['POST'])
 def create_device():
@@ -133,6 +351,156 @@ def create_device():
         db.session.rollback()
         return jsonify({'success': False, 'error': str(e)}), 500
 
+IMPORT_CHUNK_SIZE = 1000
+DEVICE_IMPORT_FIELDS = ['device_id', 'device_type', 'model', 'serial_number', 'capacity', 'manufacturer',
+                        'is_wipeable', 'supported_methods']
+DEFAULT_SUPPORTED_METHODS = ["NIST Purge", "DoD Wipe", "Zero Fill"]
+ALLOWED_DEVICE_STATUSES = ['active', 'inactive', 'wiped', 'maintenance']
+
+def parse_csv_device(row):
+    """Convert a CSV row to a device dict; supported_methods is separated by semicolons"""
+    device = {key.strip(): value.strip() for key, value in row.items() if key and value is not None and value.strip()}
+    if 'is_wipeable' in device:
+        device['is_wipeable'] = device['is_wipeable'].lower() in ('1', 'true', 'yes', 'y')
+    if 'supported_methods' in device:
+        device['supported_methods'] = [method.strip() for method in device['supported_methods'].split(';') if method.strip()]
+    return device
+
+def iter_import_rows():
+    """Yield device dicts from a JSON array or a CSV body, decoding any Content-Encoding"""
+    body = open_request_body()
+    if request.mimetype in ('text/csv', 'application/csv'):
+        for row in csv.DictReader(io.TextIOWrapper(body, encoding='utf-8-sig', newline='')):
+            yield parse_csv_device(row)
+        return
+    
+    try:
+        data = json.load(body)
+    except ValueError:
+        raise BodyDecodingError('Request body is not valid JSON')
+    if isinstance(data, dict):
+        data = data.get('devices')
+    if not isinstance(data, list):
+        raise BodyDecodingError('Expected a JSON array of devices or {"devices": [...]}')
+    yield from data
+
+def import_device_chunk(devices, first_row):
+    """
+    Insert one chunk of devices; returns a report entry per device.
+    
+    Conflicts with stored devices are found with a single indexed query on
+    device_id and serial_number, and the new devices go in as one multi-row
+    INSERT in their own transaction.
+    """
+    report = []
+    candidates = []
+    seen_ids, seen_serials = set(), set()
+    for offset, device in enumerate(devices):
+        entry = {'row': first_row + offset, 'device_id': device.get('device_id') if isinstance(device, dict) else None}
+        report.append(entry)
+        if not isinstance(device, dict) or not all(device.get(k) for k in ['device_id', 'device_type', 'model', 'serial_number']):
+            entry.update(status='invalid', error='Missing required fields')
+        elif device['device_id'] in seen_ids or device['serial_number'] in seen_serials:
+            entry.update(status='duplicate', error='Device ID or serial number repeated in this import')
+        else:
+            seen_ids.add(device['device_id'])
+            seen_serials.add(device['serial_number'])
+            candidates.append((entry, device))
+    
+    for attempt in range(2):
+        taken = db.session.query(Device.device_id, Device.serial_number).filter(
+            Device.device_id.in_([device['device_id'] for _, device in candidates]) |
+            Device.serial_number.in_([device['serial_number'] for _, device in candidates])
+        ).all() if candidates else []
+        taken_ids = {row.device_id for row in taken}
+        taken_serials = {row.serial_number for row in taken}
+        
+        pending = []
+        for entry, device in candidates:
+            if device['device_id'] in taken_ids or device['serial_number'] in taken_serials:
+                entry.update(status='conflict', error='Device ID or serial number already exists')
+            else:
+                pending.append((entry, device))
+        candidates = pending
+        if not candidates:
+            break
+        
+        now = datetime.utcnow()
+        rows = [{
+            'device_id': device['device_id'],
+            'device_type': device['device_type'],
+            'model': device['model'],
+            'serial_number': device['serial_number'],
+            'capacity': device.get('capacity'),
+            'manufacturer': device.get('manufacturer'),
+            'status': 'active',
+            'is_wipeable': bool(device.get('is_wipeable', True)),
+            'supported_methods': device.get('supported_methods', DEFAULT_SUPPORTED_METHODS),
+            'created_at': now,
+            'updated_at': now
+        } for _, device in candidates]
+        
+        try:
+            db.session.execute(Device.__table__.insert(), rows)
+            # Bulk inserts bypass the ORM flush hooks, so index and count them here
+            inserted = db.session.query(Device.id, Device.manufacturer, Device.model, Device.serial_number).filter(
+                Device.device_id.in_([row['device_id'] for row in rows])
+            ).all()
+            index_devices(db.session.connection(), [tuple(device) for device in inserted])
+            deltas = Counter({('device_status', 'active'): len(rows), INVENTORY_CHANGES: len(rows)})
+            deltas.update(('device_type', row['device_type']) for row in rows)
+            apply_deltas(db.session.connection(), deltas)
+            db.session.commit()
+        except IntegrityError:
+            # Another writer took one of these identifiers; re-check and retry once
+            db.session.rollback()
+            if attempt:
+                raise
+            continue
+        
+        for entry, _ in candidates:
+            entry['status'] = 'created'
+        break
+    
+    return report
+
+@devices_bp.route('/api/devices/import', methods=['POST'])
+def import_devices():
+    """
+    Bulk-import devices from a JSON array or a CSV stream (Content-Type: text/csv).
+    
+    CSV columns match the device fields, with supported_methods separated by
+    semicolons. Rows are processed in chunks of IMPORT_CHUNK_SIZE, each
+    checked for conflicts with one query and inserted in one transaction.
+    Returns a status for every row: created, conflict, duplicate or invalid.
+    """
+    report = []
+    try:
+        rows = iter_import_rows()
+        while True:
+            chunk = list(islice(rows, IMPORT_CHUNK_SIZE))
+            if not chunk:
+                break
+            report.extend(import_device_chunk(chunk, len(report) + 1))
+    except BodyDecodingError as e:
+        db.session.rollback()
+        return jsonify({'success': False, 'error': str(e), 'processed': len(report), 'report': report}), e.status_code
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'success': False, 'error': str(e), 'processed': len(report), 'report': report}), 500
+    
+    summary = Counter(entry['status'] for entry in report)
+    return jsonify({
+        'success': True,
+        'message': f"Imported {summary['created']} of {len(report)} devices",
+        'total': len(report),
+        'created': summary['created'],
+        'conflicts': summary['conflict'],
+        'duplicates': summary['duplicate'],
+        'invalid': summary['invalid'],
+        'report': report
+    })
+
 @devices_bp.route('/api/devices/<int:device_id>', methods=['GET'])
 def get_device(device_id):
     """Get a specific device by ID"""
@@ -140,7 +508,8 @@ def get_device(device_id):
         device = Device.query.get_or_404(device_id)
         return jsonify({
             'success': True,
-            'device': device.to_dict()
+            'device': device.to_dict(),
+            'wipe_summary': get_wipe_rollup(device.id)
         })
     except Exception as e:
         return jsonify({'success': False, 'error': 'Device not found'}), 404
@@ -176,13 +545,21 @@ def delete_device(device_id):
     try:
         device = Device.query.get_or_404(device_id)
         
-        # Check if device has wipe history
-        if device.wipe_history:
+        # Check if device has wipe history (EXISTS, without loading it)
+        has_history = db.session.query(
+            db.exists().where(WipeHistory.device_id == device.id)
+        ).scalar()
+        if has_history:
             return jsonify({
                 'success': False, 
                 'error': 'Cannot delete device with wipe history. Deactivate instead.'
             }), 400
         
+        # Leave a tombstone so delta clients (GET /api/devices?since=) learn of the delete
+        db.session.add(DeviceTombstone(device_pk=device.id, device_id=device.device_id))
+        DeviceTombstone.query.filter(
+            DeviceTombstone.deleted_at < datetime.utcnow() - timedelta(days=TOMBSTONE_RETENTION_DAYS)
+        ).delete(synchronize_session=False)
         db.session.delete(device)
         db.session.commit()
         
@@ -197,16 +574,42 @@ def delete_device(device_id):
 
 @devices_bp.route('/api/devices/<int:device_id>/wipe-history', methods=['GET'])
 def get_device_wipe_history(device_id):
-    """Get wipe history for a specific device"""
+    """Get one page of a device's wipe history, newest first"""
     try:
-        device = Device.query.get_or_404(device_id)
-        history = WipeHistory.query.filter_by(device_id=device_id).order_by(WipeHistory.wiped_at.desc()).all()
+        if db.session.get(Device, device_id) is None:
+            return jsonify({'success': False, 'error': 'Device not found'}), 404
+        
+        try:
+            limit = min(max(int(request.args.get('limit', DEFAULT_PAGE_SIZE)), 1), MAX_PAGE_SIZE)
+        except ValueError:
+            return jsonify({'success': False, 'error': 'limit must be an integer'}), 400
+        
+        query = WipeHistory.query.filter_by(device_id=device_id)
+        cursor = request.args.get('cursor')
+        if cursor:
+            try:
+                wiped_at, row_id = decode_device_cursor(cursor)
+            except ValueError as e:
+                return jsonify({'success': False, 'error': str(e)}), 400
+            query = query.filter(db.or_(
+                WipeHistory.wiped_at < wiped_at,
+                db.and_(WipeHistory.wiped_at == wiped_at, WipeHistory.id < row_id)
+            ))
+        
+        history = query.order_by(WipeHistory.wiped_at.desc(), WipeHistory.id.desc()).limit(limit + 1).all()
+        next_cursor = None
+        if len(history) > limit:
+            history = history[:limit]
+            next_cursor = encode_device_cursor(history[-1].wiped_at, history[-1].id)
+        summary = get_wipe_rollup(device_id)
         
         return jsonify({
             'success': True,
             'device_id': device_id,
             'history': [entry.to_dict() for entry in history],
-            'total_wipes': len(history)
+            'total_wipes': summary['wipe_count'],
+            'summary': summary,
+            'next_cursor': next_cursor
         })
         
     except Exception as e:
@@ -222,8 +625,7 @@ def update_device_status(device_id):
         if 'status' not in data:
             return jsonify({'success': False, 'error': 'Status field required'}), 400
         
-        allowed_statuses = ['active', 'inactive', 'wiped', 'maintenance']
-        if data['status'] not in allowed_statuses:
+        if data['status'] not in ALLOWED_DEVICE_STATUSES:
             return jsonify({'success': False, 'error': 'Invalid status'}), 400
         
         device.status = data['status']
@@ -239,33 +641,101 @@ def update_device_status(device_id):
         db.session.rollback()
         return jsonify({'success': False, 'error': str(e)}), 500
 
-@devices_bp.route('/api/devices/statistics', methods=['GET'])
-def get_device_statistics():
-    """Get device statistics"""
+MAX_BULK_STATUS_IDS = 5000
+
+@devices_bp.route('/api/devices/status', methods=['PATCH'])
+def bulk_update_device_status():
+    """
+    Move many devices to a new status in one UPDATE.
+    
+    Body: {"status": ..., "ids": [...]} or {"status": ..., "filter": {"type",
+    "manufacturer", "status"}}; both may be combined. Devices already in the
+    target status are left untouched, so their updated_at does not change.
+    """
     try:
-        total_devices = Device.query.count()
-        active_devices = Device.query.filter_by(status='active').count()
-        wiped_devices = Device.query.filter_by(status='wiped').count()
-        inactive_devices = Device.query.filter_by(status='inactive').count()
+        data = request.get_json(silent=True) or {}
+        if not isinstance(data, dict):
+            return jsonify({'success': False, 'error': 'Body must be a JSON object'}), 400
+        new_status = data.get('status')
+        ids = data.get('ids')
+        filters = data.get('filter') or {}
+        
+        if not isinstance(filters, dict) or not all(
+            isinstance(filters.get(k), (str, type(None))) for k in ('type', 'manufacturer', 'status')
+        ):
+            return jsonify({'success': False, 'error': 'filter must be an object of strings'}), 400
+        if new_status not in ALLOWED_DEVICE_STATUSES:
+            return jsonify({'success': False, 'error': 'Invalid status'}), 400
+        if ids is None and not any(filters.get(k) for k in ('type', 'manufacturer', 'status')):
+            return jsonify({'success': False, 'error': 'Provide ids or a filter'}), 400
+        if ids is not None and (not isinstance(ids, list) or not all(isinstance(i, int) for i in ids)):
+            return jsonify({'success': False, 'error': 'ids must be a list of device IDs'}), 400
+        if ids is not None and len(ids) > MAX_BULK_STATUS_IDS:
+            return jsonify({'success': False, 'error': f'At most {MAX_BULK_STATUS_IDS} ids per request'}), 413
+        
+        criteria = [Device.status != new_status]
+        if ids is not None:
+            criteria.append(Device.id.in_(ids))
+        if filters.get('type'):
+            criteria.append(Device.device_type == filters['type'])
+        if filters.get('status'):
+            criteria.append(Device.status == filters['status'])
+        if filters.get('manufacturer'):
+            criteria.extend(manufacturer_criteria(filters['manufacturer']))
+        
+        for attempt in range(2):
+            # Lock the matching rows and note their current statuses for the counters
+            previous = dict(db.session.query(Device.status, db.func.count(Device.id)).filter(
+                *criteria
+            ).group_by(Device.status).with_for_update().all())
+            
+            result = db.session.execute(
+                Device.__table__.update().where(*criteria).values(status=new_status, updated_at=datetime.utcnow())
+            )
+            if result.rowcount == sum(previous.values()):
+                break
+            # A concurrent change slipped between the count and the update
+            db.session.rollback()
+            if attempt:
+                return jsonify({'success': False, 'error': 'Devices changed concurrently, retry'}), 409
+        
+        # Core UPDATEs bypass the ORM flush hook, so move the counters here
+        deltas = Counter({('device_status', old): -count for old, count in previous.items()})
+        deltas[('device_status', new_status)] += result.rowcount
+        deltas[INVENTORY_CHANGES] += result.rowcount
+        apply_deltas(db.session.connection(), deltas)
+        db.session.commit()
         
-        # Device types breakdown
-        device_types = db.session.query(
-            Device.device_type, 
-            db.func.count(Device.id).label('count')
-        ).group_by(Device.device_type).all()
+        return jsonify({
+            'success': True,
+            'message': f'{result.rowcount} devices updated to {new_status}',
+            'affected': result.rowcount,
+            'previous_statuses': previous
+        })
         
-        # Recent wipe activity
-        recent_wipes = WipeHistory.query.order_by(WipeHistory.wiped_at.desc()).limit(10).all()
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@devices_bp.route('/api/devices/statistics', methods=['GET'])
+def get_device_statistics():
+    """Get device statistics from the materialized counters"""
+    try:
+        counters = get_counters()
+        device_status = counters.get('device_status', {})
         
         return jsonify({
             'success': True,
             'statistics': {
-                'total_devices': total_devices,
-                'active_devices': active_devices,
-                'wiped_devices': wiped_devices,
-                'inactive_devices': inactive_devices,
-                'device_types': {type_name: count for type_name, count in device_types},
-                'recent_wipes': [wipe.to_dict() for wipe in recent_wipes]
+                'total_devices': sum(device_status.values()),
+                'active_devices': device_status.get('active', 0),
+                'wiped_devices': device_status.get('wiped', 0),
+                'inactive_devices': device_status.get('inactive', 0),
+                'device_types': counters.get('device_type', {}),
+                'device_statuses': device_status,
+                'wipe_methods': counters.get('wipe_method', {}),
+                'wipe_statuses': counters.get('wipe_status', {}),
+                'recent_wipes': get_recent('recent_wipes')
             }
         })
         
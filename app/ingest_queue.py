@@ -0,0 +1,278 @@
+"""
+Durable accept-then-apply queue for uploaded certificates.
+
+In async mode an upload is only checked for shape and integrity (no database
+work), written to a local SQLite journal and answered with 202 and a ticket.
+A background worker takes queued tickets in batches, chains and commits them
+through ingest_certificates(), stores each ticket's outcome and announces it
+with a 'certificate_ingested' SocketIO event. Upload latency then no longer
+depends on contention in the certificate database.
+
+The journal is fsynced on every enqueue, so accepted uploads survive a
+restart: tickets still queued are processed when the worker starts again.
+Ingestion is idempotent by certificate ID, so a ticket interrupted mid-batch
+is safe to replay. A ticket whose ingest keeps failing is marked failed with
+the error instead of blocking the tickets behind it; its payload stays in the
+journal until the ticket is pruned.
+"""
+
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+
+logger = logging.getLogger(__name__)
+
+MAX_TICKET_ATTEMPTS = 3
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS ingest_tickets (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    ticket TEXT NOT NULL UNIQUE,
+    station_id TEXT,
+    payload TEXT NOT NULL,
+    status TEXT NOT NULL,
+    result TEXT,
+    received_at REAL NOT NULL,
+    completed_at REAL
+);
+CREATE INDEX IF NOT EXISTS ix_ingest_tickets_status ON ingest_tickets (status, seq);
+"""
+
+
+class IngestQueue:
+    def __init__(self, batch_size=200, poll_interval=1.0, retention=7 * 24 * 3600):
+        self.app = None
+        self.path = None
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval  # Seconds between checks when no wake-up arrives
+        self.retention = retention  # Seconds completed tickets stay queryable
+        self.stats = {'enqueued': 0, 'processed': 0, 'failed': 0, 'batches': 0, 'failures': 0}
+        self._connection = None
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._worker = None
+        self._last_prune = 0
+        self._attempts = {}  # ticket -> failed single-ticket ingests so far
+
+    def init_app(self, app):
+        """Open the journal (INGEST_QUEUE_PATH) and resume any tickets left queued"""
+        self.app = app
+        self.path = app.config.get('INGEST_QUEUE_PATH') or os.path.join(app.instance_path, 'ingest_queue.db')
+        self.batch_size = app.config.get('INGEST_BATCH_SIZE', self.batch_size)
+        self.retention = app.config.get('INGEST_TICKET_RETENTION', self.retention)
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+            self._connection = sqlite3.connect(self.path, check_same_thread=False)
+            self._connection.execute('PRAGMA journal_mode=WAL')
+            self._connection.execute('PRAGMA synchronous=FULL')
+            self._connection.executescript(SCHEMA)
+            queued = self._connection.execute(
+                "SELECT COUNT(*) FROM ingest_tickets WHERE status = 'queued'"
+            ).fetchone()[0]
+
+        app.extensions['ingest_queue'] = self
+        if queued:
+            logger.info(f"Resuming {queued} queued certificate upload(s)")
+            self._ensure_worker()
+
+    def enqueue(self, certificates, station_id=None):
+        """Durably queue a list of certificates; returns the ticket ID"""
+        if self._connection is None:
+            raise RuntimeError('IngestQueue is not bound to an app')
+        ticket = uuid.uuid4().hex
+        with self._lock:
+            self._connection.execute(
+                "INSERT INTO ingest_tickets (ticket, station_id, payload, status, received_at) "
+                "VALUES (?, ?, ?, 'queued', ?)",
+                (ticket, station_id, json.dumps(certificates), time.time())
+            )
+            self._connection.commit()
+            self.stats['enqueued'] += 1
+        self._ensure_worker()
+        self._wake.set()
+        return ticket
+
+    def get(self, ticket):
+        """Return a ticket's status and, once processed, its per-certificate results or its error"""
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT seq, ticket, station_id, status, result, received_at, completed_at "
+                "FROM ingest_tickets WHERE ticket = ?", (ticket,)
+            ).fetchone()
+            if row is None:
+                return None
+            ahead = None
+            if row[3] == 'queued':
+                ahead = self._connection.execute(
+                    "SELECT COUNT(*) FROM ingest_tickets WHERE status = 'queued' AND seq < ?", (row[0],)
+                ).fetchone()[0]
+
+        result = json.loads(row[4]) if row[4] else None
+        return {
+            'ticket': row[1],
+            'station_id': row[2],
+            'status': row[3],
+            'queue_position': ahead,
+            'results': result if row[3] == 'done' else None,
+            'error': result['error'] if row[3] == 'failed' else None,
+            'received_at': row[5],
+            'completed_at': row[6]
+        }
+
+    def _ensure_worker(self):
+        with self._lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._run, name='ingest-queue', daemon=True)
+                self._worker.start()
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.poll_interval)
+            self._wake.clear()
+            try:
+                while self.process_batch():
+                    pass
+                self._prune()
+            except Exception as e:
+                logger.error(f"Ingest queue worker failed: {e}")
+                self.stats['failures'] += 1
+
+    def process_batch(self):
+        """
+        Chain and commit up to batch_size queued tickets; returns how many were completed.
+
+        Tickets are merged into one ingest (and so one chain transaction) per
+        station, each holding at most MAX_SYNC_CERTIFICATES certificates. When a
+        merged ingest fails its tickets are retried one at a time, so a bad
+        ticket cannot hold up the rest. A ticket that fails on its own stays
+        queued for a later batch, and after MAX_TICKET_ATTEMPTS failures it is
+        marked failed with the error.
+        """
+        # Imported here: the upload routes import this module
+        from .certificate_upload_routes import MAX_SYNC_CERTIFICATES, ingest_certificates
+
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT ticket, station_id, payload FROM ingest_tickets "
+                "WHERE status = 'queued' ORDER BY seq LIMIT ?", (self.batch_size,)
+            ).fetchall()
+        if not rows:
+            return 0
+
+        by_station = {}
+        for ticket, station_id, payload in rows:
+            payload = json.loads(payload)
+            groups = by_station.setdefault(station_id, [[]])
+            if groups[-1] and sum(len(certificates) for _, certificates in groups[-1]) + len(payload) > MAX_SYNC_CERTIFICATES:
+                groups.append([])
+            groups[-1].append((ticket, payload))
+
+        def ingest(station_id, tickets):
+            certificates = [certificate for _, payload in tickets for certificate in payload]
+            results = iter(ingest_certificates(certificates, station_id=station_id))
+            return [(ticket, station_id, [next(results) for _ in payload]) for ticket, payload in tickets]
+
+        done = []
+        failed = []
+        with self.app.app_context():
+            from .models import db
+            try:
+                for station_id, groups in by_station.items():
+                    for tickets in groups:
+                        try:
+                            done.extend(ingest(station_id, tickets))
+                            continue
+                        except Exception as e:
+                            db.session.rollback()
+                            if len(tickets) == 1:
+                                self._ticket_failed(tickets[0][0], station_id, e, failed)
+                                continue
+                            logger.warning(f"Ingest of {len(tickets)} tickets failed, retrying them one at a time: {e}")
+                        for ticket in tickets:
+                            try:
+                                done.extend(ingest(station_id, [ticket]))
+                            except Exception as e:
+                                db.session.rollback()
+                                self._ticket_failed(ticket[0], station_id, e, failed)
+            finally:
+                db.session.remove()
+
+        completed_at = time.time()
+        with self._lock:
+            self._connection.executemany(
+                "UPDATE ingest_tickets SET status = 'done', result = ?, completed_at = ? WHERE ticket = ?",
+                [(json.dumps(results), completed_at, ticket) for ticket, _, results in done]
+            )
+            self._connection.executemany(
+                "UPDATE ingest_tickets SET status = 'failed', result = ?, completed_at = ? WHERE ticket = ?",
+                [(json.dumps({'error': error}), completed_at, ticket) for ticket, _, error in failed]
+            )
+            self._connection.commit()
+            for ticket, _, _ in done:
+                self._attempts.pop(ticket, None)
+
+        self.stats['processed'] += len(done)
+        self.stats['failed'] += len(failed)
+        self.stats['batches'] += 1
+        for ticket, station_id, results in done:
+            self._publish(ticket, station_id, 'done', results=results)
+        for ticket, station_id, error in failed:
+            self._publish(ticket, station_id, 'failed', error=error)
+        return len(done) + len(failed)
+
+    def _ticket_failed(self, ticket, station_id, error, failed):
+        """Count a failed ingest of a single ticket; adds it to failed once it is out of attempts"""
+        attempts = self._attempts.get(ticket, 0) + 1
+        logger.error(f"Ingest ticket {ticket} failed (attempt {attempts} of {MAX_TICKET_ATTEMPTS}): {error}")
+        if attempts >= MAX_TICKET_ATTEMPTS:
+            self._attempts.pop(ticket, None)
+            failed.append((ticket, station_id, str(error)))
+        else:
+            self._attempts[ticket] = attempts
+
+    def _publish(self, ticket, station_id, status, results=None, error=None):
+        socketio = self.app.extensions.get('socketio')
+        if socketio is None:
+            return
+        event = {
+            'ticket': ticket,
+            'station_id': station_id,
+            'status': status,
+            'results': results
+        }
+        if error:
+            event['error'] = error
+        try:
+            socketio.emit('certificate_ingested', event)
+        except Exception as e:
+            logger.error(f"Failed to publish ingest ticket {ticket}: {e}")
+
+    def _prune(self):
+        """Forget completed tickets older than the retention period, at most once an hour"""
+        if time.monotonic() - self._last_prune < 3600:
+            return
+        self._last_prune = time.monotonic()
+        with self._lock:
+            self._connection.execute(
+                "DELETE FROM ingest_tickets WHERE status IN ('done', 'failed') AND completed_at < ?",
+                (time.time() - self.retention,)
+            )
+            self._connection.commit()
+
+    def get_stats(self):
+        with self._lock:
+            queued = self._connection.execute(
+                "SELECT COUNT(*) FROM ingest_tickets WHERE status = 'queued'"
+            ).fetchone()[0] if self._connection else 0
+        return {**self.stats, 'queued': queued, 'batch_size': self.batch_size, 'path': self.path}
+
+
+# Global ingest queue instance
+ingest_queue = IngestQueue()
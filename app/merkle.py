@@ -0,0 +1,142 @@
+"""
+Merkle tree over the certificate chain.
+
+Blocks are grouped into fixed-size batches by chain_index. Once a batch is
+full its Merkle root is computed once and stored as a MerkleRoot row, so an
+auditor can check any certificate against a published root with a proof of
+log2(BATCH_SIZE) sibling hashes. Leaves and nodes use distinct prefixes
+(0x00 / 0x01) so a leaf can never be passed off as an internal node.
+"""
+
+import hashlib
+
+from sqlalchemy.exc import IntegrityError
+
+from .models import CertificateVerification, MerkleRoot, db
+
+BATCH_SIZE = 256  # Blocks per sealed batch; a power of two keeps the tree balanced
+
+
+def hash_leaf(certificate_hash):
+    """Hash a certificate_hash as a Merkle leaf"""
+    return hashlib.sha256(b'\x00' + bytes.fromhex(certificate_hash)).hexdigest()
+
+
+def hash_node(left, right):
+    """Hash two child nodes into their parent"""
+    return hashlib.sha256(b'\x01' + bytes.fromhex(left) + bytes.fromhex(right)).hexdigest()
+
+
+def build_levels(leaves):
+    """Build every level of the tree, leaves first; an unpaired node is promoted as is"""
+    levels = [leaves]
+    while len(levels[-1]) > 1:
+        level = levels[-1]
+        parents = [hash_node(level[i], level[i + 1]) for i in range(0, len(level) - 1, 2)]
+        if len(level) % 2:
+            parents.append(level[-1])
+        levels.append(parents)
+    return levels
+
+
+def merkle_root(leaves):
+    """Compute the Merkle root of a list of leaf hashes"""
+    if not leaves:
+        return None
+    return build_levels(leaves)[-1][0]
+
+
+def inclusion_proof(leaves, position):
+    """Return the sibling path proving the leaf at position is in the tree"""
+    proof = []
+    for level in build_levels(leaves)[:-1]:
+        sibling = position ^ 1
+        if sibling < len(level):
+            proof.append({
+                'position': 'left' if sibling < position else 'right',
+                'hash': level[sibling]
+            })
+        position //= 2
+    return proof
+
+
+def verify_inclusion_proof(certificate_hash, proof, root_hash):
+    """Check an inclusion proof for a certificate_hash against a Merkle root"""
+    node = hash_leaf(certificate_hash)
+    for step in proof:
+        if step['position'] == 'left':
+            node = hash_node(step['hash'], node)
+        else:
+            node = hash_node(node, step['hash'])
+    return node == root_hash
+
+
+def batch_leaves(batch_index):
+    """Load the leaf hashes of one batch with a single range query on chain_index"""
+    first_index = batch_index * BATCH_SIZE
+    rows = db.session.query(CertificateVerification.certificate_hash).filter(
+        CertificateVerification.chain_index >= first_index,
+        CertificateVerification.chain_index < first_index + BATCH_SIZE
+    ).order_by(CertificateVerification.chain_index).all()
+    return [hash_leaf(row.certificate_hash) for row in rows]
+
+
+def seal_completed_batches():
+    """
+    Store roots for every full batch that has not been sealed yet; returns the new roots.
+
+    Called by the chain append worker. If another process seals the same
+    batches first, its roots stand and nothing is returned.
+    """
+    last_sealed = db.session.query(db.func.max(MerkleRoot.batch_index)).scalar()
+    next_batch = 0 if last_sealed is None else last_sealed + 1
+    chain_length = db.session.query(db.func.max(CertificateVerification.chain_index)).scalar()
+    if chain_length is None:
+        return []
+    chain_length += 1
+
+    sealed = []
+    while (next_batch + 1) * BATCH_SIZE <= chain_length:
+        leaves = batch_leaves(next_batch)
+        if len(leaves) != BATCH_SIZE:
+            # Gap in chain indexes; leave the batch open until the chain is repaired
+            break
+        root = MerkleRoot(
+            batch_index=next_batch,
+            first_index=next_batch * BATCH_SIZE,
+            last_index=(next_batch + 1) * BATCH_SIZE - 1,
+            root_hash=merkle_root(leaves)
+        )
+        db.session.add(root)
+        sealed.append(root)
+        next_batch += 1
+
+    if sealed:
+        try:
+            db.session.commit()
+        except IntegrityError:
+            db.session.rollback()
+            return []
+    return sealed
+
+
+def certificate_proof(certificate):
+    """Build the inclusion proof for a certificate against its batch root"""
+    batch_index = certificate.chain_index // BATCH_SIZE
+    leaves = batch_leaves(batch_index)
+    position = leaves.index(hash_leaf(certificate.certificate_hash))
+    computed_root = merkle_root(leaves)
+    published = MerkleRoot.query.filter_by(batch_index=batch_index).first()
+
+    return {
+        'certificate_id': certificate.certificate_id,
+        'chain_index': certificate.chain_index,
+        'certificate_hash': certificate.certificate_hash,
+        'batch_index': batch_index,
+        'leaf_position': position,
+        'proof': inclusion_proof(leaves, position),
+        'root_hash': published.root_hash if published else computed_root,
+        'sealed': published is not None,
+        # False means the batch was altered after its root was published
+        'root_matches_published': published is None or published.root_hash == computed_root
+    }
@@ -1,22 +1,54 @@
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy.dialects import mysql
 from datetime import datetime
+import os
 import uuid
 
 db = SQLAlchemy()
 
+# 'hex' keeps digests as 64-char strings; 'binary' stores them as raw 32 bytes.
+# Switch to 'binary' only after running migrate_digest_storage.py on existing databases.
+DIGEST_STORAGE = os.environ.get('DIGEST_STORAGE', 'hex')
+
+class Digest(db.TypeDecorator):
+    """SHA-256 digest column, always a hex string in Python, stored per DIGEST_STORAGE"""
+    impl = db.String(256)
+    cache_ok = True
+
+    def __init__(self, storage=None):
+        super().__init__()
+        self.storage = storage or DIGEST_STORAGE
+
+    def load_dialect_impl(self, dialect):
+        if self.storage != 'binary':
+            return dialect.type_descriptor(db.String(256))
+        if dialect.name == 'mysql':
+            return dialect.type_descriptor(mysql.BINARY(32))
+        return dialect.type_descriptor(db.LargeBinary(32))
+
+    def process_bind_param(self, value, dialect):
+        if value is None or self.storage != 'binary':
+            return value
+        return bytes.fromhex(value)
+
+    def process_result_value(self, value, dialect):
+        if value is None or self.storage != 'binary':
+            return value
+        return bytes(value).hex()
+
 class CertificateVerification(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     certificate_id = db.Column(db.String(100), unique=True, nullable=False)
-    verification_key = db.Column(db.String(256), nullable=False)  # SHA256 hash
+    verification_key = db.Column(Digest(), nullable=False, index=True)  # SHA256 hash
     random_text = db.Column(db.Text, nullable=False)  # Original random text
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     is_verified = db.Column(db.Boolean, default=False)
     verified_at = db.Column(db.DateTime, nullable=True)
 
     # Blockchain-like functionality
-    previous_hash = db.Column(db.String(256), nullable=True)  # Hash of previous certificate
-    certificate_hash = db.Column(db.String(256), nullable=False)  # Hash of current certificate
-    chain_index = db.Column(db.Integer, default=0)  # Position in the certificate chain
+    previous_hash = db.Column(Digest(), nullable=True)  # Hash of previous certificate
+    certificate_hash = db.Column(Digest(), nullable=False, index=True)  # Hash of current certificate
+    chain_index = db.Column(db.Integer, default=0, unique=True, index=True)  # Position in the certificate chain
 
     def __repr__(self):
         return f'<CertificateVerification {self.certificate_id}>'
@@ -74,3 +106,126 @@ class CertificateVerification(db.Model):
         # Verify the previous certificate's hash matches
         expected_previous_hash = previous_cert.certificate_hash
         return self.previous_hash == expected_previous_hash
+
+class ChainCheckpoint(db.Model):
+    """Watermark of the highest chain block already verified"""
+    id = db.Column(db.Integer, primary_key=True)
+    verified_index = db.Column(db.Integer, nullable=False)  # Highest chain_index verified
+    head_hash = db.Column(db.String(256), nullable=False)  # certificate_hash at verified_index
+    verified_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    full_audit_at = db.Column(db.DateTime, nullable=True)  # Last re-audit from genesis
+
+    def __repr__(self):
+        return f'<ChainCheckpoint {self.verified_index}>'
+
+    @staticmethod
+    def get_checkpoint():
+        """Get the verification watermark, if one has been recorded"""
+        return ChainCheckpoint.query.get(1)
+
+class ChainRehashBoundary(db.Model):
+    """
+    First chain_index whose certificate_hash can be recomputed from stored fields.
+
+    Blocks written before the append service hashed a created_at that was never
+    stored (and uploads hashed device_info), so they can only be link-checked.
+    """
+    id = db.Column(db.Integer, primary_key=True)
+    rehash_from_index = db.Column(db.Integer, nullable=False)
+    recorded_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<ChainRehashBoundary {self.rehash_from_index}>'
+
+class MerkleRoot(db.Model):
+    """Published Merkle root over one fixed-size batch of chain blocks"""
+    id = db.Column(db.Integer, primary_key=True)
+    batch_index = db.Column(db.Integer, unique=True, nullable=False)
+    first_index = db.Column(db.Integer, nullable=False)  # First chain_index in the batch
+    last_index = db.Column(db.Integer, nullable=False)  # Last chain_index in the batch
+    root_hash = db.Column(db.String(64), nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<MerkleRoot {self.batch_index}>'
+
+    def to_dict(self):
+        return {
+            'batch_index': self.batch_index,
+            'first_index': self.first_index,
+            'last_index': self.last_index,
+            'root_hash': self.root_hash,
+            'created_at': self.created_at.isoformat() if self.created_at else None
+        }
+
+class SyncStation(db.Model):
+    """Sync state of one desktop wiping station"""
+    id = db.Column(db.Integer, primary_key=True)
+    station_id = db.Column(db.String(100), unique=True, nullable=False)
+    watermark = db.Column(db.String(64), nullable=True)  # Latest certificate timestamp received
+    certificate_count = db.Column(db.Integer, default=0, nullable=False)
+    digest = db.Column(db.JSON, nullable=True)  # Per-bucket XOR of certificate ID hashes
+    last_sync_at = db.Column(db.DateTime, nullable=True)
+
+    def __repr__(self):
+        return f'<SyncStation {self.station_id}>'
+
+class StationCertificate(db.Model):
+    """A certificate the hub holds on behalf of a station"""
+    id = db.Column(db.Integer, primary_key=True)
+    station_id = db.Column(db.String(100), nullable=False, index=True)
+    certificate_id = db.Column(db.String(100), nullable=False)
+    certificate_timestamp = db.Column(db.String(64), nullable=True)
+    received_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    __table_args__ = (db.UniqueConstraint('station_id', 'certificate_id', name='uq_station_certificate'),)
+
+    def __repr__(self):
+        return f'<StationCertificate {self.station_id}:{self.certificate_id}>'
+
+class StatisticCounter(db.Model):
+    """A materialized count, e.g. devices per status, kept in step with the rows it counts"""
+    id = db.Column(db.Integer, primary_key=True)
+    scope = db.Column(db.String(50), nullable=False)  # What is counted, e.g. 'device_status'
+    key = db.Column(db.String(100), nullable=False)  # The bucket, e.g. 'active'
+    value = db.Column(db.BigInteger, default=0, nullable=False)
+
+    __table_args__ = (db.UniqueConstraint('scope', 'key', name='uq_statistic_counter'),)
+
+    def __repr__(self):
+        return f'<StatisticCounter {self.scope}:{self.key}={self.value}>'
+
+class StatisticSlot(db.Model):
+    """One slot of a fixed-size ring buffer of recent activity"""
+    id = db.Column(db.Integer, primary_key=True)
+    scope = db.Column(db.String(50), nullable=False)  # Which ring, e.g. 'recent_wipes'
+    slot = db.Column(db.Integer, nullable=False)  # seq % ring size, or the wipe id for recent_wipes
+    seq = db.Column(db.BigInteger, nullable=False)  # Chain index, or wiped_at in epoch microseconds
+    payload = db.Column(db.JSON, nullable=False)
+
+    __table_args__ = (db.UniqueConstraint('scope', 'slot', name='uq_statistic_slot'),)
+
+    def __repr__(self):
+        return f'<StatisticSlot {self.scope}[{self.slot}]>'
+
+class DeviceWipeRollup(db.Model):
+    """Materialized wipe summary of one device, kept in step with its wipe history"""
+    id = db.Column(db.Integer, primary_key=True)
+    device_pk = db.Column(db.Integer, unique=True, nullable=False)  # device.id
+    wipe_count = db.Column(db.Integer, default=0, nullable=False)
+    last_wipe_id = db.Column(db.Integer, nullable=True)
+    last_wiped_at = db.Column(db.DateTime, nullable=True)
+    last_wipe_method = db.Column(db.String(100), nullable=True)
+    last_wipe_status = db.Column(db.String(20), nullable=True)
+
+    def __repr__(self):
+        return f'<DeviceWipeRollup {self.device_pk}: {self.wipe_count}>'
+
+    def to_dict(self):
+        return {
+            'wipe_count': self.wipe_count,
+            'last_wipe_id': self.last_wipe_id,
+            'last_wiped_at': self.last_wiped_at.isoformat() if self.last_wiped_at else None,
+            'last_wipe_method': self.last_wipe_method,
+            'last_wipe_status': self.last_wipe_status
+        }
@@ -12,6 +12,10 @@ from .mock_data import mock_drives_data
 from .wiping_logic import simulate_wipe
 from .certificate_generator import CertificateGenerator
 from .models import CertificateVerification, db
+from .chain_append import chain_append_service
+from .verification_cache import verification_cache
+from .bloom_filter import certificate_filter
+from .verification_writer import verification_writer
 import os
 import uuid
 import hashlib
@@ -142,42 +146,22 @@ def wipe_drive(drive_id):
         drive, wipe_method, serial_number
     )
 
-    # Get the last certificate in the chain for blockchain functionality
-    last_certificate = CertificateVerification.get_last_certificate()
-    previous_hash = last_certificate.certificate_hash if last_certificate else None
-    chain_index = (last_certificate.chain_index + 1) if last_certificate else 0
-
-    # Prepare certificate data for hash calculation
-    certificate_data = {
-        "certificate_id": serial_number,
-        "random_text": random_text,
-        "created_at": datetime.utcnow().isoformat(),
-    }
-
-    # Calculate the certificate hash including blockchain linking
-    certificate_hash = CertificateVerification.calculate_certificate_hash(
-        certificate_data, previous_hash
-    )
-
-    # Store verification data in database with blockchain fields
+    # Queue the certificate on the append service, which links it to the chain head
     verification_key = CertificateVerification.hash_text(random_text)
-    cert_verification = CertificateVerification(
-        certificate_id=serial_number,
-        verification_key=verification_key,
-        random_text=random_text,
-        previous_hash=previous_hash,
-        certificate_hash=certificate_hash,
-        chain_index=chain_index,
-    )
 
     try:
-        db.session.add(cert_verification)
-        db.session.commit()
+        block = chain_append_service.append(
+            {
+                "certificate_id": serial_number,
+                "verification_key": verification_key,
+                "random_text": random_text,
+            }
+        )
         print(
-            f"✅ Certificate {serial_number} added to blockchain (Chain Index: {chain_index})"
+            f"✅ Certificate {serial_number} added to blockchain (Chain Index: {block['chain_index']})"
         )
-        if previous_hash:
-            print(f"   ↳ Linked to previous certificate: {previous_hash[:16]}...")
+        if block["previous_hash"]:
+            print(f"   ↳ Linked to previous certificate: {block['previous_hash'][:16]}...")
     except Exception as e:
         # If database operation fails, still allow certificate download
         print(f"Database error: {e}")
@@ -301,42 +285,22 @@ def download_certificate(drive_id):
         drive, wipe_method, serial_number
     )
 
-    # Get the last certificate in the chain for blockchain functionality
-    last_certificate = CertificateVerification.get_last_certificate()
-    previous_hash = last_certificate.certificate_hash if last_certificate else None
-    chain_index = (last_certificate.chain_index + 1) if last_certificate else 0
-
-    # Prepare certificate data for hash calculation
-    certificate_data = {
-        "certificate_id": serial_number,
-        "random_text": random_text,
-        "created_at": datetime.utcnow().isoformat(),
-    }
-
-    # Calculate the certificate hash including blockchain linking
-    certificate_hash = CertificateVerification.calculate_certificate_hash(
-        certificate_data, previous_hash
-    )
-
-    # Store verification data in database with blockchain fields
+    # Queue the certificate on the append service, which links it to the chain head
     verification_key = CertificateVerification.hash_text(random_text)
-    cert_verification = CertificateVerification(
-        certificate_id=serial_number,
-        verification_key=verification_key,
-        random_text=random_text,
-        previous_hash=previous_hash,
-        certificate_hash=certificate_hash,
-        chain_index=chain_index,
-    )
 
     try:
-        db.session.add(cert_verification)
-        db.session.commit()
+        block = chain_append_service.append(
+            {
+                "certificate_id": serial_number,
+                "verification_key": verification_key,
+                "random_text": random_text,
+            }
+        )
         print(
-            f"✅ Certificate {serial_number} added to blockchain (Chain Index: {chain_index})"
+            f"✅ Certificate {serial_number} added to blockchain (Chain Index: {block['chain_index']})"
         )
-        if previous_hash:
-            print(f"   ↳ Linked to previous certificate: {previous_hash[:16]}...")
+        if block["previous_hash"]:
+            print(f"   ↳ Linked to previous certificate: {block['previous_hash'][:16]}...")
     except Exception as e:
         # If database operation fails, still allow certificate download
         print(f"Database error: {e}")
@@ -363,25 +327,22 @@ def verify_certificate():
     # Hash the entered code
     entered_hash = CertificateVerification.hash_text(verification_code)
 
-    # Check if the hash exists in database
-    certificate = CertificateVerification.query.filter_by(
-        verification_key=entered_hash
-    ).first()
-
-    if certificate:
-        # Verify blockchain integrity
-        chain_valid = certificate.verify_chain_integrity()
-
-        # Mark as verified
-        certificate.is_verified = True
-        certificate.verified_at = datetime.utcnow()
-        db.session.commit()
+    # Repeat verifications of the same code are answered from memory
+    outcome = verification_cache.get(entered_hash)
+    if outcome is None:
+        if certificate_filter.might_contain_key(entered_hash):
+            outcome = lookup_verification(entered_hash)
+            verification_cache.put(entered_hash, outcome)
+        else:
+            # Definite miss: no certificate was ever issued with this code
+            outcome = {"verified": False, "chain_valid": False, "certificate": None}
 
-        if chain_valid:
+    if outcome["verified"]:
+        if outcome["chain_valid"]:
             return render_template(
                 "verify.html",
                 verified=True,
-                certificate=certificate,
+                certificate=outcome["certificate"],
                 chain_valid=True,
                 message="✅ Certificate Verified Successfully! Blockchain integrity confirmed.",
             )
@@ -389,7 +350,7 @@ def verify_certificate():
             return render_template(
                 "verify.html",
                 verified=True,
-                certificate=certificate,
+                certificate=outcome["certificate"],
                 chain_valid=False,
                 message="⚠️ Certificate Verified but Blockchain Integrity Compromised!",
             )
@@ -399,3 +360,178 @@ def verify_certificate():
             verified=False,
             message="❌ Invalid verification code. Certificate not found.",
         )
+
+
+def lookup_verification(entered_hash):
+    """Look up a verification key, queue the verified mark and return a cacheable outcome"""
+    certificate = CertificateVerification.query.filter_by(
+        verification_key=entered_hash
+    ).first()
+
+    if not certificate:
+        return {"verified": False, "chain_valid": False, "certificate": None}
+
+    # Verify blockchain integrity
+    chain_valid = certificate.verify_chain_integrity()
+
+    # Mark as verified; the write is buffered and flushed in bulk off the request path
+    verified_at = datetime.utcnow()
+    verification_writer.record(certificate.id, verified_at)
+
+    return {
+        "verified": True,
+        "chain_valid": chain_valid,
+        # Plain values so the outcome can outlive the database session
+        "certificate": {
+            "certificate_id": certificate.certificate_id,
+            "chain_index": certificate.chain_index,
+            "certificate_hash": certificate.certificate_hash,
+            "previous_hash": certificate.previous_hash,
+            "created_at": certificate.created_at,
+            "is_verified": True,
+            "verified_at": verified_at,
+        },
+    }
+
+
+@main.route("/api/verification_cache")
+def verification_cache_stats():
+    return jsonify(verification_cache.get_stats())
+
+
+@main.route("/api/certificate_filter")
+def certificate_filter_stats():
+    return jsonify(certificate_filter.get_stats())
+
+
+@main.route("/api/verification_writes")
+def verification_writer_stats():
+    return jsonify(verification_writer.get_stats())
+
+
+# Bulk verification limits
+MAX_BULK_VERIFICATIONS = 5000
+IN_CLAUSE_SIZE = 1000  # Values per IN (...) so statements stay within driver limits
+
+
+def chunked(values, size):
+    """Split a list into consecutive chunks of at most size items"""
+    return [values[i:i + size] for i in range(0, len(values), size)]
+
+
+@main.route("/api/verify_certificates", methods=["POST"])
+def verify_certificates():
+    """
+    Verify many certificates at once for recyclers receiving a pallet of drives.
+
+    Accepts {"verification_codes": [...], "certificate_ids": [...]} and resolves
+    them with set-based IN queries instead of one lookup per code. Certificates
+    found are marked verified with a single bulk UPDATE and commit.
+    Returns one result per submitted item, in submission order; entries that
+    are not strings get an invalid result.
+    """
+    data = request.get_json(silent=True)
+    if data is None:
+        data = {}
+    if not isinstance(data, dict):
+        return jsonify({"error": "Request body must be a JSON object"}), 400
+    codes = data.get("verification_codes") or []
+    certificate_ids = data.get("certificate_ids") or []
+
+    if not isinstance(codes, list) or not isinstance(certificate_ids, list):
+        return jsonify({"error": "verification_codes and certificate_ids must be lists"}), 400
+    if not codes and not certificate_ids:
+        return jsonify({"error": "No verification codes or certificate IDs provided"}), 400
+    if len(codes) + len(certificate_ids) > MAX_BULK_VERIFICATIONS:
+        return jsonify({"error": f"At most {MAX_BULK_VERIFICATIONS} items per request"}), 413
+
+    # Entries that are not strings (null, numbers, objects) are reported per item, never looked up
+    items = [("verification_code", code) for code in codes]
+    items += [("certificate_id", certificate_id) for certificate_id in certificate_ids]
+    items = [(kind, value.strip() if isinstance(value, str) else value) for kind, value in items]
+    keys = {
+        value: CertificateVerification.hash_text(value)
+        for kind, value in items
+        if kind == "verification_code" and isinstance(value, str) and value
+    }
+
+    columns = (
+        CertificateVerification.id,
+        CertificateVerification.certificate_id,
+        CertificateVerification.verification_key,
+        CertificateVerification.chain_index,
+        CertificateVerification.previous_hash,
+        CertificateVerification.certificate_hash,
+    )
+
+    try:
+        by_key, by_id = {}, {}
+        for chunk in chunked(list(set(keys.values())), IN_CLAUSE_SIZE):
+            for row in db.session.query(*columns).filter(CertificateVerification.verification_key.in_(chunk)):
+                by_key.setdefault(row.verification_key, row)
+        wanted_ids = list({value for kind, value in items if kind == "certificate_id" and isinstance(value, str) and value})
+        for chunk in chunked(wanted_ids, IN_CLAUSE_SIZE):
+            for row in db.session.query(*columns).filter(CertificateVerification.certificate_id.in_(chunk)):
+                by_id[row.certificate_id] = row
+
+        # Resolve every predecessor in one pass instead of one query per certificate
+        found = {row.id: row for row in list(by_key.values()) + list(by_id.values())}
+        previous_hashes = list({row.previous_hash for row in found.values() if row.previous_hash})
+        predecessor_index = {}
+        for chunk in chunked(previous_hashes, IN_CLAUSE_SIZE):
+            for certificate_hash, chain_index in db.session.query(
+                CertificateVerification.certificate_hash, CertificateVerification.chain_index
+            ).filter(CertificateVerification.certificate_hash.in_(chunk)):
+                predecessor_index[certificate_hash] = chain_index
+
+        verified_at = datetime.utcnow()
+        for chunk in chunked(list(found), IN_CLAUSE_SIZE):
+            CertificateVerification.query.filter(CertificateVerification.id.in_(chunk)).update(
+                {"is_verified": True, "verified_at": verified_at}, synchronize_session=False
+            )
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({"error": str(e)}), 500
+
+    def chain_valid(row):
+        # Same rule as CertificateVerification.verify_chain_integrity
+        if row.previous_hash is None:
+            return row.chain_index == 0
+        previous_index = predecessor_index.get(row.previous_hash)
+        return previous_index is not None and row.chain_index == previous_index + 1
+
+    results = []
+    for kind, value in items:
+        if not isinstance(value, str):
+            results.append({
+                "input": value,
+                "type": kind,
+                "verified": False,
+                "invalid": True,
+                "message": f"{kind} must be a string",
+            })
+            continue
+        row = by_key.get(keys.get(value)) if kind == "verification_code" else by_id.get(value)
+        if row is None:
+            results.append({"input": value, "type": kind, "verified": False, "message": "Certificate not found"})
+            continue
+        valid = chain_valid(row)
+        results.append({
+            "input": value,
+            "type": kind,
+            "verified": True,
+            "certificate_id": row.certificate_id,
+            "chain_index": row.chain_index,
+            "chain_valid": valid,
+            "verified_at": verified_at.isoformat(),
+            "message": "Certificate verified successfully" if valid else "Certificate verified but blockchain integrity compromised",
+        })
+
+    return jsonify({
+        "results": results,
+        "total": len(results),
+        "verified": sum(1 for result in results if result["verified"]),
+        "not_found": sum(1 for result in results if not result["verified"] and not result.get("invalid")),
+        "invalid": sum(1 for result in results if result.get("invalid")),
+    })
@@ -1,6 +1,9 @@
 from flask_socketio import SocketIO, emit, disconnect
 from flask import request
-from .models import CertificateVerification, db
+from .models import CertificateVerification
+from .chain_validator import validate_chain
+from .bloom_filter import certificate_filter
+from .verification_writer import verification_writer
 from datetime import datetime
 import logging
 
@@ -41,10 +44,13 @@ def init_socketio_handlers(socketio):
                     'verified_at': cert.verified_at.isoformat() if cert.verified_at else None
                 })
 
+            validation = validate_chain(certificates)
+
             emit('blockchain_status', {
                 'blockchain': blockchain_data,
                 'total_certificates': len(blockchain_data),
-                'chain_valid': all(cert.verify_chain_integrity() for cert in certificates),
+                'chain_valid': validation['chain_valid'],
+                'first_invalid_index': validation['first_invalid_index'],
                 'timestamp': datetime.now().isoformat()
             })
         except Exception as e:
@@ -60,7 +66,10 @@ def init_socketio_handlers(socketio):
                 emit('error', {'message': 'Certificate ID is required'})
                 return
 
-            certificate = CertificateVerification.query.filter_by(certificate_id=certificate_id).first()
+            # The Bloom filter rules out unknown IDs without a database query
+            certificate = None
+            if certificate_filter.might_contain_id(certificate_id):
+                certificate = CertificateVerification.query.filter_by(certificate_id=certificate_id).first()
 
             if not certificate:
                 emit('verification_result', {
@@ -74,11 +83,11 @@ def init_socketio_handlers(socketio):
             # Verify blockchain integrity
             chain_valid = certificate.verify_chain_integrity()
 
-            # Mark as verified if not already
-            if not certificate.is_verified:
-                certificate.is_verified = True
-                certificate.verified_at = datetime.utcnow()
-                db.session.commit()
+            # Mark as verified if not already; the write is buffered and flushed in bulk
+            verified_at = certificate.verified_at
+            if not certificate.is_verified or verified_at is None:
+                verified_at = datetime.utcnow()
+                verification_writer.record(certificate.id, verified_at)
 
             emit('verification_result', {
                 'certificate_id': certificate.certificate_id,
@@ -86,7 +95,7 @@ def init_socketio_handlers(socketio):
                 'chain_valid': chain_valid,
                 'chain_index': certificate.chain_index,
                 'created_at': certificate.created_at.isoformat(),
-                'verified_at': certificate.verified_at.isoformat(),
+                'verified_at': verified_at.isoformat(),
                 'message': 'Certificate verified successfully' if chain_valid else 'Certificate verified but blockchain integrity compromised',
                 'timestamp': datetime.now().isoformat()
             })
@@ -0,0 +1,144 @@
+"""
+Delta sync bookkeeping for desktop wiping stations.
+
+Each station identifies itself with a station ID (the X-Station-ID header or a
+station_id parameter). For every station the hub keeps:
+
+- a watermark: the latest certificate timestamp received from it
+- a set digest of the certificate IDs it holds for it: DIGEST_BUCKETS 64-bit
+  values, where each certificate ID lands in bucket sha256(id)[0] % DIGEST_BUCKETS
+  and is folded in by XOR-ing bytes 1-8 of the same hash
+
+The desktop tool computes the same digest over its local certificates with
+station_digest(). Only buckets whose value differs need their certificates
+uploaded, along with anything newer than the watermark. XOR makes the digest
+cheap to update as certificates arrive, so the handshake never rescans a
+station's certificates.
+"""
+
+import hashlib
+import logging
+from datetime import datetime
+
+from sqlalchemy.exc import IntegrityError
+
+from .models import StationCertificate, SyncStation, db
+from .routes import chunked, IN_CLAUSE_SIZE
+
+logger = logging.getLogger(__name__)
+
+DIGEST_BUCKETS = 64
+DIGEST_ALGORITHM = f'xor64-sha256/{DIGEST_BUCKETS}'
+MAX_STATION_ID_LENGTH = 100
+
+
+def certificate_fingerprint(certificate_id):
+    """Return (bucket, 64-bit value) of a certificate ID for the set digest"""
+    digest = hashlib.sha256(certificate_id.encode()).digest()
+    return digest[0] % DIGEST_BUCKETS, int.from_bytes(digest[1:9], 'big')
+
+
+def station_digest(certificate_ids):
+    """Set digest over certificate IDs as DIGEST_BUCKETS 16-char hex strings"""
+    buckets = [0] * DIGEST_BUCKETS
+    for certificate_id in certificate_ids:
+        bucket, value = certificate_fingerprint(certificate_id)
+        buckets[bucket] ^= value
+    return [f'{value:016x}' for value in buckets]
+
+
+def valid_station_id(station_id):
+    return bool(station_id) and isinstance(station_id, str) and len(station_id) <= MAX_STATION_ID_LENGTH
+
+
+def _lock_station(station_id):
+    """Fetch the station row for update, creating it on first contact"""
+    station = SyncStation.query.filter_by(station_id=station_id).with_for_update().first()
+    if station:
+        return station
+    try:
+        with db.session.begin_nested():
+            db.session.add(SyncStation(
+                station_id=station_id,
+                certificate_count=0,
+                digest=station_digest([])
+            ))
+    except IntegrityError:
+        # Another request registered the station first
+        pass
+    return SyncStation.query.filter_by(station_id=station_id).with_for_update().first()
+
+
+def record_station_certificates(station_id, certificates):
+    """
+    Record certificates the hub now holds for a station.
+
+    certificates is a list of (certificate_id, timestamp) pairs. Pairs already
+    recorded are ignored, so replaying an upload is harmless. Returns the
+    number of newly recorded certificates.
+    """
+    if not valid_station_id(station_id) or not certificates:
+        return 0
+
+    try:
+        station = _lock_station(station_id)
+
+        ids = list({certificate_id for certificate_id, _ in certificates})
+        known = set()
+        for chunk in chunked(ids, IN_CLAUSE_SIZE):
+            rows = db.session.query(StationCertificate.certificate_id).filter(
+                StationCertificate.station_id == station_id,
+                StationCertificate.certificate_id.in_(chunk)
+            ).all()
+            known.update(row.certificate_id for row in rows)
+
+        buckets = [int(value, 16) for value in (station.digest or station_digest([]))]
+        watermark = station.watermark
+        rows = []
+        for certificate_id, timestamp in certificates:
+            if certificate_id in known:
+                continue
+            known.add(certificate_id)
+            bucket, value = certificate_fingerprint(certificate_id)
+            buckets[bucket] ^= value
+            timestamp = str(timestamp)[:64] if timestamp else None
+            # ISO-8601 timestamps order correctly as strings
+            if timestamp and (watermark is None or timestamp > watermark):
+                watermark = timestamp
+            rows.append({
+                'station_id': station_id,
+                'certificate_id': certificate_id,
+                'certificate_timestamp': timestamp,
+                'received_at': datetime.utcnow()
+            })
+
+        if rows:
+            db.session.execute(StationCertificate.__table__.insert(), rows)
+            station.digest = [f'{value:016x}' for value in buckets]
+            station.certificate_count += len(rows)
+            station.watermark = watermark
+        station.last_sync_at = datetime.utcnow()
+        db.session.commit()
+        return len(rows)
+
+    except Exception as e:
+        # The certificates are already on the chain; a missed record only makes
+        # the station re-send them, which is idempotent
+        db.session.rollback()
+        logger.error(f"Failed to record certificates for station {station_id}: {e}")
+        return 0
+
+
+def station_sync_state(station_id):
+    """Watermark and set digest the station compares against its local certificates"""
+    station = SyncStation.query.filter_by(station_id=station_id).first()
+    return {
+        'station_id': station_id,
+        'watermark': station.watermark if station else None,
+        'certificate_count': station.certificate_count if station else 0,
+        'last_sync_at': station.last_sync_at.isoformat() if station and station.last_sync_at else None,
+        'digest': {
+            'algorithm': DIGEST_ALGORITHM,
+            'buckets': (station.digest if station and station.digest else station_digest([]))
+        }
+    }
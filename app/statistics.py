@@ -0,0 +1,459 @@
+"""
+Materialized statistics for the dashboard and desktop status endpoints.
+
+Counts of devices by status and type, wipes by method and status, and the
+certificate total are stored in StatisticCounter rows, and the most recent
+wipes and certificates in small StatisticSlot ring buffers, and each device's
+wipe count and latest wipe in a DeviceWipeRollup row. All are updated in the
+same transaction as the rows they describe:
+
+- ORM changes to Device and WipeHistory are picked up by a session flush hook
+- chain appends call record_certificates() before committing
+- bulk Core statements that bypass the ORM pass their deltas to apply_deltas()
+
+Reading statistics is then a fixed number of small lookups however many rows
+exist. rebuild_statistics() (and rebuild_statistics.py) recomputes
+everything from the source tables if the counters ever drift.
+"""
+
+import logging
+from collections import Counter
+from datetime import datetime, timedelta
+
+from sqlalchemy import and_, event, func, inspect, or_, select, update
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from .models import CertificateVerification, DeviceWipeRollup, StatisticCounter, StatisticSlot, db
+
+logger = logging.getLogger(__name__)
+
+RECENT_WIPES = 10
+RECENT_CERTIFICATES = 5
+SCHEMA_VERSION = 4
+EPOCH = datetime(1970, 1, 1)
+NULL_KEY = '(none)'  # Counter key for rows whose counted column is NULL
+# Counts every device insert, update and delete so list validators change even
+# within one DATETIME second; not derived from rows, so rebuilds keep it
+INVENTORY_CHANGES = ('inventory', 'changes')
+
+# WipeHistory attributes that feed the per-device rollups
+ROLLUP_ATTRIBUTES = ['device_id', 'wiped_at', 'wipe_method', 'status']
+
+# (scope, attribute, default applied on insert) counted per tracked table
+TRACKED_COLUMNS = {
+    'device': [('device_status', 'status', 'active'), ('device_type', 'device_type', None)],
+    'wipe_history': [('wipe_method', 'wipe_method', None), ('wipe_status', 'status', 'completed')],
+}
+
+
+def _upsert(connection, table, values, conflict_columns, updates):
+    """INSERT values, or apply updates to the row that already has the same conflict_columns"""
+    dialect = connection.dialect.name
+    if dialect == 'mysql':
+        statement = mysql_insert(table).values(**values).on_duplicate_key_update(**updates)
+    elif dialect == 'sqlite':
+        statement = sqlite_insert(table).values(**values).on_conflict_do_update(
+            index_elements=conflict_columns, set_=updates
+        )
+    else:
+        match = [table.c[column] == values[column] for column in conflict_columns]
+        if connection.execute(update(table).where(*match).values(**updates)).rowcount:
+            return
+        statement = table.insert().values(**values)
+    connection.execute(statement)
+
+
+def apply_deltas(connection, deltas):
+    """
+    Add a {(scope, key): delta} mapping to the counters on the given connection.
+
+    A None key is counted under NULL_KEY, so every row is in some bucket and
+    a scope's counters add up to its table's row count.
+    """
+    table = StatisticCounter.__table__
+    for (scope, key), delta in deltas.items():
+        if not delta:
+            continue
+        _upsert(
+            connection, table,
+            {'scope': scope, 'key': NULL_KEY if key is None else str(key)[:100], 'value': delta},
+            ['scope', 'key'],
+            {'value': table.c.value + delta}
+        )
+
+
+def record_slot(connection, scope, size, seq, payload):
+    """Write payload into ring buffer scope at seq % size, replacing the older entry there"""
+    table = StatisticSlot.__table__
+    values = {'scope': scope, 'slot': seq % size, 'seq': seq, 'payload': payload}
+    _upsert(connection, table, values, ['scope', 'slot'], {'seq': seq, 'payload': payload})
+
+
+def record_certificates(session, blocks):
+    """Count newly linked chain blocks and remember the latest ones; call before committing"""
+    connection = session.connection()
+    apply_deltas(connection, {('certificates', 'total'): len(blocks)})
+    for block in blocks[-RECENT_CERTIFICATES:]:
+        record_slot(connection, 'recent_certificates', RECENT_CERTIFICATES, block['chain_index'], {
+            'certificate_id': block['certificate_id'],
+            'created_at': block['created_at'].isoformat()
+        })
+
+
+def _tracked(obj):
+    return TRACKED_COLUMNS.get(getattr(obj, '__tablename__', None))
+
+
+def _after_flush(session, flush_context):
+    """
+    Turn the flushed inserts, updates and deletes of tracked rows into counter
+    deltas and ring buffer entries, written in the flush's transaction.
+
+    after_flush still sees the pre-flush new/dirty/deleted sets and attribute
+    history, and new rows already have their ids.
+    """
+    deltas = Counter()
+    wipes = []  # Added or edited wipes for the recent wipes ring
+    deleted_wipes = []
+    added_wipes = []
+    rollup_devices = set()  # Devices whose wipe rollup must be recomputed
+    deleted_devices = []
+    for obj in session.new:
+        columns = _tracked(obj)
+        for scope, attribute, default in columns or []:
+            value = getattr(obj, attribute)
+            deltas[(scope, value if value is not None else default)] += 1
+        if columns and obj.__tablename__ == 'wipe_history':
+            wipes.append(obj)
+            added_wipes.append(obj)
+        elif columns:
+            deltas[INVENTORY_CHANGES] += 1
+    for obj in session.dirty:
+        columns = _tracked(obj)
+        if not columns or obj in session.deleted:
+            continue
+        state = inspect(obj)
+        for scope, attribute, _ in columns:
+            history = state.attrs[attribute].history
+            if history.has_changes():
+                for value in history.deleted:
+                    deltas[(scope, value)] -= 1
+                for value in history.added:
+                    deltas[(scope, value)] += 1
+        if obj.__tablename__ == 'device':
+            if session.is_modified(obj, include_collections=False):
+                deltas[INVENTORY_CHANGES] += 1
+        elif obj.__tablename__ == 'wipe_history':
+            if session.is_modified(obj, include_collections=False):
+                wipes.append(obj)
+            if any(state.attrs[attribute].history.has_changes() for attribute in ROLLUP_ATTRIBUTES):
+                rollup_devices.update(_stored_values(state, 'device_id') + [obj.device_id])
+    for obj in session.deleted:
+        state = inspect(obj)
+        table_name = getattr(obj, '__tablename__', None)
+        if table_name == 'wipe_history':
+            rollup_devices.update(_stored_values(state, 'device_id'))
+            deleted_wipes.append(obj.id)
+        elif table_name == 'device':
+            deleted_devices.append(obj.id)
+            deltas[INVENTORY_CHANGES] += 1
+        for scope, attribute, _ in _tracked(obj) or []:
+            history = state.attrs[attribute].history
+            # The stored value, even if the attribute was changed before the delete
+            stored = (history.deleted or history.unchanged or [getattr(obj, attribute)])[0]
+            deltas[(scope, stored)] -= 1
+
+    if not deltas and not wipes and not deleted_wipes and not rollup_devices and not deleted_devices:
+        return
+    connection = session.connection()
+    apply_deltas(connection, deltas)
+    if wipes or deleted_wipes:
+        _update_recent_wipes(connection, wipes, deleted_wipes)
+    for wipe in added_wipes:
+        if wipe.device_id not in rollup_devices:
+            _rollup_wipe_added(connection, wipe)
+    for device_pk in rollup_devices:
+        recompute_wipe_rollup(connection, device_pk)
+    if deleted_devices:
+        table = DeviceWipeRollup.__table__
+        connection.execute(table.delete().where(table.c.device_pk.in_(deleted_devices)))
+
+
+def _stored_values(state, attribute):
+    """Values an attribute held before this flush (none for a new object)"""
+    history = state.attrs[attribute].history
+    return list(history.deleted or history.unchanged or [])
+
+
+def _rollup_values(wipe_id, wiped_at, wipe_method, status):
+    return {
+        'last_wipe_id': wipe_id,
+        'last_wiped_at': wiped_at,
+        'last_wipe_method': wipe_method,
+        'last_wipe_status': status
+    }
+
+
+def _rollup_wipe_added(connection, wipe):
+    """Count a new wipe in its device's rollup and make it the latest if it is newer"""
+    table = DeviceWipeRollup.__table__
+    latest = _rollup_values(wipe.id, wipe.wiped_at, wipe.wipe_method, wipe.status)
+    _upsert(
+        connection, table,
+        {'device_pk': wipe.device_id, 'wipe_count': 1, **latest},
+        ['device_pk'],
+        {'wipe_count': table.c.wipe_count + 1}
+    )
+    # Latest by (wiped_at, id), matching the wipe history order
+    connection.execute(update(table).where(
+        table.c.device_pk == wipe.device_id,
+        or_(
+            table.c.last_wiped_at.is_(None),
+            table.c.last_wiped_at < wipe.wiped_at,
+            and_(table.c.last_wiped_at == wipe.wiped_at, table.c.last_wipe_id < wipe.id)
+        )
+    ).values(**latest))
+
+
+def recompute_wipe_rollup(connection, device_pk):
+    """Rebuild one device's rollup from its wipe history; used when wipes are edited or deleted"""
+    from .devices_routes import WipeHistory
+
+    wipes = WipeHistory.__table__
+    table = DeviceWipeRollup.__table__
+    count = connection.execute(
+        select(func.count()).select_from(wipes).where(wipes.c.device_id == device_pk)
+    ).scalar()
+    if not count:
+        connection.execute(table.delete().where(table.c.device_pk == device_pk))
+        return
+    last = connection.execute(
+        select(wipes.c.id, wipes.c.wiped_at, wipes.c.wipe_method, wipes.c.status).where(
+            wipes.c.device_id == device_pk
+        ).order_by(wipes.c.wiped_at.desc(), wipes.c.id.desc()).limit(1)
+    ).first()
+    latest = _rollup_values(*last)
+    _upsert(
+        connection, table,
+        {'device_pk': device_pk, 'wipe_count': count, **latest},
+        ['device_pk'],
+        {'wipe_count': count, **latest}
+    )
+
+
+def _wipe_seq(wiped_at):
+    """Ring order for a wipe: wiped_at in epoch microseconds"""
+    return (wiped_at - EPOCH) // timedelta(microseconds=1)
+
+
+def _record_wipe(connection, wipe_id, wiped_at, payload):
+    """Store a wipe in the recent wipes ring, in the slot named by its id"""
+    table = StatisticSlot.__table__
+    seq = _wipe_seq(wiped_at)
+    values = {'scope': 'recent_wipes', 'slot': wipe_id, 'seq': seq, 'payload': payload}
+    _upsert(connection, table, values, ['scope', 'slot'], {'seq': seq, 'payload': payload})
+
+
+def _refill_recent_wipes(connection):
+    """Replace the recent wipes ring with the newest RECENT_WIPES wipes by (wiped_at, id)"""
+    from .devices_routes import WipeHistory
+
+    table = StatisticSlot.__table__
+    connection.execute(table.delete().where(table.c.scope == 'recent_wipes'))
+    for wipe in connection.execute(
+        select(WipeHistory.__table__).where(WipeHistory.wiped_at.isnot(None)).order_by(
+            WipeHistory.wiped_at.desc(), WipeHistory.id.desc()
+        ).limit(RECENT_WIPES)
+    ).mappings():
+        _record_wipe(connection, wipe['id'], wipe['wiped_at'], WipeHistory(**wipe).to_dict())
+
+
+def _update_recent_wipes(connection, wipes, deleted_ids):
+    """
+    Keep the recent wipes ring equal to the newest RECENT_WIPES wipes by (wiped_at, id).
+
+    New wipes and edits to wipes in the ring are applied in place. Only when
+    a wipe in the ring is deleted or moved back in time may a wipe outside it
+    belong in it, and then the ring is refilled from the wipe history. Wipes
+    without a wiped_at have no place in the order and are left out.
+    """
+    table = StatisticSlot.__table__
+    ring = {
+        row.slot: (row.seq, row.slot)
+        for row in connection.execute(select(table.c.slot, table.c.seq).where(table.c.scope == 'recent_wipes'))
+    }
+    if any(wipe_id in ring for wipe_id in deleted_ids):
+        _refill_recent_wipes(connection)
+        return
+
+    for wipe in wipes:
+        if wipe.wiped_at is None:
+            if wipe.id in ring:
+                _refill_recent_wipes(connection)
+                return
+            continue
+        key = (_wipe_seq(wipe.wiped_at), wipe.id)
+        if wipe.id in ring:
+            if key < ring[wipe.id] and len(ring) == RECENT_WIPES:
+                _refill_recent_wipes(connection)
+                return
+        elif len(ring) == RECENT_WIPES:
+            oldest = min(ring.values())
+            if key < oldest:
+                continue
+            connection.execute(table.delete().where(table.c.scope == 'recent_wipes', table.c.slot == oldest[1]))
+            del ring[oldest[1]]
+        ring[wipe.id] = key
+        _record_wipe(connection, wipe.id, wipe.wiped_at, wipe.to_dict())
+
+
+def _load_replaced_value(target, value, oldvalue, initiator):
+    """No-op set listener; registered with active_history for what it switches on"""
+
+
+def _track_replaced_values():
+    """
+    Make the counted and rollup attributes load the value they replace.
+
+    Setting an attribute expired by a commit otherwise records no old value,
+    and the flush could not subtract it from its counter.
+    """
+    from .devices_routes import Device, WipeHistory
+
+    attributes = [getattr(Device, attribute) for _, attribute, _ in TRACKED_COLUMNS['device']]
+    attributes += [getattr(WipeHistory, attribute) for _, attribute, _ in TRACKED_COLUMNS['wipe_history']]
+    attributes += [getattr(WipeHistory, attribute) for attribute in ROLLUP_ATTRIBUTES]
+    for attribute in attributes:
+        if not event.contains(attribute, 'set', _load_replaced_value):
+            event.listen(attribute, 'set', _load_replaced_value, active_history=True)
+
+
+def init_app(app):
+    """Hook the flush listeners and build the statistics once for an existing database"""
+    if not event.contains(db.session, 'after_flush', _after_flush):
+        event.listen(db.session, 'after_flush', _after_flush)
+    _track_replaced_values()
+
+    with app.app_context():
+        version = StatisticCounter.query.filter_by(scope='meta', key='version').first()
+        if version is None or version.value != SCHEMA_VERSION:
+            rebuild_statistics()
+
+
+def rebuild_statistics():
+    """
+    Recompute every counter and ring buffer from the source tables.
+
+    Runs in one transaction. Writes made by other processes while it runs can
+    be missed, so run it when uploads and device edits are quiet.
+    """
+    # Imported here: the device models live in the devices blueprint module
+    from .devices_routes import Device, WipeHistory
+
+    connection = db.session.connection()
+    connection.execute(StatisticCounter.__table__.delete().where(StatisticCounter.scope != INVENTORY_CHANGES[0]))
+    connection.execute(StatisticSlot.__table__.delete())
+    connection.execute(DeviceWipeRollup.__table__.delete())
+
+    deltas = Counter({('meta', 'version'): SCHEMA_VERSION})
+    grouped = [
+        ('device_status', Device, Device.status),
+        ('device_type', Device, Device.device_type),
+        ('wipe_method', WipeHistory, WipeHistory.wipe_method),
+        ('wipe_status', WipeHistory, WipeHistory.status),
+    ]
+    for scope, model, column in grouped:
+        for key, count in db.session.query(column, db.func.count(model.id)).group_by(column).all():
+            deltas[(scope, key)] += count
+    deltas[('certificates', 'total')] = CertificateVerification.query.count()
+    apply_deltas(connection, deltas)
+
+    _refill_recent_wipes(connection)
+    recent_certificates = CertificateVerification.query.order_by(
+        CertificateVerification.chain_index.desc()
+    ).limit(RECENT_CERTIFICATES).all()
+    for cert in recent_certificates:
+        record_slot(connection, 'recent_certificates', RECENT_CERTIFICATES, cert.chain_index, {
+            'certificate_id': cert.certificate_id,
+            'created_at': cert.created_at.isoformat()
+        })
+
+    _rebuild_wipe_rollups(connection, WipeHistory)
+
+    db.session.commit()
+    logger.info(f"Statistics rebuilt at {datetime.utcnow().isoformat()}")
+    return get_counters()
+
+
+def _rebuild_wipe_rollups(connection, WipeHistory, batch_size=1000):
+    """
+    One pass over the wipe history in (device, id) order, writing a rollup per device.
+
+    A device's rollup is complete once the next device starts, so only the
+    current device and one batch of finished rollups are held in memory.
+    Wipes are read in keyset pages, each fetched in full before rollups are
+    written: MySQL cannot insert on a connection still streaming a result.
+    """
+    wipes = WipeHistory.__table__
+    table = DeviceWipeRollup.__table__
+    batch = []
+    current = None
+    latest = None
+    last_device, last_id = 0, 0
+    while True:
+        page = connection.execute(
+            select(wipes.c.device_id, wipes.c.id, wipes.c.wiped_at, wipes.c.wipe_method, wipes.c.status).where(
+                or_(wipes.c.device_id > last_device, and_(wipes.c.device_id == last_device, wipes.c.id > last_id))
+            ).order_by(wipes.c.device_id, wipes.c.id).limit(batch_size)
+        ).all()
+        if not page:
+            break
+        for device_pk, wipe_id, wiped_at, wipe_method, status in page:
+            if current is None or current['device_pk'] != device_pk:
+                if current is not None:
+                    batch.append(current)
+                if len(batch) >= batch_size:
+                    connection.execute(table.insert(), batch)
+                    batch = []
+                current = {'device_pk': device_pk, 'wipe_count': 0}
+                latest = None
+            current['wipe_count'] += 1
+            # Latest by (wiped_at, id) as in recompute_wipe_rollup, with unknown times oldest
+            key = (wiped_at is not None, wiped_at or datetime.min, wipe_id)
+            if latest is None or key > latest:
+                latest = key
+                current.update(_rollup_values(wipe_id, wiped_at, wipe_method, status))
+        last_device, last_id = page[-1].device_id, page[-1].id
+    if current is not None:
+        batch.append(current)
+    if batch:
+        connection.execute(table.insert(), batch)
+
+
+def get_wipe_rollup(device_pk):
+    """A device's wipe count and latest wipe, zeroed when it has never been wiped"""
+    rollup = DeviceWipeRollup.query.filter_by(device_pk=device_pk).first()
+    if rollup is None:
+        return DeviceWipeRollup(wipe_count=0).to_dict()
+    return rollup.to_dict()
+
+
+def get_counters(scope=None):
+    """Return {scope: {key: value}}, or {key: value} for a single scope"""
+    query = db.session.query(StatisticCounter.scope, StatisticCounter.key, StatisticCounter.value)
+    if scope is not None:
+        return {key: value for _, key, value in query.filter(StatisticCounter.scope == scope).all() if value}
+    counters = {}
+    for row_scope, key, value in query.all():
+        if value:
+            counters.setdefault(row_scope, {})[key] = value
+    return counters
+
+
+def get_recent(scope):
+    """Entries of a ring buffer, newest first"""
+    slots = StatisticSlot.query.filter_by(scope=scope).order_by(
+        StatisticSlot.seq.desc(), StatisticSlot.slot.desc()
+    ).all()
+    return [slot.payload for slot in slots]
@@ -0,0 +1,80 @@
+"""
+Bounded LRU + TTL cache of certificate verification outcomes.
+
+Entries are keyed by the SHA-256 of the entered verification code. A found
+certificate's outcome does not change when later blocks are appended, so
+appends only evict the keys they add (turning a cached "not found" into a
+miss). Everything else expires after the TTL, which bounds how long an
+out-of-band change to the chain can go unnoticed.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+
+class VerificationCache:
+    def __init__(self, max_entries=10000, ttl=300):
+        self.max_entries = max_entries
+        self.ttl = ttl  # Seconds an outcome may be served from memory
+        self.stats = {'hits': 0, 'misses': 0, 'evictions': 0, 'invalidations': 0}
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        """Read VERIFICATION_CACHE_SIZE / VERIFICATION_CACHE_TTL from the app config"""
+        self.max_entries = app.config.get('VERIFICATION_CACHE_SIZE', self.max_entries)
+        self.ttl = app.config.get('VERIFICATION_CACHE_TTL', self.ttl)
+        app.extensions['verification_cache'] = self
+
+    def get(self, key):
+        """Return the cached outcome for key, or None on a miss"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    del self._entries[key]
+                self.stats['misses'] += 1
+                return None
+            self._entries.move_to_end(key)
+            self.stats['hits'] += 1
+            return entry[1]
+
+    def put(self, key, outcome):
+        """Store an outcome, evicting the least recently used entry when full"""
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, outcome)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.stats['evictions'] += 1
+
+    def invalidate(self, key):
+        with self._lock:
+            if self._entries.pop(key, None) is not None:
+                self.stats['invalidations'] += 1
+
+    def clear(self):
+        with self._lock:
+            self.stats['invalidations'] += len(self._entries)
+            self._entries.clear()
+
+    def on_chain_append(self, blocks):
+        """Chain commit listener: drop cached outcomes for the newly added keys"""
+        for block in blocks:
+            self.invalidate(block['verification_key'])
+
+    def get_stats(self):
+        with self._lock:
+            lookups = self.stats['hits'] + self.stats['misses']
+            return {
+                **self.stats,
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'ttl_seconds': self.ttl,
+                'hit_rate': round(self.stats['hits'] / lookups, 4) if lookups else None
+            }
+
+
+# Global verification cache instance
+verification_cache = VerificationCache()
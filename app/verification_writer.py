@@ -0,0 +1,114 @@
+"""
+Write-behind buffer for certificate verification timestamps.
+
+Marking a certificate verified used to commit an UPDATE inside every
+verification request. Instead the new state is recorded in memory and a
+background thread writes all pending rows in one executemany transaction.
+Durability is bounded: a change waits at most flush_interval seconds, a full
+buffer (max_batch rows) is flushed immediately, and the buffer is drained
+when the process exits.
+"""
+
+import atexit
+import logging
+import threading
+
+from sqlalchemy import bindparam
+
+from .models import CertificateVerification, db
+
+logger = logging.getLogger(__name__)
+
+
+class VerificationWriteBehind:
+    def __init__(self, flush_interval=2.0, max_batch=500):
+        self.app = None
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+        self.stats = {'recorded': 0, 'flushed': 0, 'flushes': 0, 'failures': 0}
+        self._pending = {}  # certificate row id -> latest verified_at
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopped = False
+        self._worker = None
+
+    def init_app(self, app):
+        """Read VERIFICATION_FLUSH_* settings and drain the buffer at exit"""
+        self.app = app
+        self.flush_interval = app.config.get('VERIFICATION_FLUSH_INTERVAL', self.flush_interval)
+        self.max_batch = app.config.get('VERIFICATION_FLUSH_BATCH', self.max_batch)
+        app.extensions['verification_writer'] = self
+        atexit.register(self.shutdown)
+
+    def record(self, certificate_pk, verified_at):
+        """Queue is_verified/verified_at for a certificate row; repeated records coalesce"""
+        if self.app is None:
+            raise RuntimeError('VerificationWriteBehind is not bound to an app')
+        with self._lock:
+            self._pending[certificate_pk] = verified_at
+            self.stats['recorded'] += 1
+            full = len(self._pending) >= self.max_batch
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._run, name='verification-writer', daemon=True)
+                self._worker.start()
+        if full:
+            self._wake.set()
+
+    def _run(self):
+        while not self._stopped:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            self.flush()
+
+    def flush(self):
+        """Write every pending change in one transaction; returns the number of rows written"""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return 0
+
+        table = CertificateVerification.__table__
+        statement = table.update().where(table.c.id == bindparam('row_id')).values(
+            is_verified=True, verified_at=bindparam('verified_at_value')
+        )
+        params = [{'row_id': pk, 'verified_at_value': verified_at} for pk, verified_at in pending.items()]
+
+        with self.app.app_context():
+            try:
+                db.session.execute(statement, params)
+                db.session.commit()
+            except Exception as e:
+                db.session.rollback()
+                logger.error(f"Failed to flush {len(params)} verification updates: {e}")
+                self.stats['failures'] += 1
+                with self._lock:
+                    # Keep the changes for the next flush unless newer ones arrived meanwhile
+                    for pk, verified_at in pending.items():
+                        self._pending.setdefault(pk, verified_at)
+                return 0
+            finally:
+                db.session.remove()
+
+        self.stats['flushes'] += 1
+        self.stats['flushed'] += len(params)
+        return len(params)
+
+    def shutdown(self):
+        """Stop the flusher and drain whatever is still buffered"""
+        self._stopped = True
+        self._wake.set()
+        if self.app is not None:
+            self.flush()
+
+    def get_stats(self):
+        with self._lock:
+            return {
+                **self.stats,
+                'pending': len(self._pending),
+                'flush_interval_seconds': self.flush_interval,
+                'max_batch': self.max_batch
+            }
+
+
+# Global verification write-behind instance
+verification_writer = VerificationWriteBehind()
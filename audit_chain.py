@@ -0,0 +1,40 @@
+#!/usr/bin/env python3
+"""
+Re-hash the whole certificate chain and report the first divergence.
+
+Usage: python audit_chain.py [--workers N] [--chunk-size N] [--start-index N]
+"""
+import argparse
+from app import create_app
+from app.chain_audit import audit_chain, DEFAULT_CHUNK_SIZE
+
+def main():
+    parser = argparse.ArgumentParser(description="Audit the certificate blockchain")
+    parser.add_argument("--workers", type=int, default=None, help="hashing processes (default: CPU count)")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE, help="blocks per work unit")
+    parser.add_argument("--start-index", type=int, default=0, help="chain index to start from")
+    args = parser.parse_args()
+
+    app, socketio = create_app()
+    with app.app_context():
+        print("🔗 Auditing certificate blockchain...")
+        result = audit_chain(
+            workers=args.workers,
+            chunk_size=args.chunk_size,
+            start_index=args.start_index,
+            progress=lambda checked: print(f"   ↳ {checked} blocks re-hashed", end="\r")
+        )
+
+    print()
+    print(f"📊 Blocks checked: {result['blocks_checked']}")
+    print(f"⏱️  {result['elapsed_seconds']}s ({result['blocks_per_second']} blocks/s, {result['workers']} workers)")
+    if result['chain_valid']:
+        print("🎉 BLOCKCHAIN INTEGRITY: ✅ ALL BLOCKS RE-HASHED SUCCESSFULLY")
+    else:
+        divergence = result['first_divergence']
+        print(f"⚠️ BLOCKCHAIN INTEGRITY: ❌ FIRST DIVERGENCE AT BLOCK #{divergence['chain_index']}")
+        print(f"   ↳ {divergence['reason']}")
+        raise SystemExit(1)
+
+if __name__ == "__main__":
+    main()
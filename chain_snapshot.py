@@ -0,0 +1,41 @@
+#!/usr/bin/env python3
+"""
+Export or verify a binary certificate chain snapshot.
+
+Usage:
+    python chain_snapshot.py export chain.snapshot [--start-index N] [--key KEY]
+    python chain_snapshot.py verify chain.snapshot [--key KEY]
+"""
+import argparse
+import os
+from app.chain_snapshot import export_snapshot, verify_snapshot
+
+def main():
+    parser = argparse.ArgumentParser(description="Export or verify a binary chain snapshot")
+    parser.add_argument("command", choices=["export", "verify"])
+    parser.add_argument("path", help="snapshot file")
+    parser.add_argument("--start-index", type=int, default=0, help="first chain index to export")
+    parser.add_argument("--key", default=os.environ.get("CHAIN_SNAPSHOT_KEY"), help="HMAC key (default: $CHAIN_SNAPSHOT_KEY)")
+    args = parser.parse_args()
+    key = args.key.encode() if args.key else None
+
+    if args.command == "export":
+        from app import create_app
+        app, socketio = create_app()
+        with app.app_context():
+            snapshot = export_snapshot(args.path, start_index=args.start_index, key=key)
+        print(f"✅ Exported {snapshot['records']} blocks to {snapshot['path']} ({snapshot['size_bytes']} bytes)")
+        return
+
+    result = verify_snapshot(args.path, key=key)
+    if result['valid']:
+        print(f"✅ Snapshot valid: {result['records']} blocks from #{result['start_index']}")
+        print(f"   ↳ Head hash: {result['head_hash']}")
+    else:
+        print(f"❌ Snapshot invalid: {result['reason']}")
+        if result['first_invalid_index'] is not None:
+            print(f"   ↳ First invalid block: #{result['first_invalid_index']}")
+        raise SystemExit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,248 @@
+#!/usr/bin/env python3
+"""
+Convert certificate digests to 32-byte binary storage in place.
+
+Unlike update_database.py this keeps every row. It also adds the lookup
+indexes on verification_key and certificate_hash and makes chain_index
+unique.
+
+- MySQL: each hex digest column is copied into a binary shadow column in
+  batches, the copy is checked, and only then are the columns swapped.
+- SQLite cannot change a column in place, so the table is renamed aside,
+  recreated with binary digest columns and refilled in batches.
+
+Every step checks what an earlier, interrupted run already did, so the
+migration can simply be rerun until it succeeds.
+
+Stop the app (and anything else writing certificates) before migrating:
+rows written while the copy runs could be left without their digests.
+
+Usage:
+    python migrate_digest_storage.py [--batch-size N] [--indexes-only] [--database-uri URI]
+
+Set DIGEST_STORAGE=binary for the app once the migration has completed.
+
+The migration connects with a bare engine rather than through create_app():
+the app's startup hooks read digests (the certificate filter, chain head and
+statistics), which fails on a database that is already partly or fully
+converted.
+"""
+import argparse
+import os
+
+# The migration reads the old layout, so the app must not expect binary digests yet
+os.environ['DIGEST_STORAGE'] = 'hex'
+
+from sqlalchemy import BINARY, LargeBinary, MetaData, Table, VARBINARY, create_engine, inspect, select, text
+from app import DATABASE_URI
+from app.models import CertificateVerification
+
+TABLE = 'certificate_verification'
+HEX_TABLE = f'{TABLE}_hex'  # SQLite: the original table while its rows are copied
+DIGEST_COLUMNS = ['verification_key', 'previous_hash', 'certificate_hash']
+NOT_NULL_COLUMNS = {'verification_key', 'certificate_hash'}
+BINARY_TYPES = (LargeBinary, BINARY, VARBINARY)
+INDEXES = [
+    ('ix_certificate_verification_verification_key', 'verification_key', False),
+    ('ix_certificate_verification_certificate_hash', 'certificate_hash', False),
+    ('ix_certificate_verification_chain_index', 'chain_index', True),
+]
+
+def digest_bytes(row_id, column, value):
+    """A stored digest, hex string or raw bytes, as 32 raw bytes"""
+    if value is None:
+        return None
+    digest = bytes(value) if isinstance(value, (bytes, bytearray, memoryview)) else bytes.fromhex(value)
+    if len(digest) != 32:
+        raise ValueError(f"Row {row_id}: {column} is not a SHA-256 digest")
+    return digest
+
+def table_columns(connection, table=TABLE):
+    return {column['name']: column for column in inspect(connection).get_columns(table)}
+
+def drop_index(connection, name, table=TABLE):
+    connection.execute(text(f"DROP INDEX {name} ON {table}" if connection.dialect.name == 'mysql' else f"DROP INDEX {name}"))
+
+def digest_columns_to_convert(connection):
+    """Digest columns still stored as hex strings (or, mid-swap, only as their binary copy)"""
+    columns = table_columns(connection)
+    return [
+        name for name in DIGEST_COLUMNS
+        if name not in columns or not isinstance(columns[name]['type'], BINARY_TYPES)
+    ]
+
+def convert_digests(connection, columns, batch_size):
+    """
+    MySQL: copy hex digests into binary shadow columns; returns the number of rows converted.
+
+    Rows whose copy is missing are caught up afterwards, and the swap only
+    starts once no digest is left without its binary copy.
+    """
+    existing_columns = table_columns(connection)
+    columns = [column for column in columns if column in existing_columns]
+    for column in columns:
+        # A previous interrupted run may already have added the shadow column
+        if f"{column}_bin" not in existing_columns:
+            connection.execute(text(f"ALTER TABLE {TABLE} ADD COLUMN {column}_bin BINARY(32) NULL"))
+    connection.commit()
+    if not columns:
+        return 0
+
+    select_columns = ', '.join(columns)
+    assignments = ', '.join(f"{column}_bin = :{column}" for column in columns)
+    missing = ' OR '.join(f"({column} IS NOT NULL AND {column}_bin IS NULL)" for column in columns)
+
+    def copy(where, params):
+        rows = connection.execute(
+            text(f"SELECT id, {select_columns} FROM {TABLE} WHERE {where} ORDER BY id LIMIT :limit"),
+            {**params, 'limit': batch_size}
+        ).mappings().all()
+        if rows:
+            connection.execute(text(f"UPDATE {TABLE} SET {assignments} WHERE id = :id"), [
+                {'id': row['id'], **{column: digest_bytes(row['id'], column, row[column]) for column in columns}}
+                for row in rows
+            ])
+            connection.commit()
+        return rows
+
+    converted = 0
+    last_id = 0
+    while True:
+        rows = copy("id > :last_id", {'last_id': last_id})
+        if not rows:
+            break
+        converted += len(rows)
+        last_id = rows[-1]['id']
+        print(f"   ↳ Converted {converted} rows", end="\r")
+    print()
+
+    # Rows changed behind the first pass
+    while copy(missing, {}):
+        pass
+    return converted
+
+def swap_columns(connection, columns):
+    """MySQL: replace the hex columns with their binary copies, restoring NOT NULL"""
+    existing_columns = table_columns(connection)
+    renaming = [column for column in columns if f"{column}_bin" in existing_columns]
+    for index in inspect(connection).get_indexes(TABLE):
+        if any(name in renaming or name in (f"{column}_bin" for column in renaming) for name in index['column_names']):
+            drop_index(connection, index['name'])
+
+    for column in renaming:
+        if column in existing_columns:
+            connection.execute(text(f"ALTER TABLE {TABLE} DROP COLUMN {column}"))
+        nullability = 'NOT NULL' if column in NOT_NULL_COLUMNS else 'NULL'
+        connection.execute(text(f"ALTER TABLE {TABLE} CHANGE {column}_bin {column} BINARY(32) {nullability}"))
+    connection.commit()
+
+def rebuild_sqlite_table(connection, batch_size):
+    """
+    SQLite: recreate the table with binary digest columns; returns the number of rows copied.
+
+    The original table is renamed to HEX_TABLE, the new one is created from
+    the model (so every NOT NULL and unique constraint is kept) and rows are
+    copied in id order. A rerun resumes after the highest id already copied.
+    """
+    tables = inspect(connection).get_table_names()
+    if HEX_TABLE not in tables:
+        # Index names are global in SQLite; the new table recreates them
+        for index in inspect(connection).get_indexes(TABLE):
+            drop_index(connection, index['name'])
+        connection.execute(text(f"ALTER TABLE {TABLE} RENAME TO {HEX_TABLE}"))
+        connection.commit()
+
+    target = CertificateVerification.__table__.to_metadata(MetaData())
+    for column in DIGEST_COLUMNS:
+        target.c[column].type = LargeBinary(32)
+    target.create(connection, checkfirst=True)
+    connection.commit()
+
+    source = Table(HEX_TABLE, MetaData(), autoload_with=connection)
+    names = [column for column in target.c.keys() if column in source.c]
+    copied = 0
+    last_id = connection.execute(text(f"SELECT COALESCE(MAX(id), 0) FROM {TABLE}")).scalar()
+    while True:
+        rows = connection.execute(
+            select(*(source.c[name] for name in names)).where(source.c.id > last_id).order_by(source.c.id).limit(batch_size)
+        ).mappings().all()
+        if not rows:
+            break
+        connection.execute(target.insert(), [
+            {
+                name: digest_bytes(row['id'], name, row[name]) if name in DIGEST_COLUMNS else row[name]
+                for name in names
+            }
+            for row in rows
+        ])
+        connection.commit()
+        copied += len(rows)
+        last_id = rows[-1]['id']
+        print(f"   ↳ Copied {copied} rows", end="\r")
+    print()
+
+    counts = [connection.execute(text(f"SELECT COUNT(*) FROM {table}")).scalar() for table in (TABLE, HEX_TABLE)]
+    if counts[0] != counts[1]:
+        raise ValueError(f"{TABLE} has {counts[0]} rows but {HEX_TABLE} has {counts[1]}; is the app still running?")
+    connection.execute(text(f"DROP TABLE {HEX_TABLE}"))
+    connection.commit()
+    return copied
+
+def ensure_indexes(connection):
+    """Create the lookup indexes and the unique chain_index index if missing"""
+    existing_indexes = {index['name']: index for index in inspect(connection).get_indexes(TABLE)}
+    for name, column, unique in INDEXES:
+        index = existing_indexes.get(name)
+        if index and bool(index['unique']) == unique:
+            continue
+        if index:
+            drop_index(connection, name)
+        connection.execute(text(f"CREATE {'UNIQUE ' if unique else ''}INDEX {name} ON {TABLE} ({column})"))
+        print(f"✅ Created {'unique ' if unique else ''}index on {column}")
+    connection.commit()
+
+def migrate(connection, batch_size=1000, indexes_only=False):
+    """Run every migration step still outstanding on connection"""
+    if not indexes_only:
+        sqlite = connection.dialect.name == 'sqlite'
+        interrupted = sqlite and HEX_TABLE in inspect(connection).get_table_names()
+        columns = digest_columns_to_convert(connection)
+        if columns or interrupted:
+            if sqlite:
+                converted = rebuild_sqlite_table(connection, batch_size)
+            else:
+                converted = convert_digests(connection, columns, batch_size)
+                swap_columns(connection, columns)
+            print(f"✅ Converted {', '.join(columns or DIGEST_COLUMNS)} to binary for {converted} rows")
+        else:
+            print("✅ Digest columns are already binary")
+
+    ensure_indexes(connection)
+
+def migrate_digest_storage(batch_size=1000, indexes_only=False, database_uri=DATABASE_URI):
+    engine = create_engine(database_uri)
+
+    print("🔄 Migrating certificate digest storage...")
+    try:
+        with engine.connect() as connection:
+            try:
+                migrate(connection, batch_size=batch_size, indexes_only=indexes_only)
+            except Exception as e:
+                connection.rollback()
+                print(f"❌ Error migrating database: {e}")
+                print("   Hex digests are only dropped once every row has its binary copy; rerun once the data is fixed.")
+                raise SystemExit(1)
+    finally:
+        engine.dispose()
+
+    print("🎉 Database migrated successfully!")
+    if not indexes_only:
+        print("📋 Start the app with DIGEST_STORAGE=binary to use the binary columns.")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Convert certificate digests to binary storage")
+    parser.add_argument("--batch-size", type=int, default=1000, help="rows converted per transaction")
+    parser.add_argument("--indexes-only", action="store_true", help="only add the lookup indexes")
+    parser.add_argument("--database-uri", default=DATABASE_URI, help="database to migrate (default: the app's)")
+    args = parser.parse_args()
+    migrate_digest_storage(batch_size=args.batch_size, indexes_only=args.indexes_only, database_uri=args.database_uri)
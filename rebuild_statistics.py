@@ -0,0 +1,27 @@
+#!/usr/bin/env python3
+"""
+Recompute the materialized device, wipe and certificate statistics.
+
+The counters are normally kept up to date as rows change; run this if they
+have drifted (e.g. after editing tables by hand). Best run while uploads and
+device edits are quiet.
+
+Usage: python rebuild_statistics.py
+"""
+from app import create_app
+from app.statistics import rebuild_statistics
+
+def main():
+    app, socketio = create_app()
+    with app.app_context():
+        print("🔄 Rebuilding statistics...")
+        counters = rebuild_statistics()
+
+    for scope, values in sorted(counters.items()):
+        if scope == 'meta':
+            continue
+        print(f"📊 {scope}: " + ", ".join(f"{key}={value}" for key, value in sorted(values.items())))
+    print("🎉 Statistics rebuilt successfully!")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+import hashlib
+import json
+from datetime import datetime, timedelta
+
+import pytest
+
+from app import create_app
+from app.chain_append import chain_append_service
+from app.devices_routes import Device, WipeHistory
+from app.models import CertificateVerification, db
+
+WIPE_START = datetime(2024, 1, 1)
+
+
+@pytest.fixture
+def app(tmp_path):
+    """App on a throwaway SQLite database and ingest journal"""
+    app, socketio = create_app({
+        'TESTING': True,
+        'SQLALCHEMY_DATABASE_URI': f"sqlite:///{tmp_path / 'test.db'}",
+        'INGEST_QUEUE_PATH': str(tmp_path / 'ingest_queue.db'),
+    })
+    yield app
+    with app.app_context():
+        db.session.remove()
+        db.engine.dispose()
+
+
+@pytest.fixture
+def ctx(app):
+    """Run the test inside an app context"""
+    with app.app_context():
+        yield
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def append_certificates(app):
+    """Append count certificates through the chain append service; returns their blocks"""
+    def append(count, prefix='cert'):
+        with app.app_context():
+            return chain_append_service.append_many([
+                {
+                    'certificate_id': f'{prefix}-{i}',
+                    'verification_key': CertificateVerification.hash_text(f'{prefix}-code-{i}'),
+                    'random_text': f'{prefix}-code-{i}'
+                }
+                for i in range(count)
+            ])
+    return append
+
+
+@pytest.fixture
+def desktop_certificate():
+    """Build a certificate as the desktop wiping tool sends it, with a valid certificate_hash"""
+    def build(certificate_id, signature=None, **overrides):
+        certificate = {
+            'certificate_id': certificate_id,
+            'device_info': {'model': 'Test Drive', 'serial': f'SN-{certificate_id}'},
+            'wipe_method': 'NIST_Purge',
+            'timestamp': '2024-01-01T00:00:00',
+        }
+        certificate['certificate_hash'] = hashlib.sha256(json.dumps(certificate, sort_keys=True).encode()).hexdigest()
+        certificate['signature'] = signature or f'{certificate_id}-signature'
+        certificate.update(overrides)
+        return certificate
+    return build
+
+
+@pytest.fixture
+def create_devices(client):
+    """Create devices dev-0 .. dev-{count-1} through the API, alternating HDD and SSD"""
+    def create(count, **fields):
+        for i in range(count):
+            response = client.post('/api/devices', json={
+                'device_id': f'dev-{i}', 'device_type': 'SSD' if i % 2 else 'HDD', 'model': f'Model {i}',
+                'serial_number': f'SN-{i}', 'manufacturer': 'Acme', **fields
+            })
+            assert response.status_code == 201
+    return create
+
+
+@pytest.fixture
+def add_device():
+    """Commit a device directly; call inside an app context"""
+    def add(name='dev-1', **fields):
+        device = Device(device_id=name, device_type='HDD', model='Test Drive', serial_number=f'SN-{name}', **fields)
+        db.session.add(device)
+        db.session.commit()
+        return device
+    return add
+
+
+@pytest.fixture
+def wipe_start():
+    """The wiped_at of an add_wipes entry of 0 hours"""
+    return WIPE_START
+
+
+@pytest.fixture
+def add_wipes():
+    """Commit one wipe per entry, wiped that many hours after wipe_start; call inside an app context"""
+    def add(device, hours):
+        wipes = [WipeHistory(device_id=device.id, wipe_method='NIST Purge', wiped_at=WIPE_START + timedelta(hours=h))
+                 for h in hours]
+        db.session.add_all(wipes)
+        db.session.commit()
+        return wipes
+    return add
@@ -0,0 +1,60 @@
+def test_latest_window_by_default(client, append_certificates):
+    append_certificates(10)
+    data = client.get('/api/blockchain?limit=3').get_json()
+    assert [block['chain_index'] for block in data['blockchain']] == [7, 8, 9]
+    assert data['next_cursor'] == 7
+    assert data['total_certificates'] == 10
+
+
+def test_pages_backwards_with_before(client, append_certificates):
+    append_certificates(10)
+    seen = []
+    cursor = None
+    while True:
+        url = '/api/blockchain?limit=4' + (f'&before={cursor}' if cursor is not None else '')
+        data = client.get(url).get_json()
+        seen = [block['chain_index'] for block in data['blockchain']] + seen
+        cursor = data['next_cursor']
+        if cursor is None:
+            break
+    assert seen == list(range(10))
+
+
+def test_pages_forwards_with_after(client, append_certificates):
+    append_certificates(10)
+    data = client.get('/api/blockchain?after=2&limit=3').get_json()
+    assert [block['chain_index'] for block in data['blockchain']] == [3, 4, 5]
+    assert data['next_cursor'] == 5
+    data = client.get('/api/blockchain?after=8&limit=3').get_json()
+    assert [block['chain_index'] for block in data['blockchain']] == [9]
+    assert data['next_cursor'] is None
+
+
+def test_index_range_and_projection(client, append_certificates):
+    append_certificates(10)
+    data = client.get('/api/blockchain?from_index=2&to_index=4&fields=certificate_id,unknown').get_json()
+    assert data['blockchain'] == [
+        {'certificate_id': 'cert-2', 'chain_index': 2},
+        {'certificate_id': 'cert-3', 'chain_index': 3},
+        {'certificate_id': 'cert-4', 'chain_index': 4},
+    ]
+
+
+def test_time_range(client, append_certificates):
+    append_certificates(3)
+    assert len(client.get('/api/blockchain?since=2000-01-01T00:00:00').get_json()['blockchain']) == 3
+    assert client.get('/api/blockchain?until=2000-01-01T00:00:00').get_json()['blockchain'] == []
+
+
+def test_invalid_timestamp_is_rejected(client):
+    response = client.get('/api/blockchain?since=yesterday')
+    assert response.status_code == 400
+    assert 'since' in response.get_json()['error']
+
+
+def test_blockchain_page_renders_a_window(client, append_certificates):
+    append_certificates(5)
+    response = client.get('/blockchain?limit=2')
+    assert response.status_code == 200
+    assert b'cert-4' in response.data
+    assert b'cert-0' not in response.data
@@ -0,0 +1,94 @@
+from sqlalchemy import event
+
+from app.bloom_filter import BloomFilter, certificate_filter
+from app.models import CertificateVerification, db
+
+
+def insert_certificate(pk, name):
+    """Commit a certificate with an explicit id, as another process would"""
+    db.session.add(CertificateVerification(
+        id=pk,
+        certificate_id=name,
+        verification_key=CertificateVerification.hash_text(f'{name}-code'),
+        random_text=f'{name}-code',
+        certificate_hash=CertificateVerification.hash_text(name),
+        chain_index=pk,
+    ))
+    db.session.commit()
+
+
+def test_added_items_are_never_missed():
+    bloom = BloomFilter(1000, 0.01)
+    for i in range(1000):
+        bloom.add(f'item-{i}')
+    assert all(f'item-{i}' in bloom for i in range(1000))
+    false_positives = sum(f'other-{i}' in bloom for i in range(10000))
+    assert false_positives < 300
+
+
+def test_filter_sees_appended_certificates(app, append_certificates):
+    append_certificates(3)
+    with app.app_context():
+        assert certificate_filter.might_contain_id('cert-2')
+        assert certificate_filter.might_contain_key(CertificateVerification.hash_text('cert-code-2'))
+        assert not certificate_filter.might_contain_id('missing-cert')
+        assert certificate_filter.get_stats()['definite_misses'] == 1
+
+
+def test_refresh_picks_up_ids_committed_out_of_order(app, monkeypatch):
+    monkeypatch.setattr(certificate_filter, 'refresh_interval', 0)
+    with app.app_context():
+        insert_certificate(1, 'first')
+        insert_certificate(3, 'third')
+        assert certificate_filter.might_contain_id('third')
+
+        # Id 2 was assigned before id 3 but its transaction commits afterwards
+        insert_certificate(2, 'second')
+        assert certificate_filter.might_contain_id('second')
+        assert certificate_filter._gaps == {}
+
+
+def test_skipped_ids_are_dropped_after_the_gap_timeout(app, monkeypatch):
+    monkeypatch.setattr(certificate_filter, 'refresh_interval', 0)
+    monkeypatch.setattr(certificate_filter, 'gap_timeout', 0)
+    with app.app_context():
+        insert_certificate(5, 'fifth')
+        certificate_filter.refresh()
+        certificate_filter.refresh()
+        assert certificate_filter._gaps == {}
+        assert certificate_filter._last_id == 5
+
+
+def test_refresh_queries_without_holding_the_lock(app, monkeypatch):
+    monkeypatch.setattr(certificate_filter, 'refresh_interval', 0)
+    held = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        if 'certificate_verification' in statement:
+            held.append(certificate_filter._lock.locked())
+
+    with app.app_context():
+        insert_certificate(1, 'first')
+        event.listen(db.engine, 'before_cursor_execute', record)
+        try:
+            certificate_filter.refresh()
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', record)
+    assert held and not any(held)
+
+
+def test_a_miss_catches_up_before_it_is_trusted(app, monkeypatch):
+    monkeypatch.setattr(certificate_filter, 'refresh_interval', 3600)
+    with app.app_context():
+        certificate_filter.refresh(force=True)
+        # Committed by another process well inside the refresh interval
+        insert_certificate(1, 'elsewhere')
+        assert certificate_filter.might_contain_id('elsewhere')
+        assert not certificate_filter.might_contain_id('missing-cert')
+
+        # While another catch-up runs, a miss is left to the database
+        certificate_filter._refreshing = True
+        try:
+            assert certificate_filter.might_contain_id('missing-cert')
+        finally:
+            certificate_filter._refreshing = False
@@ -0,0 +1,47 @@
+from app.models import CertificateVerification
+
+
+def test_codes_and_ids_are_resolved_in_order(client, app, append_certificates):
+    append_certificates(3)
+    response = client.post('/api/verify_certificates', json={
+        'verification_codes': ['cert-code-1', ' cert-code-2 ', 'nope'],
+        'certificate_ids': ['cert-0', 'missing']
+    })
+    data = response.get_json()
+    assert response.status_code == 200
+    assert [(result['input'], result['verified']) for result in data['results']] == [
+        ('cert-code-1', True), ('cert-code-2', True), ('nope', False), ('cert-0', True), ('missing', False)
+    ]
+    assert (data['verified'], data['not_found'], data['invalid']) == (3, 2, 0)
+    assert all(result['chain_valid'] for result in data['results'] if result['verified'])
+    with app.app_context():
+        assert CertificateVerification.query.filter_by(is_verified=True).count() == 3
+
+
+def test_non_string_entries_are_invalid_items(client, append_certificates):
+    append_certificates(1)
+    response = client.post('/api/verify_certificates', json={
+        'verification_codes': [None, 12, 'cert-code-0'],
+        'certificate_ids': [{'id': 'cert-0'}, 'None']
+    })
+    data = response.get_json()
+    assert response.status_code == 200
+    assert [result.get('invalid', False) for result in data['results']] == [True, True, False, True, False]
+    assert data['results'][0]['input'] is None
+    assert data['results'][2]['verified'] is True
+    assert data['results'][4]['verified'] is False
+    assert (data['verified'], data['not_found'], data['invalid']) == (1, 1, 3)
+
+
+def test_non_object_body_is_rejected(client):
+    response = client.post('/api/verify_certificates', json=['cert-code-0'])
+    assert response.status_code == 400
+    assert response.get_json()['error'] == 'Request body must be a JSON object'
+
+
+def test_bad_requests(client):
+    assert client.post('/api/verify_certificates', json={}).status_code == 400
+    assert client.post('/api/verify_certificates', json={'verification_codes': 'abc'}).status_code == 400
+    assert client.post('/api/verify_certificates', data='not json', content_type='application/json').status_code == 400
+    too_many = {'certificate_ids': ['x'] * 5001}
+    assert client.post('/api/verify_certificates', json=too_many).status_code == 413
@@ -0,0 +1,51 @@
+import json
+
+
+def post_stream(client, lines):
+    response = client.post('/sync_certificates/stream', data=''.join(line + '\n' for line in lines),
+                           content_type='application/x-ndjson')
+    assert response.status_code == 200
+    assert response.mimetype == 'application/x-ndjson'
+    return [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+
+
+def test_stream_commits_in_batches_and_ends_with_a_summary(client, monkeypatch, desktop_certificate):
+    monkeypatch.setattr('app.certificate_upload_routes.STREAM_BATCH_SIZE', 2)
+    lines = [json.dumps(desktop_certificate(f'desk-{i}')) for i in range(5)]
+    *batches, summary = post_stream(client, lines)
+
+    assert [batch['batch'] for batch in batches] == [1, 2, 3]
+    assert [batch['received'] for batch in batches] == [2, 4, 5]
+    assert [result['line'] for batch in batches for result in batch['results']] == [1, 2, 3, 4, 5]
+    assert summary == {'message': 'Sync completed', 'done': True, 'total': 5, 'uploaded': 5, 'duplicates': 0, 'failed': 0}
+
+
+def test_stream_reports_bad_lines_without_failing_the_batch(client, monkeypatch, desktop_certificate):
+    monkeypatch.setattr('app.certificate_upload_routes.MAX_STREAM_LINE_BYTES', 1024)
+    lines = [
+        json.dumps(desktop_certificate('desk-1')),
+        '{not json',
+        '',
+        json.dumps(desktop_certificate('desk-2', signature='x' * 2000)),
+        json.dumps(desktop_certificate('desk-3', signature=456)),
+        json.dumps(desktop_certificate('desk-1')),
+    ]
+    batch, summary = post_stream(client, lines)
+
+    results = {result['line']: result for result in batch['results']}
+    assert results[1]['status'] == 'uploaded'
+    assert results[2] == {'line': 2, 'certificate_id': None, 'status': 'invalid', 'error': 'Invalid JSON'}
+    assert results[4]['error'] == 'Line exceeds 1024 bytes'
+    assert results[5]['status'] == 'invalid'
+    assert results[6]['status'] == 'duplicate'
+    assert 3 not in results
+    assert (summary['total'], summary['uploaded'], summary['duplicates'], summary['failed']) == (5, 1, 1, 3)
+
+
+def test_stream_stops_when_a_batch_fails(client, monkeypatch, desktop_certificate):
+    def fail(certificates, station_id=None):
+        raise RuntimeError('database unavailable')
+
+    monkeypatch.setattr('app.certificate_upload_routes.ingest_certificates', fail)
+    lines = post_stream(client, [json.dumps(desktop_certificate('desk-1'))])
+    assert lines == [{'batch': 1, 'error': 'database unavailable', 'received': 1}]
@@ -0,0 +1,61 @@
+def test_upload_is_idempotent(client, desktop_certificate):
+    certificate = desktop_certificate('desk-1')
+    response = client.post('/upload_certificate', json=certificate)
+    assert response.status_code == 201
+    chain_index = response.get_json()['chain_index']
+
+    response = client.post('/upload_certificate', json=certificate)
+    assert response.status_code == 200
+    assert response.get_json()['message'] == 'Certificate already uploaded'
+    assert response.get_json()['chain_index'] == chain_index
+
+    response = client.post('/upload_certificate', json=desktop_certificate('desk-1', signature='other'))
+    assert response.status_code == 409
+
+
+def test_upload_rejects_invalid_certificates(client, desktop_certificate):
+    certificate = desktop_certificate('desk-1')
+    del certificate['wipe_method']
+    assert client.post('/upload_certificate', json=certificate).status_code == 400
+    assert client.post('/upload_certificate', json=desktop_certificate('desk-2', certificate_hash='0' * 64)).status_code == 400
+
+    response = client.post('/upload_certificate', json=desktop_certificate('desk-3', signature=456))
+    assert response.status_code == 400
+    assert response.get_json()['error'] == 'signature must be a non-empty string'
+
+
+def test_sync_reports_each_certificate(client, desktop_certificate):
+    client.post('/upload_certificate', json=desktop_certificate('held'))
+    client.post('/upload_certificate', json=desktop_certificate('taken'))
+
+    certificates = [
+        desktop_certificate('new-1'),
+        desktop_certificate('new-1'),
+        desktop_certificate('held'),
+        desktop_certificate('taken', signature='different'),
+        desktop_certificate('bad-hash', certificate_hash='0' * 64),
+        desktop_certificate('int-signature', signature=456),
+        desktop_certificate('dict-signature', signature={'value': 'x'}),
+        desktop_certificate('int-hash', certificate_hash=123),
+        desktop_certificate('x' * 101),
+        'not an object',
+    ]
+    response = client.post('/sync_certificates', json={'certificates': certificates})
+    assert response.status_code == 200
+    body = response.get_json()
+    assert [result['status'] for result in body['results']] == [
+        'uploaded', 'duplicate', 'duplicate', 'conflict',
+        'invalid', 'invalid', 'invalid', 'invalid', 'invalid', 'invalid',
+    ]
+    assert 'chain_index' in body['results'][2]
+    assert (body['uploaded'], body['duplicates'], body['failed'], body['total']) == (1, 2, 7, 10)
+
+
+def test_sync_rejects_malformed_requests(client, monkeypatch, desktop_certificate):
+    assert client.post('/sync_certificates', json={'certificates': 'nope'}).status_code == 400
+    assert client.post('/sync_certificates', json=[desktop_certificate('desk-0')]).status_code == 400
+    assert client.post('/sync_certificates', json='certificates').status_code == 400
+
+    monkeypatch.setattr('app.certificate_upload_routes.MAX_SYNC_CERTIFICATES', 2)
+    certificates = [desktop_certificate(f'desk-{i}') for i in range(3)]
+    assert client.post('/sync_certificates', json={'certificates': certificates}).status_code == 413
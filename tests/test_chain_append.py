@@ -0,0 +1,77 @@
+import threading
+
+import pytest
+from sqlalchemy.exc import IntegrityError
+
+from app.chain_append import chain_append_service
+from app.chain_validator import validate_chain
+from app.models import CertificateVerification
+
+
+def fields(certificate_id):
+    return {
+        'certificate_id': certificate_id,
+        'verification_key': CertificateVerification.hash_text(f'code-{certificate_id}'),
+        'random_text': f'code-{certificate_id}'
+    }
+
+
+def test_append_links_onto_the_head(app):
+    first = chain_append_service.append(fields('a'))
+    second = chain_append_service.append(fields('b'))
+    assert first['chain_index'] == 0
+    assert first['previous_hash'] is None
+    assert second['chain_index'] == 1
+    assert second['previous_hash'] == first['certificate_hash']
+
+
+def test_concurrent_appends_do_not_fork(app):
+    errors = []
+
+    def worker(thread):
+        try:
+            for i in range(10):
+                chain_append_service.append(fields(f't{thread}-{i}'))
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=worker, args=(thread,)) for thread in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    with app.app_context():
+        result = validate_chain(recompute_hashes=True)
+    assert result['chain_valid'] is True
+    assert result['blocks_checked'] == 80
+
+
+def test_append_many_links_the_group_in_order(app):
+    blocks = chain_append_service.append_many([fields(f'g{i}') for i in range(5)])
+    assert [block['chain_index'] for block in blocks] == [0, 1, 2, 3, 4]
+    assert all(block['previous_hash'] == previous['certificate_hash'] for previous, block in zip(blocks, blocks[1:]))
+
+
+def test_a_group_with_a_duplicate_is_rejected_whole(app):
+    chain_append_service.append(fields('taken'))
+    with pytest.raises(IntegrityError):
+        chain_append_service.append_many([fields('new-1'), fields('taken'), fields('new-2')])
+    with app.app_context():
+        assert CertificateVerification.query.count() == 1
+        assert validate_chain()['chain_valid'] is True
+
+
+def test_one_bad_submission_does_not_fail_the_others(app):
+    chain_append_service.append(fields('taken'))
+    futures = [chain_append_service.submit(fields(certificate_id)) for certificate_id in ('x', 'taken', 'y', 'z')]
+    with pytest.raises(IntegrityError):
+        futures[1].result(timeout=30)
+    assert sorted(future.result(timeout=30)['certificate_id'] for future in (futures[0], futures[2], futures[3])) == ['x', 'y', 'z']
+    with app.app_context():
+        assert validate_chain()['chain_valid'] is True
+
+
+def test_append_many_of_nothing(app):
+    assert chain_append_service.append_many([]) == []
@@ -0,0 +1,99 @@
+import time
+
+import pytest
+
+from app import chain_audit
+from app.chain_audit import audit_chain
+from app.models import CertificateVerification, ChainRehashBoundary, db
+
+
+def test_inline_audit_of_a_valid_chain(app, append_certificates):
+    append_certificates(12)
+    checked = []
+    with app.app_context():
+        result = audit_chain(workers=1, chunk_size=5, progress=checked.append)
+    assert result['chain_valid'] is True
+    assert result['blocks_checked'] == 12
+    assert checked == [5, 10]
+
+
+def test_audit_finds_the_first_rehash_divergence(app, append_certificates):
+    append_certificates(12)
+    with app.app_context():
+        CertificateVerification.query.filter_by(chain_index=7).update({'random_text': 'forged'})
+        db.session.commit()
+        result = audit_chain(workers=1, chunk_size=5)
+    assert result['chain_valid'] is False
+    assert result['first_divergence'] == {
+        'chain_index': 7,
+        'reason': 'certificate_hash does not match the recomputed hash'
+    }
+
+
+def test_audit_from_a_start_index(app, append_certificates):
+    append_certificates(6)
+    with app.app_context():
+        result = audit_chain(workers=1, start_index=4)
+        assert result['chain_valid'] is True
+        assert result['blocks_checked'] == 2
+        with pytest.raises(ValueError):
+            audit_chain(workers=1, start_index=10)
+
+
+def test_worker_pool_uses_spawned_processes(app, append_certificates, monkeypatch):
+    append_certificates(12)
+    contexts = []
+    executor = chain_audit.ProcessPoolExecutor
+
+    def spawn_only(*args, **kwargs):
+        contexts.append(kwargs.get('mp_context'))
+        return executor(*args, **kwargs)
+
+    monkeypatch.setattr(chain_audit, 'ProcessPoolExecutor', spawn_only)
+    with app.app_context():
+        result = audit_chain(workers=2, chunk_size=4)
+    assert result['chain_valid'] is True
+    assert result['blocks_checked'] == 12
+    assert [context.get_start_method() for context in contexts] == ['spawn']
+
+
+def test_audit_job_api(client, append_certificates):
+    append_certificates(5)
+    response = client.post('/api/chain/audit', json={'workers': 1, 'chunk_size': 2})
+    assert response.status_code == 202
+    job_id = response.get_json()['job_id']
+
+    deadline = time.monotonic() + 10
+    while time.monotonic() < deadline:
+        job = client.get(f'/api/chain/audit/{job_id}').get_json()
+        if job['status'] != 'running':
+            break
+        time.sleep(0.05)
+    assert job['status'] == 'completed'
+    assert job['result']['chain_valid'] is True
+    assert client.get('/api/chain/audit/unknown').status_code == 404
+    assert client.post('/api/chain/audit', json={'chunk_size': 'big'}).status_code == 400
+
+
+def test_blocks_before_the_rehash_boundary_are_link_checked_only(app, append_certificates):
+    append_certificates(6)
+    with app.app_context():
+        # As on a database whose first three blocks predate the append service
+        db.session.get(ChainRehashBoundary, 1).rehash_from_index = 3
+        CertificateVerification.query.filter_by(chain_index=1).update({'random_text': 'legacy'})
+        db.session.commit()
+        result = audit_chain(workers=1, chunk_size=2)
+        assert result['chain_valid'] is True
+        assert result['blocks_checked'] == 6
+        assert result['link_checked_only'] == 3
+        assert result['rehash_from_index'] == 3
+
+        CertificateVerification.query.filter_by(chain_index=4).update({'random_text': 'forged'})
+        db.session.commit()
+        assert audit_chain(workers=1)['first_divergence']['chain_index'] == 4
+
+
+def test_audit_workers_are_capped_at_the_cpu_count(client, monkeypatch):
+    monkeypatch.setattr('app.blockchain_routes.os.cpu_count', lambda: 2)
+    job_id = client.post('/api/chain/audit', json={'workers': 64}).get_json()['job_id']
+    assert client.get(f'/api/chain/audit/{job_id}').get_json()['options']['workers'] == 2
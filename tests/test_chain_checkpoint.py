@@ -0,0 +1,72 @@
+from sqlalchemy import event
+
+from app.chain_validator import verify_chain_incremental
+from app.models import CertificateVerification, ChainCheckpoint, db
+
+
+def test_first_check_audits_from_genesis_and_records_checkpoint(app, append_certificates):
+    blocks = append_certificates(4)
+    with app.app_context():
+        result = verify_chain_incremental()
+        checkpoint = db.session.get(ChainCheckpoint, 1)
+        assert result['chain_valid'] is True
+        assert result['full_audit'] is True
+        assert checkpoint.verified_index == 3
+        assert checkpoint.head_hash == blocks[-1]['certificate_hash']
+        assert checkpoint.full_audit_at is not None
+
+
+def test_later_checks_only_cover_new_blocks(app, append_certificates):
+    append_certificates(4)
+    with app.app_context():
+        verify_chain_incremental()
+    append_certificates(2, prefix='more')
+    with app.app_context():
+        result = verify_chain_incremental()
+    assert result['full_audit'] is False
+    assert result['checked_from'] == 4
+    assert result['blocks_checked'] == 2
+
+
+def test_unchanged_chain_does_not_commit(app, append_certificates):
+    append_certificates(3)
+    with app.app_context():
+        verify_chain_incremental()
+        commits = []
+
+        def on_commit(session):
+            commits.append(session)
+
+        event.listen(db.session, 'after_commit', on_commit)
+        try:
+            result = verify_chain_incremental()
+        finally:
+            event.remove(db.session, 'after_commit', on_commit)
+    assert result['chain_valid'] is True
+    assert result['blocks_checked'] == 0
+    assert commits == []
+
+
+def test_concurrent_first_checkpoint_is_reread(app, append_certificates, monkeypatch):
+    append_certificates(3)
+    with app.app_context():
+        verify_chain_incremental()
+    append_certificates(2, prefix='more')
+    # Simulate losing the race: no checkpoint was seen, but one exists by the time it is written
+    monkeypatch.setattr(ChainCheckpoint, 'get_checkpoint', staticmethod(lambda: None))
+    with app.app_context():
+        result = verify_chain_incremental()
+        checkpoint = db.session.get(ChainCheckpoint, 1)
+        assert result['chain_valid'] is True
+        assert checkpoint.verified_index == 4
+
+
+def test_tampered_checkpoint_block_is_reported(app, append_certificates):
+    append_certificates(3)
+    with app.app_context():
+        verify_chain_incremental()
+        CertificateVerification.query.filter_by(chain_index=2).update({'certificate_hash': 'f' * 64})
+        db.session.commit()
+        result = verify_chain_incremental()
+    assert result['chain_valid'] is False
+    assert result['first_invalid_index'] == 2
@@ -0,0 +1,54 @@
+from datetime import datetime
+
+from app.chain_append import ChainHead, chain_append_service
+from app.chain_validator import validate_chain
+from app.models import CertificateVerification, db
+
+
+def fields(certificate_id):
+    return {
+        'certificate_id': certificate_id,
+        'verification_key': CertificateVerification.hash_text(certificate_id),
+        'random_text': certificate_id
+    }
+
+
+def test_empty_chain_head(app):
+    with app.app_context():
+        assert ChainHead().get() == ChainHead.EMPTY
+
+
+def test_appends_use_the_cached_head(app):
+    chain_append_service.append(fields('a'))
+    reloads = chain_append_service.head.stats['reloads']
+    block = chain_append_service.append(fields('b'))
+    assert chain_append_service.head.stats['reloads'] == reloads
+    assert chain_append_service.head.get() == (block['chain_index'], block['certificate_hash'])
+
+
+def test_head_moved_by_another_process_is_reloaded(app):
+    first = chain_append_service.append(fields('a'))
+    with app.app_context():
+        # A block written by another process, behind this process's cache
+        created_at = datetime.utcnow().replace(microsecond=0)
+        certificate_hash = CertificateVerification.calculate_certificate_hash({
+            'certificate_id': 'outside',
+            'random_text': 'outside',
+            'created_at': created_at.isoformat()
+        }, first['certificate_hash'])
+        db.session.add(CertificateVerification(
+            certificate_id='outside',
+            verification_key=CertificateVerification.hash_text('outside'),
+            random_text='outside',
+            created_at=created_at,
+            previous_hash=first['certificate_hash'],
+            certificate_hash=certificate_hash,
+            chain_index=1
+        ))
+        db.session.commit()
+
+    block = chain_append_service.append(fields('c'))
+    assert block['chain_index'] == 2
+    assert block['previous_hash'] == certificate_hash
+    with app.app_context():
+        assert validate_chain(recompute_hashes=True)['chain_valid'] is True
@@ -0,0 +1,67 @@
+from app.chain_snapshot import HEADER, RECORD, export_snapshot, verify_snapshot
+
+
+def test_exported_snapshot_verifies(app, append_certificates, tmp_path):
+    blocks = append_certificates(5)
+    path = tmp_path / 'chain.snapshot'
+    with app.app_context():
+        snapshot = export_snapshot(str(path), key=b'secret')
+    assert snapshot['records'] == 5
+    assert snapshot['size_bytes'] == path.stat().st_size
+
+    result = verify_snapshot(str(path), key=b'secret')
+    assert result['valid'] is True
+    assert result['records'] == 5
+    assert result['head_hash'] == blocks[-1]['certificate_hash']
+
+
+def test_wrong_key_is_rejected(app, append_certificates, tmp_path):
+    append_certificates(3)
+    path = tmp_path / 'chain.snapshot'
+    with app.app_context():
+        export_snapshot(str(path), key=b'secret')
+    result = verify_snapshot(str(path), key=b'other')
+    assert result['valid'] is False
+    assert result['reason'] == 'snapshot signature is invalid'
+
+
+def test_modified_record_is_rejected(app, append_certificates, tmp_path):
+    append_certificates(3)
+    path = tmp_path / 'chain.snapshot'
+    with app.app_context():
+        export_snapshot(str(path))
+    data = bytearray(path.read_bytes())
+    data[HEADER.size + RECORD.size + 20] ^= 0xFF
+    path.write_bytes(bytes(data))
+    result = verify_snapshot(str(path))
+    assert result['valid'] is False
+    assert result['reason'] == 'snapshot digest does not match its contents'
+
+
+def test_truncated_snapshot_is_rejected(app, append_certificates, tmp_path):
+    append_certificates(3)
+    path = tmp_path / 'chain.snapshot'
+    with app.app_context():
+        export_snapshot(str(path))
+    path.write_bytes(path.read_bytes()[:-RECORD.size])
+    assert verify_snapshot(str(path))['valid'] is False
+
+
+def test_snapshot_from_a_start_index(app, append_certificates, tmp_path):
+    append_certificates(5)
+    path = tmp_path / 'chain.snapshot'
+    with app.app_context():
+        export_snapshot(str(path), start_index=3)
+    result = verify_snapshot(str(path))
+    assert result['valid'] is True
+    assert (result['start_index'], result['records']) == (3, 2)
+
+
+def test_snapshot_download(client, append_certificates, tmp_path):
+    append_certificates(4)
+    response = client.get('/api/chain/snapshot?start_index=1')
+    assert response.status_code == 200
+    assert 'chain_1_4.chain' in response.headers['Content-Disposition']
+    path = tmp_path / 'download.chain'
+    path.write_bytes(response.data)
+    assert verify_snapshot(str(path))['records'] == 3
@@ -0,0 +1,95 @@
+from app.chain_validator import record_rehash_boundary, rehash_from_index, validate_chain
+from app.chain_append import chain_append_service
+from app.models import CertificateVerification, ChainRehashBoundary, db
+
+
+def tamper(chain_index, **values):
+    CertificateVerification.query.filter_by(chain_index=chain_index).update(values)
+    db.session.commit()
+
+
+def test_empty_chain_is_valid(app):
+    with app.app_context():
+        result = validate_chain()
+    assert result['chain_valid'] is True
+    assert result['blocks_checked'] == 0
+    assert result['head_index'] == -1
+
+
+def test_valid_chain_is_checked_in_one_pass(app, append_certificates):
+    blocks = append_certificates(5)
+    with app.app_context():
+        result = validate_chain(recompute_hashes=True)
+    assert result['chain_valid'] is True
+    assert result['blocks_checked'] == 5
+    assert result['head_index'] == 4
+    assert result['head_hash'] == blocks[-1]['certificate_hash']
+
+
+def test_broken_link_reports_first_invalid_block(app, append_certificates):
+    append_certificates(5)
+    with app.app_context():
+        tamper(3, previous_hash='0' * 64)
+        result = validate_chain()
+    assert result['chain_valid'] is False
+    assert result['first_invalid_index'] == 3
+    assert result['head_index'] == 2
+    assert 'previous_hash' in result['reason']
+
+
+def test_gap_in_chain_indexes(app, append_certificates):
+    append_certificates(4)
+    with app.app_context():
+        CertificateVerification.query.filter_by(chain_index=2).delete()
+        db.session.commit()
+        result = validate_chain()
+    assert result['chain_valid'] is False
+    assert result['first_invalid_index'] == 3
+    assert 'expected chain index 2' in result['reason']
+
+
+def test_recompute_hashes_catches_altered_fields(app, append_certificates):
+    append_certificates(4)
+    with app.app_context():
+        tamper(1, random_text='forged')
+        assert validate_chain()['chain_valid'] is True
+        result = validate_chain(recompute_hashes=True)
+    assert result['chain_valid'] is False
+    assert result['first_invalid_index'] == 1
+
+
+def test_blockchain_api_reports_validity(client, app, append_certificates):
+    append_certificates(3)
+    data = client.get('/api/blockchain').get_json()
+    assert data['chain_valid'] is True
+    assert data['total_certificates'] == 3
+    assert data['first_invalid_index'] is None
+
+
+def test_recompute_skips_blocks_before_the_rehash_boundary(app, client, append_certificates):
+    append_certificates(4)
+    with app.app_context():
+        tamper(0, random_text='legacy')
+        app.config['CHAIN_REHASH_FROM_INDEX'] = 2
+        result = validate_chain(recompute_hashes=True)
+    assert result['chain_valid'] is True
+    assert result['link_checked_only'] == 2
+
+    integrity = client.get('/api/chain/integrity?full=1&recompute=1').get_json()
+    assert integrity['chain_valid'] is True
+    assert integrity['rehash_from_index'] == 2
+
+
+def test_rehash_boundary_is_recorded_on_first_startup(app, append_certificates):
+    append_certificates(3)
+    with app.app_context():
+        assert rehash_from_index() == 0
+        record_rehash_boundary(3)
+        assert rehash_from_index() == 0
+
+        # A database that already holds blocks when the service first starts
+        db.session.delete(db.session.get(ChainRehashBoundary, 1))
+        db.session.commit()
+    chain_append_service.init_app(app)
+    with app.app_context():
+        assert rehash_from_index() == 3
@@ -0,0 +1,76 @@
+import gzip
+import json
+
+import pytest
+
+from app import content_encoding
+
+
+def post_gzip(client, path, body, content_type='application/json'):
+    return client.post(path, data=gzip.compress(body), content_type=content_type,
+                       headers={'Content-Encoding': 'gzip'})
+
+
+def test_gzip_body_is_decoded_and_reported(client, desktop_certificate):
+    body = json.dumps({'certificates': [desktop_certificate('desk-1')]}).encode()
+    response = post_gzip(client, '/sync_certificates', body)
+    assert response.status_code == 200
+    assert response.get_json()['uploaded'] == 1
+    assert response.headers['X-Content-Encoding'] == 'gzip'
+    assert response.headers['X-Decoded-Bytes'] == str(len(body))
+
+
+def test_unsupported_or_malformed_bodies_are_rejected(client):
+    response = client.post('/sync_certificates', data=b'{}', content_type='application/json',
+                           headers={'Content-Encoding': 'br'})
+    assert response.status_code == 415
+
+    response = client.post('/sync_certificates', data=b'not gzip', content_type='application/json',
+                           headers={'Content-Encoding': 'gzip'})
+    assert response.status_code == 400
+
+
+@pytest.mark.skipif(content_encoding.zstandard is not None, reason='zstandard is installed')
+def test_zstd_needs_the_optional_package(client):
+    response = client.post('/sync_certificates', data=b'{}', content_type='application/json',
+                           headers={'Content-Encoding': 'zstd'})
+    assert response.status_code == 415
+
+
+def test_zstd_body_is_decoded_and_malformed_frames_are_rejected(client, desktop_certificate):
+    zstandard = pytest.importorskip('zstandard')
+    body = json.dumps({'certificates': [desktop_certificate('desk-1')]}).encode()
+    response = client.post('/sync_certificates', data=zstandard.ZstdCompressor().compress(body),
+                           content_type='application/json', headers={'Content-Encoding': 'zstd'})
+    assert response.status_code == 200
+    assert response.get_json()['uploaded'] == 1
+    assert response.headers['X-Content-Encoding'] == 'zstd'
+    assert response.headers['X-Decoded-Bytes'] == str(len(body))
+
+    response = client.post('/sync_certificates', data=b'not zstd', content_type='application/json',
+                           headers={'Content-Encoding': 'zstd'})
+    assert response.status_code == 400
+    assert 'Malformed zstd body' in response.get_json()['error']
+
+
+def test_buffered_body_past_the_decoded_cap_is_rejected(app, client, desktop_certificate):
+    app.config['MAX_DECODED_BODY_BYTES'] = 1024
+    body = json.dumps({'certificates': [desktop_certificate(f'desk-{i}') for i in range(20)]}).encode()
+    response = post_gzip(client, '/sync_certificates', body)
+    assert response.status_code == 413
+
+
+def test_stream_is_not_held_to_the_decoded_cap(app, client, desktop_certificate):
+    app.config['MAX_DECODED_BODY_BYTES'] = 1024
+    body = ''.join(json.dumps(desktop_certificate(f'desk-{i}')) + '\n' for i in range(20)).encode()
+    assert len(body) > 1024
+    response = post_gzip(client, '/sync_certificates/stream', body, 'application/x-ndjson')
+    summary = json.loads(response.get_data(as_text=True).splitlines()[-1])
+    assert summary['done'] and summary['uploaded'] == 20
+    assert summary['decoding']['decoded_bytes'] == len(body)
+
+
+def test_stream_stops_past_the_compression_ratio(client):
+    response = post_gzip(client, '/sync_certificates/stream', b'\n' * (4 * 1024 * 1024), 'application/x-ndjson')
+    lines = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    assert lines == [{'error': 'Body expands more than 100x when decoded', 'received': 0}]
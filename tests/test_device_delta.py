@@ -0,0 +1,78 @@
+from datetime import datetime, timedelta
+
+from app.devices_routes import Device
+from app.models import db
+
+
+def test_unchanged_listing_answers_304(client, create_devices):
+    create_devices(2)
+    response = client.get('/api/devices?limit=1')
+    etag = response.headers['ETag']
+    assert etag.startswith('W/')
+
+    assert client.get('/api/devices?limit=1', headers={'If-None-Match': etag}).status_code == 304
+    # Each query string has its own tag
+    assert client.get('/api/devices?limit=2', headers={'If-None-Match': etag}).status_code == 200
+
+    pk = response.get_json()['devices'][0]['id']
+    client.patch(f'/api/devices/{pk}/status', json={'status': 'wiped'})
+    assert client.get('/api/devices?limit=1', headers={'If-None-Match': etag}).status_code == 200
+
+
+def test_edits_within_one_second_change_the_etag(app, client, create_devices):
+    create_devices(2)
+    etag = client.get('/api/devices').headers['ETag']
+    with app.app_context():
+        latest = db.session.query(db.func.max(Device.updated_at)).scalar()
+    pk = client.get('/api/devices').get_json()['devices'][0]['id']
+    client.put(f'/api/devices/{pk}', json={'model': 'Renamed'})
+    with app.app_context():
+        # As a whole-second DATETIME column would store it
+        db.session.execute(Device.__table__.update().values(updated_at=latest))
+        db.session.commit()
+    assert client.get('/api/devices', headers={'If-None-Match': etag}).status_code == 200
+
+
+def test_delta_returns_changes_and_tombstones_since_a_watermark(client, create_devices):
+    create_devices(3)
+    devices = client.get('/api/devices').get_json()['devices']
+    since = min(device['updated_at'] for device in devices)
+    full = client.get('/api/devices', query_string={'since': since}).get_json()
+    assert [device['device_id'] for device in full['devices']] == ['dev-0', 'dev-1', 'dev-2']
+    assert full['deleted'] == [] and full['next_cursor'] is None
+
+    changed, deleted = sorted(device['id'] for device in devices)[1:]
+    client.put(f'/api/devices/{changed}', json={'model': 'Renamed'})
+    client.delete(f'/api/devices/{deleted}')
+
+    delta = client.get('/api/devices', query_string={'since': full['next_since']}).get_json()
+    assert [device['model'] for device in delta['devices']] == ['Renamed']
+    assert [tombstone['device_id'] for tombstone in delta['deleted']] == ['dev-2']
+    assert delta['next_since'] >= full['next_since']
+
+
+def test_delta_pages_follow_the_cursor(client, create_devices):
+    create_devices(5)
+    since = (datetime.utcnow() - timedelta(hours=1)).isoformat()
+    seen = []
+    cursor = None
+    while True:
+        params = {'since': since, 'limit': 2, **({'cursor': cursor} if cursor else {})}
+        body = client.get('/api/devices', query_string=params).get_json()
+        seen.extend(device['device_id'] for device in body['devices'])
+        cursor = body['next_cursor']
+        if cursor is None:
+            break
+        assert body['next_since'] is None
+    assert seen == [f'dev-{i}' for i in range(5)]
+    assert body['next_since'] is not None
+
+
+def test_invalid_delta_requests(client):
+    old = (datetime.utcnow() - timedelta(days=31)).isoformat()
+    assert client.get('/api/devices', query_string={'since': old}).status_code == 410
+    assert client.get('/api/devices', query_string={'since': 'yesterday'}).status_code == 400
+    aware = (datetime.utcnow() - timedelta(hours=1)).isoformat() + 'Z'
+    assert client.get('/api/devices', query_string={'since': aware}).status_code == 200
+    now = datetime.utcnow().isoformat()
+    assert client.get('/api/devices', query_string={'since': now, 'type': 'HDD'}).status_code == 400
@@ -0,0 +1,49 @@
+import gzip
+
+from app.statistics import get_counters
+
+
+def device(i, **fields):
+    return {'device_id': f'imp-{i}', 'device_type': 'HDD', 'model': 'Model', 'serial_number': f'IMP-{i}', **fields}
+
+
+def test_json_import_reports_every_row(client, create_devices):
+    create_devices(1)
+    rows = [
+        device(1),
+        device(1, serial_number='IMP-other'),
+        {'device_id': 'dev-x', 'device_type': 'HDD', 'model': 'Model', 'serial_number': 'SN-0'},
+        {'device_id': 'no-serial'},
+        'not an object',
+        device(2, device_type='SSD'),
+    ]
+    body = client.post('/api/devices/import', json={'devices': rows}).get_json()
+    assert body['success']
+    assert [entry['status'] for entry in body['report']] == ['created', 'duplicate', 'conflict', 'invalid', 'invalid', 'created']
+    assert [entry['row'] for entry in body['report']] == [1, 2, 3, 4, 5, 6]
+    assert (body['created'], body['duplicates'], body['conflicts'], body['invalid']) == (2, 1, 1, 2)
+
+
+def test_csv_import_in_chunks_updates_counters_and_search(app, client, monkeypatch):
+    monkeypatch.setattr('app.devices_routes.IMPORT_CHUNK_SIZE', 2)
+    csv = 'device_id,device_type,model,serial_number,manufacturer,supported_methods,is_wipeable\n' + ''.join(
+        f'imp-{i},SSD,Model {i},IMP-{i},Zentrix,Zero Fill;DoD Wipe,no\n' for i in range(5)
+    )
+    response = client.post('/api/devices/import', data=gzip.compress(csv.encode()),
+                           content_type='text/csv', headers={'Content-Encoding': 'gzip'})
+    body = response.get_json()
+    assert body['created'] == 5
+
+    listed = client.get('/api/devices?fields=device_id,supported_methods,is_wipeable&limit=1').get_json()
+    assert listed['devices'][0]['supported_methods'] == ['Zero Fill', 'DoD Wipe']
+    assert listed['devices'][0]['is_wipeable'] is False
+    with app.app_context():
+        assert get_counters('device_type') == {'SSD': 5}
+    assert client.get('/api/devices/search?q=zentrix').get_json()['count'] == 5
+
+
+def test_malformed_import_body_is_rejected(client):
+    response = client.post('/api/devices/import', data='{"devices": 5}', content_type='application/json')
+    assert response.status_code == 400
+    response = client.post('/api/devices/import', data='[', content_type='application/json')
+    assert response.status_code == 400
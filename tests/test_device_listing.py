@@ -0,0 +1,34 @@
+def test_pages_cover_every_device_once_newest_first(client, create_devices):
+    create_devices(7)
+    seen = []
+    cursor = None
+    while True:
+        body = client.get('/api/devices', query_string={'limit': 3, **({'cursor': cursor} if cursor else {})}).get_json()
+        assert body['success'] and body['total'] == 7
+        seen.extend(device['device_id'] for device in body['devices'])
+        cursor = body['next_cursor']
+        if cursor is None:
+            break
+    assert seen == [f'dev-{i}' for i in reversed(range(7))]
+
+
+def test_fields_projects_columns_and_keeps_the_cursor_columns(client, create_devices):
+    create_devices(2)
+    body = client.get('/api/devices?fields=serial_number,to_dict,metadata').get_json()
+    assert [sorted(device) for device in body['devices']] == [['created_at', 'id', 'serial_number']] * 2
+
+
+def test_filters_use_counter_totals(client, create_devices):
+    create_devices(5)
+    body = client.get('/api/devices?type=SSD').get_json()
+    assert {device['device_type'] for device in body['devices']} == {'SSD'}
+    assert body['count'] == body['total'] == 2
+
+    body = client.get('/api/devices?manufacturer=acm').get_json()
+    assert body['count'] == 5 and body['total'] is None
+
+
+def test_invalid_cursor_is_rejected(client):
+    response = client.get('/api/devices?cursor=not-a-cursor')
+    assert response.status_code == 400
+    assert response.get_json()['error'] == 'Invalid cursor'
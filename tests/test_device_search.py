@@ -0,0 +1,51 @@
+def create_device(client, device_id, **fields):
+    response = client.post('/api/devices', json={
+        'device_id': device_id, 'device_type': 'HDD', 'model': 'Model', 'serial_number': f'SN-{device_id}', **fields
+    })
+    assert response.status_code == 201
+    return response.get_json()['device']['id']
+
+
+def search(client, q, **params):
+    response = client.get('/api/devices/search', query_string={'q': q, **params})
+    assert response.status_code == 200
+    return response.get_json()['results']
+
+
+def test_matches_are_ranked_exact_prefix_word_prefix_substring(client):
+    create_device(client, 'a', model='Old Barracuda')
+    create_device(client, 'b', model='Barracuda Pro')
+    create_device(client, 'c', model='barracuda')
+    create_device(client, 'd', model='XBarracuda')
+    results = search(client, 'barracuda')
+    assert [(r['device_id'], r['match_kind']) for r in results] == [
+        ('c', 'exact'), ('b', 'prefix'), ('a', 'word_prefix'), ('d', 'substring')
+    ]
+    assert [r['device_id'] for r in search(client, 'ba')] == ['c', 'b', 'a']
+
+
+def test_exact_match_survives_the_candidate_cap(client, monkeypatch):
+    monkeypatch.setattr('app.device_search.MAX_CANDIDATES', 3)
+    for i in range(6):
+        create_device(client, f'sub-{i}', model=f'X{i}-Zentrix')
+    create_device(client, 'exact', serial_number='ZENTRIX')
+    create_device(client, 'prefix', model='Zentrix 2')
+    results = search(client, 'zentrix', limit=2)
+    assert [r['device_id'] for r in results] == ['exact', 'prefix']
+
+
+def test_fields_only_adds_device_columns(client):
+    create_device(client, 'a', model='Barracuda', capacity='2TB')
+    result, = search(client, 'barracuda', fields='capacity,to_dict,query,metadata,wipe_history')
+    assert result['capacity'] == '2TB'
+    assert not {'to_dict', 'query', 'metadata', 'wipe_history'} & set(result)
+
+
+def test_index_follows_edits_and_deletes(client):
+    pk = create_device(client, 'a', model='Barracuda')
+    client.put(f'/api/devices/{pk}', json={'model': 'Ironwolf'})
+    assert search(client, 'barracuda') == []
+    assert [r['device_id'] for r in search(client, 'ironwolf')] == ['a']
+
+    client.delete(f'/api/devices/{pk}')
+    assert search(client, 'ironwolf') == []
@@ -0,0 +1,47 @@
+from app.statistics import get_counters, rebuild_statistics
+
+
+def devices_by_id(client):
+    return {device['id']: device for device in client.get('/api/devices').get_json()['devices']}
+
+
+def test_bulk_update_by_ids_skips_devices_already_in_the_status(app, client, create_devices):
+    create_devices(3)
+    devices = devices_by_id(client)
+    first, second, third = sorted(devices)
+    client.patch(f'/api/devices/{first}/status', json={'status': 'wiped'})
+    before = devices_by_id(client)
+
+    body = client.patch('/api/devices/status', json={'status': 'wiped', 'ids': [first, second]}).get_json()
+    assert body['affected'] == 1
+    assert body['previous_statuses'] == {'active': 1}
+
+    after = devices_by_id(client)
+    assert after[first]['updated_at'] == before[first]['updated_at']
+    assert after[second]['status'] == 'wiped'
+    assert after[third]['status'] == 'active'
+    with app.app_context():
+        counters = get_counters('device_status')
+        assert counters == {'wiped': 2, 'active': 1}
+        assert rebuild_statistics()['device_status'] == counters
+
+
+def test_bulk_update_by_filter(client, create_devices):
+    create_devices(4)
+    body = client.patch('/api/devices/status', json={'status': 'maintenance', 'filter': {'type': 'SSD'}}).get_json()
+    assert body['affected'] == 2
+    statuses = {device['device_type']: device['status'] for device in devices_by_id(client).values()}
+    assert statuses == {'SSD': 'maintenance', 'HDD': 'active'}
+
+
+def test_bulk_update_validates_the_request(client, monkeypatch):
+    assert client.patch('/api/devices/status', json={'status': 'gone', 'ids': [1]}).status_code == 400
+    assert client.patch('/api/devices/status', json={'status': 'wiped'}).status_code == 400
+    assert client.patch('/api/devices/status', json={'status': 'wiped', 'ids': ['1']}).status_code == 400
+    assert client.patch('/api/devices/status', json={'status': 'wiped', 'filter': 'x'}).status_code == 400
+    assert client.patch('/api/devices/status', json={'status': 'wiped', 'filter': ['SSD']}).status_code == 400
+    assert client.patch('/api/devices/status', json={'status': 'wiped', 'filter': {'type': ['SSD']}}).status_code == 400
+    assert client.patch('/api/devices/status', json=['wiped']).status_code == 400
+
+    monkeypatch.setattr('app.devices_routes.MAX_BULK_STATUS_IDS', 2)
+    assert client.patch('/api/devices/status', json={'status': 'wiped', 'ids': [1, 2, 3]}).status_code == 413
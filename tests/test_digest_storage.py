@@ -0,0 +1,114 @@
+import pytest
+from sqlalchemy import LargeBinary, inspect, text
+
+import migrate_digest_storage
+from migrate_digest_storage import HEX_TABLE, TABLE, migrate
+from app.models import CertificateVerification, Digest, db
+
+
+def stored_rows(connection):
+    return connection.execute(text(
+        f"SELECT id, certificate_id, verification_key, previous_hash, certificate_hash FROM {TABLE} ORDER BY id"
+    )).all()
+
+
+def test_digest_type_round_trips_hex_through_binary():
+    digest = Digest('binary')
+    value = CertificateVerification.hash_text('code')
+    stored = digest.process_bind_param(value, None)
+    assert stored == bytes.fromhex(value)
+    assert digest.process_result_value(stored, None) == value
+    assert Digest('hex').process_bind_param(value, None) == value
+
+
+def test_sqlite_migration_keeps_rows_and_not_null(app, append_certificates):
+    blocks = append_certificates(7)
+    with app.app_context(), db.engine.connect() as connection:
+        migrate(connection, batch_size=3)
+
+        columns = {column['name']: column for column in inspect(connection).get_columns(TABLE)}
+        for name in ('verification_key', 'previous_hash', 'certificate_hash'):
+            assert isinstance(columns[name]['type'], LargeBinary)
+        assert columns['verification_key']['nullable'] is False
+        assert columns['certificate_hash']['nullable'] is False
+        assert columns['previous_hash']['nullable'] is True
+
+        rows = stored_rows(connection)
+        assert [row.certificate_hash for row in rows] == [bytes.fromhex(block['certificate_hash']) for block in blocks]
+        assert rows[0].previous_hash is None
+
+        indexes = {index['name']: index for index in inspect(connection).get_indexes(TABLE)}
+        assert indexes['ix_certificate_verification_chain_index']['unique']
+        assert 'ix_certificate_verification_verification_key' in indexes
+        assert HEX_TABLE not in inspect(connection).get_table_names()
+
+
+def test_rerunning_a_completed_migration_is_a_no_op(app, append_certificates):
+    append_certificates(3)
+    with app.app_context(), db.engine.connect() as connection:
+        migrate(connection)
+        before = stored_rows(connection)
+        migrate(connection)
+        assert stored_rows(connection) == before
+
+
+def test_interrupted_migration_resumes(app, append_certificates, monkeypatch):
+    blocks = append_certificates(7)
+    original = migrate_digest_storage.digest_bytes
+
+    def fail_on_row_five(row_id, column, value):
+        if row_id == 5:
+            raise RuntimeError('interrupted')
+        return original(row_id, column, value)
+
+    with app.app_context(), db.engine.connect() as connection:
+        monkeypatch.setattr(migrate_digest_storage, 'digest_bytes', fail_on_row_five)
+        with pytest.raises(RuntimeError):
+            migrate(connection, batch_size=2)
+        connection.rollback()
+        assert HEX_TABLE in inspect(connection).get_table_names()
+
+        monkeypatch.setattr(migrate_digest_storage, 'digest_bytes', original)
+        migrate(connection, batch_size=2)
+        rows = stored_rows(connection)
+        assert [row.certificate_id for row in rows] == [block['certificate_id'] for block in blocks]
+        assert HEX_TABLE not in inspect(connection).get_table_names()
+
+
+def test_malformed_digest_stops_the_migration(app, append_certificates):
+    append_certificates(2)
+    with app.app_context(), db.engine.connect() as connection:
+        connection.execute(text(f"UPDATE {TABLE} SET certificate_hash = 'abcd' WHERE id = 2"))
+        connection.commit()
+        with pytest.raises(ValueError):
+            migrate(connection)
+
+
+def test_script_reruns_without_the_app_startup_hooks(app, append_certificates, monkeypatch):
+    blocks = append_certificates(5)
+    uri = app.config['SQLALCHEMY_DATABASE_URI']
+    with app.app_context():
+        db.engine.dispose()
+
+    # Interrupted part-way, then rerun until it completes
+    original = migrate_digest_storage.digest_bytes
+
+    def fail_on_row_three(row_id, column, value):
+        if row_id == 3:
+            raise RuntimeError('interrupted')
+        return original(row_id, column, value)
+
+    monkeypatch.setattr(migrate_digest_storage, 'digest_bytes', fail_on_row_three)
+    with pytest.raises(SystemExit):
+        migrate_digest_storage.migrate_digest_storage(batch_size=2, database_uri=uri)
+    monkeypatch.setattr(migrate_digest_storage, 'digest_bytes', original)
+    migrate_digest_storage.migrate_digest_storage(batch_size=2, database_uri=uri)
+
+    # A completed migration can be rerun, in full or for the indexes only
+    migrate_digest_storage.migrate_digest_storage(database_uri=uri)
+    migrate_digest_storage.migrate_digest_storage(indexes_only=True, database_uri=uri)
+
+    with app.app_context(), db.engine.connect() as connection:
+        rows = stored_rows(connection)
+        assert [row.certificate_hash for row in rows] == [bytes.fromhex(block['certificate_hash']) for block in blocks]
+        assert HEX_TABLE not in inspect(connection).get_table_names()
@@ -0,0 +1,84 @@
+import time
+
+import pytest
+
+from app import certificate_upload_routes
+from app.ingest_queue import ingest_queue
+
+
+@pytest.fixture(autouse=True)
+def fast_worker(monkeypatch):
+    monkeypatch.setattr(ingest_queue, 'poll_interval', 0.05)
+
+
+def wait_for(client, tickets, timeout=10):
+    """Poll the ticket status endpoint until every ticket has left the queue"""
+    deadline = time.monotonic() + timeout
+    while True:
+        statuses = [client.get(f'/upload_certificate/tickets/{ticket}').get_json() for ticket in tickets]
+        if all(status['status'] != 'queued' for status in statuses) or time.monotonic() > deadline:
+            return statuses
+        time.sleep(0.02)
+
+
+def enqueue(client, certificates, station_id='station-1'):
+    response = client.post('/sync_certificates?async=1', json={'certificates': certificates},
+                           headers={'X-Station-ID': station_id})
+    assert response.status_code == 202
+    assert response.headers['Location'] == response.get_json()['status_url']
+    return response.get_json()['ticket']
+
+
+def test_async_upload_is_processed(client, desktop_certificate):
+    ticket = enqueue(client, [desktop_certificate('desk-1'), desktop_certificate('desk-1')])
+    status, = wait_for(client, [ticket])
+    assert status['status'] == 'done'
+    assert [result['status'] for result in status['results']] == ['uploaded', 'duplicate']
+    assert client.get('/upload_certificate/tickets/unknown').status_code == 404
+
+
+def test_failing_ticket_does_not_block_later_tickets(client, monkeypatch, desktop_certificate):
+    ingest_certificates = certificate_upload_routes.ingest_certificates
+
+    def ingest_unless_poisoned(certificates, station_id=None):
+        if any(certificate['certificate_id'] == 'poison' for certificate in certificates):
+            raise RuntimeError('cannot ingest poison')
+        return ingest_certificates(certificates, station_id=station_id)
+
+    monkeypatch.setattr(certificate_upload_routes, 'ingest_certificates', ingest_unless_poisoned)
+    failed_before = ingest_queue.stats['failed']
+    tickets = [
+        enqueue(client, [desktop_certificate('desk-1')]),
+        enqueue(client, [desktop_certificate('poison')]),
+        enqueue(client, [desktop_certificate('desk-2')]),
+    ]
+    first, poisoned, last = wait_for(client, tickets)
+
+    assert first['status'] == last['status'] == 'done'
+    assert poisoned['status'] == 'failed'
+    assert poisoned['error'] == 'cannot ingest poison'
+    assert poisoned['results'] is None
+    assert ingest_queue.get_stats()['queued'] == 0
+    assert ingest_queue.stats['failed'] == failed_before + 1
+    assert ingest_queue._attempts == {}
+
+
+def test_merged_ingests_are_capped(client, monkeypatch, desktop_certificate):
+    sizes = []
+    ingest_certificates = certificate_upload_routes.ingest_certificates
+
+    def record_size(certificates, station_id=None):
+        sizes.append(len(certificates))
+        return ingest_certificates(certificates, station_id=station_id)
+
+    monkeypatch.setattr(certificate_upload_routes, 'ingest_certificates', record_size)
+    monkeypatch.setattr(certificate_upload_routes, 'MAX_SYNC_CERTIFICATES', 3)
+    # Hold the worker back so all tickets land in one batch
+    monkeypatch.setattr(ingest_queue, 'batch_size', 0)
+    tickets = [enqueue(client, [desktop_certificate(f'desk-{i}-{j}') for j in range(2)]) for i in range(3)]
+    monkeypatch.setattr(ingest_queue, 'batch_size', 200)
+    ingest_queue._wake.set()
+
+    statuses = wait_for(client, tickets)
+    assert all(status['status'] == 'done' for status in statuses)
+    assert sizes == [2, 2, 2]
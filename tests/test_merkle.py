@@ -0,0 +1,93 @@
+from app import merkle
+from app.merkle import (
+    BATCH_SIZE, build_levels, hash_leaf, inclusion_proof, merkle_root, seal_completed_batches,
+    verify_inclusion_proof
+)
+from app.models import CertificateVerification, MerkleRoot, db
+
+
+def leaves(count):
+    return [hash_leaf(CertificateVerification.hash_text(str(i))) for i in range(count)]
+
+
+def test_every_leaf_proves_against_the_root():
+    for count in (1, 2, 5, 8):
+        tree = leaves(count)
+        root = merkle_root(tree)
+        for position in range(count):
+            proof = inclusion_proof(tree, position)
+            assert len(proof) <= len(build_levels(tree)) - 1
+            certificate_hash = CertificateVerification.hash_text(str(position))
+            assert verify_inclusion_proof(certificate_hash, proof, root)
+
+
+def test_proof_fails_for_another_certificate():
+    tree = leaves(8)
+    proof = inclusion_proof(tree, 3)
+    assert not verify_inclusion_proof(CertificateVerification.hash_text('other'), proof, merkle_root(tree))
+
+
+def test_append_worker_seals_full_batches(client, app, append_certificates):
+    append_certificates(BATCH_SIZE + 3)
+    data = client.get('/api/merkle/roots').get_json()
+    assert data['batch_size'] == BATCH_SIZE
+    assert [root['batch_index'] for root in data['roots']] == [0]
+    assert data['roots'][0]['last_index'] == BATCH_SIZE - 1
+
+
+def test_proof_route(client, app, append_certificates):
+    append_certificates(BATCH_SIZE)
+    proof = client.get('/api/merkle/proof/cert-7').get_json()
+    assert proof['sealed'] is True
+    assert proof['root_matches_published'] is True
+    assert verify_inclusion_proof(proof['certificate_hash'], proof['proof'], proof['root_hash'])
+    assert client.get('/api/merkle/proof/missing').status_code == 404
+
+
+def test_proof_of_an_open_batch_is_not_sealed(client, app, append_certificates):
+    append_certificates(3)
+    proof = client.get('/api/merkle/proof/cert-1').get_json()
+    assert proof['sealed'] is False
+    assert verify_inclusion_proof(proof['certificate_hash'], proof['proof'], proof['root_hash'])
+
+
+def test_reads_do_not_seal(client, app, append_certificates):
+    append_certificates(BATCH_SIZE)
+    with app.app_context():
+        MerkleRoot.query.delete()
+        db.session.commit()
+    client.get('/api/merkle/roots')
+    client.get('/api/merkle/proof/cert-0')
+    with app.app_context():
+        assert MerkleRoot.query.count() == 0
+
+
+def test_concurrent_seal_keeps_the_existing_root(app, append_certificates, monkeypatch):
+    append_certificates(BATCH_SIZE)
+    with app.app_context():
+        existing = MerkleRoot.query.one()
+        db.session.delete(existing)
+        db.session.commit()
+        original_batch_leaves = merkle.batch_leaves
+
+        def sealed_meanwhile(batch_index):
+            # Another writer seals the batch between our read and our insert
+            with db.engine.begin() as connection:
+                connection.execute(MerkleRoot.__table__.insert(), {
+                    'batch_index': batch_index, 'first_index': 0,
+                    'last_index': BATCH_SIZE - 1, 'root_hash': 'a' * 64
+                })
+            return original_batch_leaves(batch_index)
+
+        monkeypatch.setattr(merkle, 'batch_leaves', sealed_meanwhile)
+        assert seal_completed_batches() == []
+        assert MerkleRoot.query.one().root_hash == 'a' * 64
+
+
+def test_altered_batch_no_longer_matches_published_root(client, app, append_certificates):
+    append_certificates(BATCH_SIZE)
+    with app.app_context():
+        CertificateVerification.query.filter_by(chain_index=5).update({'certificate_hash': 'b' * 64})
+        db.session.commit()
+    proof = client.get('/api/merkle/proof/cert-5').get_json()
+    assert proof['root_matches_published'] is False
@@ -0,0 +1,38 @@
+from app.station_sync import record_station_certificates, station_digest, station_sync_state
+
+
+def test_digest_is_order_independent():
+    assert station_digest(['a', 'b', 'c']) == station_digest(['c', 'a', 'b'])
+    assert station_digest(['a', 'b']) != station_digest(['a'])
+    assert station_digest([]) == ['0' * 16] * 64
+
+
+def test_recording_updates_digest_watermark_and_ignores_replays(app):
+    with app.app_context():
+        assert record_station_certificates('station-1', [('a', '2024-01-02T00:00:00'), ('b', '2024-01-01T00:00:00')]) == 2
+        assert record_station_certificates('station-1', [('a', '2024-01-02T00:00:00'), ('c', None)]) == 1
+
+        state = station_sync_state('station-1')
+        assert state['certificate_count'] == 3
+        assert state['watermark'] == '2024-01-02T00:00:00'
+        assert state['digest']['buckets'] == station_digest(['a', 'b', 'c'])
+
+
+def test_invalid_station_ids_are_not_recorded(app):
+    with app.app_context():
+        assert record_station_certificates(None, [('a', None)]) == 0
+        assert record_station_certificates('x' * 101, [('a', None)]) == 0
+        assert station_sync_state('unknown')['certificate_count'] == 0
+
+
+def test_desktop_status_returns_the_sync_handshake(client, desktop_certificate):
+    certificates = [desktop_certificate('desk-1'), desktop_certificate('desk-2', timestamp='2024-02-01T00:00:00')]
+    # The second certificate's hash no longer matches its timestamp, so only desk-1 is stored
+    client.post('/sync_certificates', json={'certificates': certificates}, headers={'X-Station-ID': 'station-1'})
+
+    sync = client.get('/desktop_status', headers={'X-Station-ID': 'station-1'}).get_json()['sync']
+    assert sync['certificate_count'] == 1
+    assert sync['watermark'] == '2024-01-01T00:00:00'
+    assert sync['digest']['buckets'] == station_digest(['desk-1'])
+
+    assert 'sync' not in client.get('/desktop_status').get_json()
@@ -0,0 +1,115 @@
+from datetime import timedelta
+
+from app.devices_routes import Device, WipeHistory
+from app.models import db
+from app.statistics import NULL_KEY, RECENT_WIPES, get_counters, get_recent, rebuild_statistics
+
+
+def newest_wipe_ids():
+    """What the ring must hold: the newest wipes by (wiped_at, id)"""
+    wipes = WipeHistory.query.order_by(WipeHistory.wiped_at.desc(), WipeHistory.id.desc()).limit(RECENT_WIPES)
+    return [wipe.id for wipe in wipes]
+
+
+def recent_wipe_ids():
+    return [wipe['id'] for wipe in get_recent('recent_wipes')]
+
+
+def test_ring_is_ordered_by_wiped_at_not_id(ctx, add_device, add_wipes):
+    device = add_device()
+    # Ids ascend while wiped_at does not, as with backfilled history
+    add_wipes(device, [5, 1, 9, 3, 14, 0, 7, 12, 2, 11, 8, 13, 4])
+    add_wipes(device, [6, 10])
+    assert len(recent_wipe_ids()) == RECENT_WIPES
+    assert recent_wipe_ids() == newest_wipe_ids()
+
+    # Ties on wiped_at are ordered by id
+    add_wipes(device, [14])
+    assert recent_wipe_ids() == newest_wipe_ids()
+
+
+def test_edits_refresh_or_evict_ring_entries(ctx, add_device, add_wipes, wipe_start):
+    device = add_device()
+    wipes = add_wipes(device, range(15))
+
+    # A payload-only edit is reflected in place
+    wipes[14].certificate_id = 'cert-14'
+    db.session.commit()
+    assert get_recent('recent_wipes')[0]['certificate_id'] == 'cert-14'
+
+    # Moved back in time: it leaves the ring and the next newest wipe takes its place
+    wipes[14].wiped_at = wipe_start - timedelta(days=1)
+    db.session.commit()
+    assert recent_wipe_ids() == newest_wipe_ids()
+    assert wipes[14].id not in recent_wipe_ids()
+
+    # Moved forward: an old wipe enters the ring at the top
+    wipes[0].wiped_at = wipe_start + timedelta(days=1)
+    db.session.commit()
+    assert recent_wipe_ids()[0] == wipes[0].id
+    assert recent_wipe_ids() == newest_wipe_ids()
+
+
+def test_deleted_wipes_leave_the_ring(ctx, add_device, add_wipes):
+    device = add_device()
+    wipes = add_wipes(device, range(12))
+    db.session.delete(wipes[11])
+    db.session.delete(wipes[0])
+    db.session.commit()
+    assert wipes[11].id not in recent_wipe_ids()
+    assert recent_wipe_ids() == newest_wipe_ids()
+
+    for wipe in wipes[1:11]:
+        db.session.delete(wipe)
+    db.session.commit()
+    assert recent_wipe_ids() == []
+
+
+def test_counters_match_a_rebuild(ctx, add_device, add_wipes):
+    device = add_device()
+    other = add_device('dev-2', status='wiped')
+    wipes = add_wipes(device, range(4)) + add_wipes(other, [20])
+    wipes[0].wipe_method = 'DoD Wipe'
+    wipes[1].status = 'failed'
+    device.status = 'inactive'
+    db.session.delete(wipes[2])
+    db.session.commit()
+
+    counters = get_counters()
+    recent = get_recent('recent_wipes')
+    assert counters['device_status'] == {'inactive': 1, 'wiped': 1}
+    assert counters['wipe_method'] == {'NIST Purge': 3, 'DoD Wipe': 1}
+    assert counters['wipe_status'] == {'completed': 3, 'failed': 1}
+
+    assert rebuild_statistics() == counters
+    assert get_recent('recent_wipes') == recent
+
+
+def test_wipes_without_a_time_leave_the_ring(ctx, add_device, add_wipes):
+    device = add_device()
+    wipes = add_wipes(device, range(12))
+    wipes[11].wiped_at = None
+    wipes[0].wiped_at = None
+    db.session.commit()
+    assert wipes[11].id not in recent_wipe_ids()
+    assert recent_wipe_ids() == [wipe.id for wipe in reversed(wipes[1:11])]
+
+    rebuild_statistics()
+    assert recent_wipe_ids() == [wipe.id for wipe in reversed(wipes[1:11])]
+
+
+def test_null_statuses_are_counted_in_their_own_bucket(ctx, add_device):
+    device = add_device()
+    add_device('dev-2')
+    device.status = None
+    db.session.commit()
+    assert get_counters('device_status') == {NULL_KEY: 1, 'active': 1}
+    assert sum(get_counters('device_status').values()) == Device.query.count()
+
+    db.session.execute(Device.__table__.update().values(status=None))
+    db.session.commit()
+    assert rebuild_statistics()['device_status'] == {NULL_KEY: 2}
+
+    db.session.delete(device)
+    db.session.commit()
+    assert get_counters('device_status') == {NULL_KEY: 1}
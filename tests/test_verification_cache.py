@@ -0,0 +1,76 @@
+from flask import template_rendered
+
+from app.models import CertificateVerification
+from app.verification_cache import VerificationCache, verification_cache
+
+
+def verify(app, client, code):
+    """POST /verify_certificate and return the context verify.html was rendered with"""
+    rendered = []
+
+    def record(sender, template, context, **extra):
+        rendered.append(context)
+
+    template_rendered.connect(record, app)
+    try:
+        client.post('/verify_certificate', data={'verification_code': code})
+    finally:
+        template_rendered.disconnect(record, app)
+    return rendered[-1]
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = VerificationCache(max_entries=2)
+    cache.put('a', 1)
+    cache.put('b', 2)
+    assert cache.get('a') == 1
+    cache.put('c', 3)
+    assert cache.get('b') is None
+    assert cache.get('a') == 1
+    assert cache.stats['evictions'] == 1
+
+
+def test_entries_expire_after_the_ttl(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr('app.verification_cache.time.monotonic', lambda: now[0])
+    cache = VerificationCache(ttl=10)
+    cache.put('a', 1)
+    now[0] += 9
+    assert cache.get('a') == 1
+    now[0] += 2
+    assert cache.get('a') is None
+    assert cache.get_stats()['entries'] == 0
+
+
+def test_chain_append_invalidates_added_keys():
+    cache = VerificationCache()
+    cache.put('key', {'verified': False})
+    cache.on_chain_append([{'verification_key': 'key'}])
+    assert cache.get('key') is None
+
+
+def test_repeat_verifications_are_served_from_the_cache(app, client, append_certificates):
+    append_certificates(1)
+    verification_cache.clear()
+    hits = verification_cache.stats['hits']
+
+    first = verify(app, client, 'cert-code-0')
+    second = verify(app, client, 'cert-code-0')
+    assert first['verified'] is True and first['chain_valid'] is True
+    assert second['certificate'] == first['certificate']
+    assert verification_cache.stats['hits'] == hits + 1
+
+
+def test_new_certificate_replaces_a_cached_miss(app, client, append_certificates):
+    append_certificates(1)
+    verification_cache.clear()
+    # A cached "not found" from before the certificate existed
+    verification_cache.put(
+        CertificateVerification.hash_text('late-code-0'),
+        {'verified': False, 'chain_valid': False, 'certificate': None}
+    )
+    assert verify(app, client, 'late-code-0')['verified'] is False
+    append_certificates(1, prefix='late')
+    context = verify(app, client, 'late-code-0')
+    assert context['verified'] is True
+    assert context['certificate']['certificate_id'] == 'late-0'
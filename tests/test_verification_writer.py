@@ -0,0 +1,91 @@
+import time
+from datetime import datetime
+
+import pytest
+
+from app.models import CertificateVerification, db
+from app.verification_writer import VerificationWriteBehind, verification_writer
+
+
+@pytest.fixture
+def writer(app):
+    """A writer whose timer never fires during a test, so flushes are explicit"""
+    writer = VerificationWriteBehind(flush_interval=60)
+    writer.init_app(app)
+    writer.flush_interval = 60
+    yield writer
+    writer._stopped = True
+    writer._wake.set()
+
+
+def certificate_pks(app, count):
+    with app.app_context():
+        return [pk for pk, in db.session.query(CertificateVerification.id).order_by(CertificateVerification.id).limit(count)]
+
+
+def verified_at(app, pk):
+    with app.app_context():
+        return db.session.get(CertificateVerification, pk).verified_at
+
+
+def test_repeated_records_coalesce_into_one_write(app, append_certificates, writer):
+    append_certificates(2)
+    first, second = certificate_pks(app, 2)
+    writer.record(first, datetime(2024, 1, 1))
+    writer.record(first, datetime(2024, 1, 2))
+    writer.record(second, datetime(2024, 1, 3))
+    assert writer.get_stats()['pending'] == 2
+
+    assert writer.flush() == 2
+    assert verified_at(app, first) == datetime(2024, 1, 2)
+    assert verified_at(app, second) == datetime(2024, 1, 3)
+    assert writer.stats == {'recorded': 3, 'flushed': 2, 'flushes': 1, 'failures': 0}
+    assert writer.flush() == 0
+
+
+def test_failed_flush_keeps_changes_without_overwriting_newer_ones(app, append_certificates, writer, monkeypatch):
+    append_certificates(1)
+    pk, = certificate_pks(app, 1)
+    writer.record(pk, datetime(2024, 1, 1))
+
+    def fail(*args, **kwargs):
+        # A newer verification arrives while the failing flush is in flight
+        writer._pending[pk] = datetime(2024, 1, 5)
+        raise RuntimeError('database unavailable')
+
+    with monkeypatch.context() as patch:
+        patch.setattr(db.session, 'execute', fail)
+        assert writer.flush() == 0
+    assert writer.stats['failures'] == 1
+    assert writer.get_stats()['pending'] == 1
+
+    assert writer.flush() == 1
+    assert verified_at(app, pk) == datetime(2024, 1, 5)
+
+
+def test_full_buffer_is_flushed_without_waiting_for_the_timer(app, append_certificates, writer):
+    writer.max_batch = 3
+    append_certificates(3)
+    for pk in certificate_pks(app, 3):
+        writer.record(pk, datetime(2024, 1, 1))
+
+    deadline = time.monotonic() + 5
+    while writer.stats['flushed'] < 3 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert writer.stats['flushed'] == 3
+    assert writer.get_stats()['pending'] == 0
+
+
+def test_record_requires_an_app():
+    with pytest.raises(RuntimeError):
+        VerificationWriteBehind().record(1, datetime(2024, 1, 1))
+
+
+def test_verification_marks_the_certificate_verified(app, client, append_certificates):
+    append_certificates(1)
+    client.post('/verify_certificate', data={'verification_code': 'cert-code-0'})
+    verification_writer.flush()
+    with app.app_context():
+        certificate = CertificateVerification.query.filter_by(certificate_id='cert-0').one()
+        assert certificate.is_verified
+        assert certificate.verified_at is not None
@@ -0,0 +1,84 @@
+from datetime import timedelta
+
+from app.devices_routes import Device, WipeHistory
+from app.models import DeviceWipeRollup, db
+from app.statistics import _rebuild_wipe_rollups, get_wipe_rollup, recompute_wipe_rollup
+
+
+def rollups():
+    return {rollup.device_pk: rollup.to_dict() for rollup in DeviceWipeRollup.query.order_by(DeviceWipeRollup.device_pk)}
+
+
+def test_history_pages_newest_first(app, client, add_device, add_wipes, wipe_start):
+    with app.app_context():
+        device = add_device()
+        add_wipes(device, [3, 1, 2, 5, 4])
+        pk = device.id
+
+    seen = []
+    cursor = None
+    while True:
+        params = {'limit': 2, **({'cursor': cursor} if cursor else {})}
+        body = client.get(f'/api/devices/{pk}/wipe-history', query_string=params).get_json()
+        assert body['total_wipes'] == 5
+        seen.extend(entry['wiped_at'] for entry in body['history'])
+        cursor = body['next_cursor']
+        if cursor is None:
+            break
+    assert seen == [(wipe_start + timedelta(hours=h)).isoformat() for h in [5, 4, 3, 2, 1]]
+
+    assert client.get(f'/api/devices/{pk}/wipe-history?cursor=bogus').status_code == 400
+    assert client.get('/api/devices/999/wipe-history').status_code == 404
+
+
+def test_rollups_follow_added_edited_moved_and_deleted_wipes(ctx, add_device, add_wipes, wipe_start):
+    device = add_device()
+    other = add_device('dev-2')
+    wipes = add_wipes(device, [1, 3, 2])
+    assert get_wipe_rollup(device.id)['wipe_count'] == 3
+    assert get_wipe_rollup(device.id)['last_wipe_id'] == wipes[1].id
+
+    wipes[1].wiped_at = wipe_start
+    wipes[2].status = 'failed'
+    db.session.commit()
+    assert get_wipe_rollup(device.id)['last_wipe_id'] == wipes[2].id
+    assert get_wipe_rollup(device.id)['last_wipe_status'] == 'failed'
+
+    wipes[2].device_id = other.id
+    db.session.commit()
+    assert get_wipe_rollup(device.id)['wipe_count'] == 2
+    assert get_wipe_rollup(other.id)['last_wipe_id'] == wipes[2].id
+
+    db.session.delete(wipes[2])
+    db.session.commit()
+    assert get_wipe_rollup(other.id) == {
+        'wipe_count': 0, 'last_wipe_id': None, 'last_wiped_at': None, 'last_wipe_method': None, 'last_wipe_status': None
+    }
+
+
+def test_device_with_wipes_cannot_be_deleted(app, client, add_device, add_wipes):
+    with app.app_context():
+        device = add_device()
+        add_wipes(device, [1])
+        pk = device.id
+    response = client.delete(f'/api/devices/{pk}')
+    assert response.status_code == 400
+    assert client.get(f'/api/devices/{pk}').get_json()['wipe_summary']['wipe_count'] == 1
+
+
+def test_rebuild_matches_incremental_rollups_across_pages(ctx, add_device, add_wipes):
+    for i in range(5):
+        add_wipes(add_device(f'dev-{i}'), [(i * 7 + j * 5) % 11 for j in range(i + 1)])
+    # A device's wipes need not have neighbouring ids
+    add_wipes(Device.query.filter_by(device_id='dev-0').one(), [12])
+    incremental = rollups()
+
+    db.session.execute(DeviceWipeRollup.__table__.delete())
+    _rebuild_wipe_rollups(db.session.connection(), WipeHistory, batch_size=2)
+    db.session.commit()
+    assert rollups() == incremental
+
+    for device_pk in incremental:
+        recompute_wipe_rollup(db.session.connection(), device_pk)
+    db.session.commit()
+    assert rollups() == incremental